@@ -1,11 +1,60 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional
+from itertools import chain
+from pydantic import ValidationError
+import asyncio
+import os
 import uuid
 from datetime import datetime
 
-from app.schemas.chat import ChatRequest, ChatResponse, ConversationSummary, MessageDetail
+from app.schemas.chat import (
+    ChatRequest,
+    ChatResponse,
+    ChatSocketMessage,
+    ConversationSummary,
+    MessageDetail,
+    MessageRole,
+    SearchResults,
+)
+from app.services.admission import ClientDisconnected, cancel_on_disconnect
+from app.services.cache_warmup import WarmupInProgress, cache_warmer, mine_frequent_questions
 from app.services.chat_service import ChatService
+from app.services.chat_sessions import CLOSE_IDLE, ChatSession, SessionLimitReached, chat_sessions, origin_allowed
+from app.services.export_service import (
+    EXPORT_FORMATS,
+    ExportFilters,
+    ExportFormatUnavailable,
+    export_to_file,
+    iter_message_pairs,
+    iter_ndjson,
+)
+from app.services.idempotency import (
+    IdempotencyError,
+    IdempotencyInProgress,
+    IdempotencyKeyReused,
+    idempotency_store,
+    request_fingerprint,
+)
+from app.services.model_router import model_router
+from app.services.model_registry import active_model, model_registry
+from app.services.rate_limiter import (
+    RateLimitExceeded,
+    client_identity,
+    enforce_rate_limit,
+    rate_limit_http_error,
+    rate_limiter,
+)
+from app.services.resilience import LLMUnavailableError
+from app.services.retention import retention_service
+from app.services.search_service import SearchUnavailable, search_index
+from app.services.tracing import trace_recorder
 from app.core.config import settings
+from app.core.security import require_admin
+from app.core.serialization import dumps, json_response
+from loguru import logger
 
 router = APIRouter()
 
@@ -18,11 +67,20 @@ def get_chat_service() -> ChatService:
 @router.post("/", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
+    http_request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     chat_service: ChatService = Depends(get_chat_service)
 ) -> ChatResponse:
-    """Endpoint principal para chat con el asistente especializado"""
+    """Endpoint principal para chat con el asistente especializado
+
+    Con la cabecera Idempotency-Key, los reintentos de la misma petición esperan
+    a la primera ejecución o repiten su respuesta guardada (Idempotent-Replayed: true)
+    en lugar de volver a llamar al LLM y duplicar mensajes. El rate limit se comprueba
+    dentro de generate_response, a la vez que el resto de la preparación.
+    """
     
-    try:
+    async def run() -> Dict[str, Any]:
         # Generar session_id si no se proporciona
         session_id = request.session_id or str(uuid.uuid4())
         
@@ -32,7 +90,8 @@ async def chat(
             session_id=session_id,
             conversation_history=request.conversation_history,
             user_id=request.user_id,
-            temperature=request.temperature
+            temperature=request.temperature,
+            client_id=client_identity(http_request)
         )
         
         return ChatResponse(
@@ -40,41 +99,239 @@ async def chat(
             session_id=result["session_id"],
             timestamp=result["timestamp"],
             tokens_used=result.get("tokens_used"),
-            response_time_ms=result.get("response_time_ms")
-        )
+            response_time_ms=result.get("response_time_ms"),
+            suggestions=result.get("suggestions", [])
+        ).model_dump(mode="json")
+    
+    try:
+        # Si el cliente cierra la conexión se cancela la llamada al LLM
+        if idempotency_key is not None:
+            payload, replayed = await cancel_on_disconnect(http_request, idempotency_store.execute(
+                "chat", idempotency_key, request_fingerprint(request.model_dump(mode="json")), run
+            ))
+            if replayed:
+                response.headers["Idempotent-Replayed"] = "true"
+        else:
+            payload = await cancel_on_disconnect(http_request, run())
+        
+        return ChatResponse(**payload)
         
+    except ClientDisconnected:
+        # Nadie va a leer la respuesta (499: cerrada por el cliente, como en nginx)
+        return Response(status_code=499)
+    except RateLimitExceeded as e:
+        raise rate_limit_http_error(e)
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IdempotencyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LLMUnavailableError as e:
+        raise HTTPException(status_code=503, detail=f"Modelo no disponible temporalmente: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando respuesta: {str(e)}")
 
 
+@router.post("/stream", dependencies=[Depends(enforce_rate_limit)])
+async def chat_stream(
+    request: ChatRequest,
+    chat_service: ChatService = Depends(get_chat_service)
+) -> StreamingResponse:
+    """Chat en streaming (Server-Sent Events): eventos token, done y error
+
+    Si el cliente se desconecta, StreamingResponse cancela el generador y con él
+    la llamada al LLM en curso. El rate limit se comprueba como dependency: el 429
+    tiene que enviarse antes de empezar el stream.
+    """
+    
+    session_id = request.session_id or str(uuid.uuid4())
+
+    async def event_stream():
+        try:
+            async for event in chat_service.stream_response(
+                message=request.message,
+                session_id=session_id,
+                conversation_history=request.conversation_history,
+                user_id=request.user_id,
+                temperature=request.temperature
+            ):
+                yield f"data: {dumps(event)}\n\n"
+        except LLMUnavailableError as e:
+            yield f"data: {dumps({'type': 'error', 'status': 503, 'detail': str(e)})}\n\n"
+        except Exception as e:
+            logger.error(f"Error en stream de chat: {e}")
+            yield f"data: {dumps({'type': 'error', 'status': 500, 'detail': 'Error generando respuesta'})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _send_event(websocket: WebSocket, event: Dict[str, Any]):
+    await websocket.send_text(dumps(event))
+
+
+async def _run_socket_turn(
+    session: ChatSession,
+    chat_service: ChatService,
+    message: str,
+    temperature: float
+):
+    """Un turno de la sesión: los mismos eventos que /chat/stream, enviados por el socket"""
+    parts: List[str] = []
+    done = False
+    try:
+        async for event in chat_service.stream_response(
+            message=message,
+            session_id=session.session_id,
+            conversation_history=list(session.history),
+            user_id=session.user_id,
+            temperature=temperature
+        ):
+            if event["type"] == "token":
+                parts.append(event["content"])
+            done = done or event["type"] == "done"
+            await _send_event(session.websocket, event)
+        # Sin done el turno no terminó (cortado o sin respuesta): no entra en el historial
+        if done:
+            session.remember(message, "".join(parts))
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # El socket se cerró; el bucle de recepción limpia la sesión
+    except LLMUnavailableError as e:
+        await _send_event(session.websocket, {"type": "error", "status": 503, "detail": str(e)})
+    except Exception as e:
+        logger.error(f"Error en turno de WebSocket: {e}")
+        await _send_event(session.websocket, {"type": "error", "status": 500, "detail": "Error generando respuesta"})
+
+
+@router.websocket("/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    session_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    """Chat por WebSocket: una conexión por sesión durante toda la conversación
+
+    Al conectar se recibe {"type": "session", "session_id": ...}; con ?session_id=
+    se retoma una sesión existente (su historial se carga de la base de datos).
+    El cliente envía {"type": "message", "message": ..., "temperature": ...} y
+    recibe los eventos token y done de /chat/stream; el historial lo mantiene el
+    servidor. {"type": "cancel"} corta el turno en curso (se guarda como
+    'cancelled') y responde {"type": "cancelled"}; {"type": "ping"} responde pong.
+    Los errores de un turno llegan como eventos error con status HTTP y la
+    conexión sigue abierta. El rate limit se aplica a cada mensaje.
+    """
+    if not origin_allowed(websocket.headers.get("origin")):
+        # Cerrar antes de aceptar rechaza el handshake (403)
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    try:
+        # Solo una sesión retomada tiene historial guardado que cargar
+        load_history = None
+        if session_id is not None:
+            load_history = lambda sid: chat_service.get_conversation_history(sid, settings.MAX_CONVERSATION_HISTORY)
+        session = await chat_sessions.open(session_id or str(uuid.uuid4()), websocket, user_id, load_history)
+    except SessionLimitReached as e:
+        # 1013: intentar más tarde (el cliente puede volver a HTTP)
+        await websocket.close(code=1013, reason=str(e))
+        return
+
+    client_id = client_identity(websocket)
+    try:
+        await _send_event(websocket, {
+            "type": "session", "session_id": session.session_id, "history_length": len(session.history)
+        })
+        while True:
+            try:
+                raw = await asyncio.wait_for(websocket.receive_text(), timeout=settings.WS_IDLE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                # Un turno en curso mantiene la sesión abierta, pero solo hasta su deadline;
+                # al cerrar, chat_sessions.close cancela el turno colgado
+                if session.busy and asyncio.get_running_loop().time() < session.turn_deadline:
+                    continue
+                await websocket.close(code=CLOSE_IDLE, reason="Sesión inactiva")
+                break
+            try:
+                incoming = ChatSocketMessage.model_validate_json(raw)
+            except ValidationError as e:
+                await _send_event(websocket, {"type": "error", "status": 422, "detail": e.errors(include_url=False)})
+                continue
+
+            if incoming.type == "ping":
+                await _send_event(websocket, {"type": "pong"})
+            elif incoming.type == "cancel":
+                if await chat_sessions.cancel_turn(session):
+                    await _send_event(websocket, {"type": "cancelled"})
+            elif not incoming.message:
+                await _send_event(websocket, {"type": "error", "status": 422, "detail": "Falta message"})
+            elif session.busy:
+                await _send_event(websocket, {"type": "error", "status": 409, "detail": "Hay un turno en curso"})
+            else:
+                try:
+                    await asyncio.to_thread(rate_limiter.enforce, client_id)
+                except RateLimitExceeded as e:
+                    await _send_event(websocket, {
+                        "type": "error", "status": 429, "detail": str(e), "retry_after": e.retry_after
+                    })
+                    continue
+                chat_sessions.start_turn(
+                    session, _run_socket_turn(session, chat_service, incoming.message, incoming.temperature)
+                )
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # Desconexión del cliente o sesión sustituida por otra conexión
+    finally:
+        await chat_sessions.close(session)
+
+
 @router.get("/history/{session_id}", response_model=List[MessageDetail])
 async def get_conversation_history(
     session_id: str,
     limit: int = 20,
     chat_service: ChatService = Depends(get_chat_service)
 ) -> List[MessageDetail]:
-    """Obtener historial de conversación"""
+    """Obtener historial de conversación
+
+    Las filas ya tienen la forma de MessageDetail (el modelo queda para la
+    documentación): se serializan directamente con json_response en lugar de
+    construir, validar y recorrer un modelo por mensaje.
+    """
     
     try:
         history = await chat_service.get_conversation_history(session_id, limit)
         
-        messages = []
-        for msg in history:
-            messages.append(MessageDetail(
-                id=msg["id"],
-                role=msg["role"],
-                content=msg["content"],
-                timestamp=msg["timestamp"],
-                tokens_used=msg.get("tokens_used"),
-                response_time_ms=msg.get("response_time_ms")
-            ))
-        
-        return messages
+        return json_response(history)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo historial: {str(e)}")
 
 
+@router.get("/search", response_model=SearchResults, dependencies=[Depends(require_admin)])
+async def search_conversations(
+    q: str = Query(..., min_length=1, max_length=200, description="Términos a buscar; 'analy*' busca por prefijo"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    session_id: Optional[str] = None,
+    role: Optional[MessageRole] = None
+) -> SearchResults:
+    """Buscar en el contenido de todas las conversaciones (texto completo, por relevancia)"""
+    try:
+        results = await run_in_threadpool(
+            search_index.search, q, limit, offset, session_id, role.value if role else None
+        )
+        return SearchResults(**results)
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la búsqueda: {str(e)}")
+
+
 @router.get("/analytics")
 async def get_chat_analytics(
     session_id: Optional[str] = None,
@@ -90,7 +347,31 @@ async def get_chat_analytics(
         raise HTTPException(status_code=500, detail=f"Error obteniendo analíticas: {str(e)}")
 
 
-@router.post("/model/switch")
+@router.get("/frequent-questions", dependencies=[Depends(require_admin)])
+async def get_frequent_questions(
+    top_n: Optional[int] = Query(None, ge=1, le=100),
+    window_days: Optional[float] = Query(None, gt=0),
+    min_count: Optional[int] = Query(None, ge=1)
+):
+    """Preguntas de usuario más repetidas por intención (las que precalienta la caché)"""
+    try:
+        return await run_in_threadpool(mine_frequent_questions, top_n, window_days, min_count)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo preguntas frecuentes: {str(e)}")
+
+
+@router.post("/cache/warmup", dependencies=[Depends(require_admin)])
+async def warmup_response_cache():
+    """Precalentar ahora la caché de respuestas con las preguntas frecuentes"""
+    try:
+        return await cache_warmer.warm()
+    except WarmupInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error precalentando la caché: {str(e)}")
+
+
+@router.post("/model/switch", dependencies=[Depends(require_admin)])
 async def switch_model(
     model_id: str,
     chat_service: ChatService = Depends(get_chat_service)
@@ -131,10 +412,13 @@ async def list_available_models(
             "gpt-4-1106-preview"
         ]
         
+        current_model = await active_model.aget()
         return {
-            "current_model": chat_service.current_model,
+            "current_model": current_model,
+            "fallback_chain": model_router.build_chain(current_model),
+            "routing": model_router.snapshot(),
             "base_models": base_models,
-            "fine_tuned_models": []  # Se llenará con modelos fine-tuned localmente
+            "fine_tuned_models": model_registry.fine_tuned_models()
         }
         
     except Exception as e:
@@ -156,68 +440,166 @@ async def submit_feedback(
         if success:
             return {
                 "success": True,
-                "message": "Feedback enviado exitosamente"
+                "message": "Feedback registrado; se enviará a LangSmith en segundo plano"
             }
         else:
             raise HTTPException(status_code=400, detail="No se pudo enviar el feedback")
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error enviando feedback: {str(e)}")
 
 
-@router.get("/langsmith-analytics")
+@router.get("/langsmith-analytics", dependencies=[Depends(require_admin)])
 async def get_langsmith_analytics(
     project_name: Optional[str] = None,
+    since_hours: float = 24.0,
     chat_service: ChatService = Depends(get_chat_service)
 ):
-    """Obtener analíticas desde LangSmith"""
+    """Obtener analíticas de runs (desde el almacén local de trazas)"""
     
     try:
-        analytics = await chat_service.get_langsmith_analytics(project_name)
+        analytics = await chat_service.get_langsmith_analytics(project_name, since_hours)
         return analytics
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo analíticas: {str(e)}")
 
 
-@router.post("/create-dataset")
+@router.get("/traces/analytics", dependencies=[Depends(require_admin)])
+async def get_trace_analytics(
+    since_hours: float = 24.0,
+    group_by: Optional[str] = Query(None, description="model | intent | status | name"),
+    model: Optional[str] = None,
+    intent: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """Latencia (media y percentiles), errores y tokens por run y por etapa"""
+    try:
+        return await run_in_threadpool(
+            trace_recorder.analytics, since_hours, group_by, model=model, intent=intent, status=status
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/traces", dependencies=[Depends(require_admin)])
+async def list_traces(
+    limit: int = Query(50, ge=1, le=500),
+    model: Optional[str] = None,
+    intent: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """Últimos runs registrados"""
+    return await run_in_threadpool(trace_recorder.recent_runs, limit, model=model, intent=intent, status=status)
+
+
+@router.get("/traces/{run_id}", dependencies=[Depends(require_admin)])
+async def get_trace(run_id: str):
+    """Un run con sus etapas"""
+    run = await run_in_threadpool(trace_recorder.get_run, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Traza no encontrada")
+    return run
+
+
+@router.get("/export", dependencies=[Depends(require_admin)])
+async def export_conversations(
+    format: str = Query("ndjson", description="ndjson | parquet"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    session_ids: Optional[List[str]] = Query(None)
+):
+    """Exportar pares usuario/asistente en bloque
+
+    NDJSON se emite en streaming a medida que se lee la base de datos;
+    Parquet se escribe primero a un fichero (el formato necesita el pie al final).
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {format}")
+
+    filters = ExportFilters(start=start, end=end, session_ids=session_ids)
+    filename = f"conversations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+
+    if format == "ndjson":
+        return StreamingResponse(
+            iter_ndjson(iter_message_pairs(filters)),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    try:
+        result = await run_in_threadpool(export_to_file, format, filters)
+    except ExportFormatUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return FileResponse(
+        result["path"],
+        media_type="application/vnd.apache.parquet",
+        filename=filename,
+        background=BackgroundTask(os.remove, result["path"])
+    )
+
+
+@router.post("/export/file", dependencies=[Depends(require_admin)])
+async def export_conversations_to_file(
+    format: str = Query("ndjson", description="ndjson | parquet"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    session_ids: Optional[List[str]] = Query(None)
+):
+    """Escribir la exportación como fichero local de dataset en EXPORT_DIR"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {format}")
+
+    filters = ExportFilters(start=start, end=end, session_ids=session_ids)
+    try:
+        return await run_in_threadpool(export_to_file, format, filters)
+    except ExportFormatUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+@router.post("/retention/run", dependencies=[Depends(require_admin)])
+async def run_retention():
+    """Ejecutar ahora un ciclo de retención (sesiones inactivas, archivado y borrado por lotes)"""
+    try:
+        return await run_in_threadpool(retention_service.run)
+    except Exception as e:
+        logger.error(f"Error en el ciclo de retención: {e}")
+        raise HTTPException(status_code=500, detail=f"Error en el ciclo de retención: {str(e)}")
+
+
+@router.post("/create-dataset", dependencies=[Depends(require_admin)])
 async def create_langsmith_dataset(
     dataset_name: str,
     session_ids: Optional[List[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    all_sessions: bool = Query(False, alias="all", description="Subir todas las sesiones si no se indican session_ids"),
     chat_service: ChatService = Depends(get_chat_service)
 ):
-    """Crear un dataset en LangSmith a partir de conversaciones"""
+    """Crear un dataset en LangSmith a partir de conversaciones
+
+    Hay que indicar session_ids o pedir explícitamente todas las sesiones con all=true.
+    """
+    if not session_ids and not all_sessions:
+        raise HTTPException(status_code=400, detail="Indica session_ids o all=true para subir todas las sesiones")
     
     try:
-        # Obtener conversaciones de la base de datos local
-        conversations = []
+        # Una sola consulta leída por lotes en lugar de una por sesión; la lectura
+        # (cursor síncrono) avanza en el threadpool, no en el event loop
+        conversations = iter_message_pairs(ExportFilters(start=start, end=end, session_ids=session_ids))
+        first = await run_in_threadpool(next, conversations, None)
         
-        if session_ids:
-            for session_id in session_ids:
-                history = await chat_service.get_conversation_history(session_id)
-                for i in range(0, len(history), 2):  # Tomar pares user-assistant
-                    if i + 1 < len(history):
-                        user_msg = history[i]
-                        assistant_msg = history[i + 1]
-                        
-                        if user_msg["role"] == "user" and assistant_msg["role"] == "assistant":
-                            conversations.append({
-                                "user_message": user_msg["content"],
-                                "assistant_response": assistant_msg["content"],
-                                "session_id": session_id,
-                                "timestamp": user_msg["timestamp"],
-                                "model": "unknown"
-                            })
-        
-        if not conversations:
+        if first is None:
             raise HTTPException(status_code=400, detail="No se encontraron conversaciones válidas")
         
-        success = await chat_service.create_langsmith_dataset(dataset_name, conversations)
+        total = await chat_service.create_langsmith_dataset(dataset_name, chain([first], conversations))
         
-        if success:
+        if total is not None:
             return {
                 "success": True,
-                "message": f"Dataset '{dataset_name}' creado con {len(conversations)} ejemplos"
+                "message": f"Dataset '{dataset_name}' creado con {total} ejemplos"
             }
         else:
             raise HTTPException(status_code=400, detail="No se pudo crear el dataset")
@@ -3,6 +3,23 @@ from typing import Dict, Any
 from datetime import datetime
 
 from app.core.config import settings
+from app.core.database import database_snapshot
+from app.core.compression import compression_stats
+from app.services.resilience import resilience_snapshot
+from app.services.coalescing import llm_single_flight
+from app.services.model_registry import model_registry
+from app.services.response_cache import response_cache
+from app.services.fact_answers import fact_answers
+from app.services.admission import llm_admission
+from app.services.idempotency import idempotency_store
+from app.services.tracing import trace_recorder
+from app.services.langsmith_exporter import langsmith_exporter
+from app.services.retention import retention_service
+from app.services.search_service import search_index
+from app.services.cache_warmup import cache_warmer
+from app.services.suggestions import suggestion_service
+from app.services.token_budgets import token_budgets
+from app.services.chat_sessions import chat_sessions
 # Pinecone removido del health check
 
 router = APIRouter()
@@ -44,6 +61,26 @@ async def detailed_health_check() -> Dict[str, Any]:
         "details": config_status
     }
     
+    # Estado de circuit breakers y latencias por modelo
+    health_status["services"]["llm"] = resilience_snapshot()
+    health_status["services"]["coalescing"] = llm_single_flight.snapshot()
+    health_status["services"]["admission"] = llm_admission.snapshot()
+    health_status["services"]["idempotency"] = idempotency_store.snapshot()
+    health_status["services"]["model_registry"] = model_registry.snapshot()
+    health_status["services"]["response_cache"] = response_cache.snapshot()
+    health_status["services"]["cache_warmup"] = cache_warmer.snapshot()
+    health_status["services"]["fact_answers"] = fact_answers.snapshot()
+    health_status["services"]["suggestions"] = suggestion_service.snapshot()
+    health_status["services"]["output_budgets"] = token_budgets.snapshot()
+    health_status["services"]["websocket_sessions"] = chat_sessions.snapshot()
+    health_status["services"]["compression"] = compression_stats.snapshot()
+    health_status["services"]["traces"] = trace_recorder.snapshot()
+    health_status["services"]["langsmith"] = langsmith_exporter.snapshot()
+    health_status["services"]["state_backend"] = settings.STATE_BACKEND
+    health_status["services"]["database"] = database_snapshot()
+    health_status["services"]["retention"] = retention_service.snapshot()
+    health_status["services"]["search"] = search_index.snapshot()
+    
     return health_status
 
 
@@ -0,0 +1,210 @@
+"""
+Compresión gzip/brotli de las respuestas HTTP, incluidas las de streaming
+"""
+
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: pip install brotli (sin él, solo gzip)
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "text/",
+)
+# Cada evento se envía en cuanto se genera: hay que vaciar el compresor fragmento a fragmento
+FLUSH_EACH_CHUNK_TYPES = ("text/event-stream",)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """'br' si el cliente lo acepta y está instalado; si no 'gzip'; None sin compresión"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params.strip() and float(quality) <= 0:
+                continue  # "gzip;q=0": rechazada explícitamente
+        except ValueError:
+            pass
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: cabecera gzip
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + self._brotli.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionStats:
+    """Respuestas y bytes antes y después de comprimir, por codificación"""
+
+    def __init__(self):
+        self.encodings: Dict[str, Dict[str, int]] = {}
+        self.skipped_small = 0
+
+    def record(self, encoding: str, raw: int, compressed: int):
+        stats = self.encodings.setdefault(encoding, {"responses": 0, "raw_bytes": 0, "compressed_bytes": 0})
+        stats["responses"] += 1
+        stats["raw_bytes"] += raw
+        stats["compressed_bytes"] += compressed
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.COMPRESSION_ENABLED,
+            "min_bytes": settings.COMPRESSION_MIN_BYTES,
+            "brotli_available": brotli is not None,
+            "skipped_small": self.skipped_small,
+            "encodings": {
+                encoding: {
+                    **stats,
+                    "ratio": round(stats["compressed_bytes"] / stats["raw_bytes"], 3) if stats["raw_bytes"] else None,
+                }
+                for encoding, stats in self.encodings.items()
+            },
+        }
+
+
+# Instancia global
+compression_stats = CompressionStats()
+
+
+class CompressionMiddleware:
+    """Middleware ASGI de compresión con umbral de tamaño
+
+    A diferencia de GZipMiddleware de Starlette, también comprime bien el
+    streaming: en text/event-stream cada fragmento se vacía con un flush de
+    sincronización, así el navegador recibe cada token al momento y el
+    diccionario del compresor se comparte entre eventos. Las respuestas
+    completas por debajo de COMPRESSION_MIN_BYTES se envían sin comprimir, y
+    solo se comprimen los tipos de texto (JSON, NDJSON, markdown, SSE); Parquet
+    y las respuestas que ya traen Content-Encoding pasan tal cual.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self.app, encoding)(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str):
+        self.app = app
+        self.encoding = encoding
+        self.send: Send = None
+        self.start: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+        self.flush_each_chunk = False
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _compressible(self, headers: Headers) -> Tuple[bool, str]:
+        content_type = headers.get("content-type", "")
+        if "content-encoding" in headers:
+            return False, content_type
+        return content_type.startswith(COMPRESSIBLE_TYPES + FLUSH_EACH_CHUNK_TYPES), content_type
+
+    def _compressed_start(self, content_length: Optional[int]) -> Message:
+        headers = MutableHeaders(raw=list(self.start["headers"]))
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+        return {**self.start, "headers": headers.raw}
+
+    async def send_compressed(self, message: Message):
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            # La cabecera se retiene hasta ver el primer fragmento del cuerpo
+            self.start = message
+            compressible, content_type = self._compressible(Headers(raw=message["headers"]))
+            if not compressible:
+                self.passthrough = True
+                await self.send(message)
+            self.flush_each_chunk = content_type.startswith(FLUSH_EACH_CHUNK_TYPES)
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body:
+                # Respuesta completa: se conoce el tamaño y se aplica el umbral
+                if len(body) < settings.COMPRESSION_MIN_BYTES:
+                    compression_stats.skipped_small += 1
+                    self.passthrough = True
+                    await self.send(self.start)
+                    await self.send(message)
+                    return
+                compressed = _Compressor(self.encoding).finish(body)
+                compression_stats.record(self.encoding, len(body), len(compressed))
+                await self.send(self._compressed_start(len(compressed)))
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            # Streaming: tamaño desconocido, se comprime sin Content-Length
+            self.compressor = _Compressor(self.encoding)
+            await self.send(self._compressed_start(None))
+
+        self.raw_bytes += len(body)
+        if more_body:
+            chunk = self.compressor.compress(body, flush=self.flush_each_chunk)
+            if chunk:
+                self.compressed_bytes += len(chunk)
+                await self.send({"type": "http.response.body", "body": chunk, "more_body": True})
+            return
+
+        chunk = self.compressor.finish(body)
+        self.compressed_bytes += len(chunk)
+        compression_stats.record(self.encoding, self.raw_bytes, self.compressed_bytes)
+        await self.send({"type": "http.response.body", "body": chunk})
+
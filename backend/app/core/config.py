@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 import os
 from dotenv import load_dotenv
 
@@ -16,9 +16,29 @@ class Settings(BaseSettings):
     
     # Base de datos (solo para conversaciones)
     DATABASE_URL: str = "sqlite:///./portfolio_chatbot.db"
+    SQL_ECHO: bool = False  # Registrar cada sentencia SQL (solo para depurar; es síncrono)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+
+    # PostgreSQL
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 15000  # Tope por sentencia en la primaria (0 = sin límite)
+    DB_READ_STATEMENT_TIMEOUT_MS: int = 60000  # En la réplica (analíticas y exportaciones)
+    DATABASE_READ_REPLICA_URL: Optional[str] = None  # Historial, analíticas y exportaciones
+
+    # Perfil de producción de SQLite (pragmas aplicados al abrir cada conexión)
+    SQLITE_JOURNAL_MODE: str = "WAL"  # Lectores y escritor no se bloquean entre sí
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_CACHE_SIZE_KB: int = 65536  # Caché de páginas por conexión
+    SQLITE_MMAP_SIZE_BYTES: int = 268435456  # 256 MiB de lecturas mapeadas en memoria
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # Espera por el bloqueo de escritura antes de fallar
     
     # OpenAI
     OPENAI_API_KEY: str
+    # URL base alternativa compatible con OpenAI (p. ej. benchmarks/mock_llm_server.py)
+    OPENAI_BASE_URL: Optional[str] = None
     
     # LangSmith
     LANGCHAIN_TRACING_V2: bool = os.getenv("LANGCHAIN_TRACING_V2", "false").lower() == "true"
@@ -44,11 +64,150 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+
+    # Endpoints de operador (exportaciones, trazas, retención...): cabecera X-Admin-Key.
+    # Sin valor quedan deshabilitados
+    ADMIN_API_KEY: Optional[str] = None
     
     # Configuración del chatbot
     MAX_CONVERSATION_HISTORY: int = 10
     TEMPERATURE: float = 0.7
-    
+    CHAT_HISTORY_FROM_DB: bool = False  # Sin historial en la petición, usar el guardado de la sesión
+    PIPELINE_PARALLEL_STAGES: bool = True  # Etapas previas al LLM a la vez; false = en serie (comparación)
+
+    # Compresión de respuestas HTTP (gzip siempre; brotli si está instalado)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024  # Respuestas completas más pequeñas van sin comprimir
+    COMPRESSION_GZIP_LEVEL: int = 4  # 6 ahorra ~15% más de bytes con más del doble de CPU
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # Chat por WebSocket (/chat/ws): una conexión por sesión
+    WS_MAX_CONNECTIONS: int = 2000  # Conexiones abiertas por worker; las siguientes se cierran con 1013
+    WS_IDLE_TIMEOUT_SECONDS: float = 600.0  # Sin mensajes del cliente se cierra con 4001
+    WS_TURN_TIMEOUT_SECONDS: float = 120.0  # Un turno en curso mantiene viva una sesión inactiva hasta este límite
+
+    # Resiliencia de llamadas al LLM
+    LLM_ATTEMPT_TIMEOUT_SECONDS: float = 20.0  # Deadline por intento
+    LLM_TOTAL_TIMEOUT_SECONDS: float = 45.0  # Deadline total incluyendo reintentos
+    LLM_MAX_RETRIES: int = 2
+    LLM_BACKOFF_BASE_SECONDS: float = 0.5
+    LLM_BACKOFF_MAX_SECONDS: float = 4.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
+    LLM_HEDGING_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 1.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+
+    # Cadena de fallback y enrutamiento por salud del modelo
+    MODEL_FALLBACK_CHAIN: List[str] = ["gpt-4o-mini"]  # Se prueban tras el modelo principal
+    MODEL_FALLBACK_SLICE_SECONDS: float = 15.0  # Deadline de cada modelo que no es el último
+    MODEL_ROUTER_WINDOW: int = 50
+    MODEL_ROUTER_MIN_SAMPLES: int = 10
+    MODEL_ROUTER_MAX_ERROR_RATE: float = 0.3
+    MODEL_ROUTER_MAX_P95_SECONDS: float = 12.0
+    MODEL_ROUTER_PROBE_RATE: float = 0.05
+
+    # Control de admisión y cancelación por desconexión del cliente
+    MAX_CONCURRENT_LLM_CALLS: int = 32  # Por worker
+    ADMISSION_TIMEOUT_SECONDS: float = 5.0  # Espera máxima por un hueco antes de responder 503
+    DISCONNECT_POLL_SECONDS: float = 0.5
+
+    # Idempotency-Key en POST /chat/
+    IDEMPOTENCY_TTL_SECONDS: float = 86400.0  # Tiempo que se guarda la respuesta para repetirla
+    IDEMPOTENCY_LOCK_SECONDS: float = 60.0  # Mayor que LLM_TOTAL_TIMEOUT_SECONDS
+    IDEMPOTENCY_POLL_SECONDS: float = 0.1
+
+    # Coalescing de preguntas idénticas en curso (single-flight)
+    REQUEST_COALESCING_ENABLED: bool = True
+
+    # Catálogo de modelos y modelo activo
+    MODEL_REGISTRY_TTL_SECONDS: float = 600.0
+    ACTIVE_MODEL_SYNC_SECONDS: float = 5.0  # Frecuencia de relectura desde el estado compartido
+
+    # Despliegue multi-worker y estado compartido
+    WEB_CONCURRENCY: int = 0  # Workers; 0 = según número de CPUs
+    STATE_BACKEND: str = "sqlite"  # "sqlite" (compartido entre workers) o "memory"
+    STATE_DB_PATH: str = "./shared_state.db"
+
+    # Respuestas deterministas desde la base de conocimientos (sin LLM)
+    FACT_ANSWERS_ENABLED: bool = True
+    FACT_ANSWER_INTENTS: List[str] = ["contact", "skills", "projects"]
+    FACT_TEMPLATES_DIR: Optional[str] = None  # Por defecto app/templates/facts
+
+    # Salida estructurada: "json_schema" (nativa del proveedor) o "prompt" (instrucciones de formato)
+    STRUCTURED_OUTPUT_MODE: str = "json_schema"
+
+    # Búsqueda de texto completo en conversaciones (FTS5 en SQLite, tsvector + GIN en PostgreSQL)
+    SEARCH_TS_CONFIG: str = "spanish"  # Configuración de to_tsvector; cambiarla requiere recrear el índice
+    SEARCH_MAX_LIMIT: int = 100
+    SEARCH_RANK_CANDIDATES: int = 2000  # Coincidencias más recientes entre las que se ordena por relevancia
+
+    # Exportación masiva de conversaciones
+    EXPORT_BATCH_SIZE: int = 1000
+    EXPORT_DIR: str = "./exports"
+
+    # Retención de conversaciones: particiones mensuales y archivado comprimido
+    RETENTION_ENABLED: bool = True
+    RETENTION_HOT_MONTHS: int = 6  # Meses completos que se conservan además del mes en curso
+    RETENTION_IDLE_SESSION_HOURS: float = 24.0  # Sin mensajes en este tiempo, la sesión pasa a inactiva
+    RETENTION_INTERVAL_SECONDS: float = 3600.0
+    RETENTION_DELETE_BATCH_SIZE: int = 5000
+    RETENTION_ARCHIVE_DIR: str = "./archive"
+    RETENTION_PARTITIONS_AHEAD: int = 2  # Particiones futuras creadas por adelantado (PostgreSQL)
+
+    # Trazas locales por petición (etapas, latencia, tokens) para analíticas sin servicio externo
+    TRACE_ENABLED: bool = True
+    TRACE_DB_PATH: str = "./traces.db"
+    TRACE_FLUSH_INTERVAL_SECONDS: float = 2.0
+    TRACE_BUFFER_MAX: int = 10000  # Trazas pendientes de escribir; por encima se descartan
+    TRACE_RETENTION_DAYS: int = 30
+    TRACE_FORWARD_LANGSMITH: bool = False  # Reenviar en lotes a LangSmith desde la tarea de fondo
+
+    # Exportación a LangSmith en segundo plano (trazas, feedback, datasets)
+    LANGSMITH_SAMPLE_RATE: float = 1.0  # Fracción de peticiones trazadas
+    LANGSMITH_QUEUE_MAX: int = 5000  # Operaciones pendientes; por encima se descartan
+    LANGSMITH_BATCH_SIZE: int = 100
+    LANGSMITH_FLUSH_INTERVAL_SECONDS: float = 1.0
+    LANGSMITH_MAX_RETRIES: int = 3
+    LANGSMITH_RETRY_BACKOFF_SECONDS: float = 0.5
+
+    # Caché de respuestas
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600.0
+
+    # Precalentamiento de la caché con las preguntas más frecuentes del historial
+    CACHE_WARMUP_ENABLED: bool = True
+    CACHE_WARMUP_TOP_N: int = 10  # Preguntas por intención
+    CACHE_WARMUP_MIN_COUNT: int = 3  # Repeticiones mínimas para considerarla frecuente
+    CACHE_WARMUP_WINDOW_DAYS: float = 30.0
+    CACHE_WARMUP_INTERVAL_SECONDS: float = 1800.0  # Menor que RESPONSE_CACHE_TTL_SECONDS
+    CACHE_WARMUP_CONCURRENCY: int = 2  # Llamadas simultáneas al LLM del precalentamiento
+
+    # Sugerencias de seguimiento precalculadas desde la base de conocimientos
+    SUGGESTIONS_ENABLED: bool = True
+    SUGGESTIONS_MAX: int = 3  # Sugerencias por respuesta
+    SUGGESTION_PREFETCH_ENABLED: bool = False  # Generar en segundo plano la primera que necesita LLM
+    SUGGESTION_PREFETCH_CONCURRENCY: int = 2  # Precargas simultáneas por worker; el resto se descarta
+
+    # Presupuesto de tokens de salida (max_tokens) por intención
+    OUTPUT_TOKEN_BUDGETS: Dict[str, int] = {"contact": 250, "skills": 600, "projects": 1000, "general": 800}
+    OUTPUT_BUDGET_ADAPTIVE: bool = True  # Ajustar desde los completion_tokens guardados en Message
+    OUTPUT_BUDGET_PERCENTILE: float = 0.95
+    OUTPUT_BUDGET_HEADROOM: float = 1.25  # Margen sobre el percentil observado
+    OUTPUT_BUDGET_MIN_TOKENS: int = 150
+    OUTPUT_BUDGET_MAX_TOKENS: int = 1500
+    OUTPUT_BUDGET_MIN_SAMPLES: int = 50  # Por intención; con menos se usa el estático
+    OUTPUT_BUDGET_SAMPLE_SIZE: int = 500  # Últimas respuestas consideradas por intención
+    OUTPUT_BUDGET_WINDOW_DAYS: float = 7.0
+    OUTPUT_BUDGET_TRUNCATION_RATE: float = 0.05  # Respuestas que llegan al límite antes de ampliarlo
+    OUTPUT_BUDGET_REFRESH_SECONDS: float = 600.0
+
+    # Rate limiting por cliente (0 = deshabilitado)
+    RATE_LIMIT_PER_MINUTE: int = 0
+    # Proxies de confianza delante del backend (p. ej. 1 en Render); 0 = se ignora X-Forwarded-For
+    TRUSTED_PROXY_HOPS: int = 0
+
     class Config:
         env_file = ".env"
         case_sensitive = True
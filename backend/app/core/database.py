@@ -1,31 +1,118 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Dict, List, Optional
 import asyncio
+from loguru import logger
 
 from app.core.config import settings
 
 # Base para modelos
 Base = declarative_base()
 
-# Motor de base de datos síncrono
-if "postgresql" in settings.DATABASE_URL:
-    database_url = settings.DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://")
-else:
-    database_url = settings.DATABASE_URL
 
-engine = create_engine(database_url, echo=settings.DEBUG)
+def sqlite_pragmas() -> Dict[str, Any]:
+    """Pragmas del perfil de producción de SQLite
+
+    En WAL los lectores no bloquean al escritor ni al revés; synchronous=NORMAL
+    es seguro en WAL (solo se puede perder la última transacción ante un corte
+    de luz) y busy_timeout hace que un escritor espere el bloqueo en vez de
+    fallar con "database is locked".
+    """
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,  # Negativo = KiB en vez de páginas
+        "mmap_size": settings.SQLITE_MMAP_SIZE_BYTES,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+    }
+
+
+def _postgres_pool_options() -> Dict[str, Any]:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,  # Antes de que un proxy/servidor corte la conexión
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,  # Descarta conexiones muertas tras un failover
+    }
+
+
+def create_database_engine(
+    url: str,
+    pragmas: Optional[Dict[str, Any]] = None,
+    statement_timeout_ms: Optional[int] = None
+) -> Engine:
+    """Motor síncrono según el tipo de base de datos
+
+    SQLite en fichero usa un pool de conexiones (cada hilo lee en paralelo en WAL)
+    y aplica los pragmas al abrir cada conexión. PostgreSQL usa un pool dimensionado
+    con pre-ping y reciclado, y statement_timeout fijado en el servidor para cada
+    conexión. El eco SQL solo se activa con SQL_ECHO.
+    """
+    if url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+psycopg2://")
+    if url.startswith("postgresql"):
+        timeout_ms = settings.DB_STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms
+        return create_engine(
+            url,
+            echo=settings.SQL_ECHO,
+            connect_args={"options": f"-c statement_timeout={timeout_ms}"},
+            **_postgres_pool_options()
+        )
+    if not url.startswith("sqlite"):
+        return create_engine(url, echo=settings.SQL_ECHO)
+
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    if in_memory:
+        return create_engine(url, echo=settings.SQL_ECHO)
+
+    db_engine = create_engine(
+        url,
+        echo=settings.SQL_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        connect_args={"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000},
+    )
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(db_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return db_engine
+
+
+# Motor de base de datos síncrono (primaria: todas las escrituras)
+engine = create_database_engine(settings.DATABASE_URL)
 
 # Sesión síncrona
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Réplica de lectura opcional para historial, analíticas y exportaciones; sin ella se lee de la primaria
+if settings.DATABASE_READ_REPLICA_URL:
+    read_engine = create_database_engine(
+        settings.DATABASE_READ_REPLICA_URL,
+        statement_timeout_ms=settings.DB_READ_STATEMENT_TIMEOUT_MS
+    )
+else:
+    read_engine = engine
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 # Motor asíncrono (para PostgreSQL)
 if "postgresql" in settings.DATABASE_URL:
     async_engine = create_async_engine(
         settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
-        echo=settings.DEBUG
+        echo=settings.SQL_ECHO,
+        connect_args={"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}},
+        **_postgres_pool_options()
     )
     AsyncSessionLocal = async_sessionmaker(
         async_engine, class_=AsyncSession, expire_on_commit=False
@@ -45,6 +132,19 @@ def get_db() -> Session:
         db.close()
 
 
+def get_read_db() -> Session:
+    """Sesión de solo lectura: réplica si está configurada, si no la primaria
+
+    La réplica puede ir unos instantes por detrás; no usar para leer lo que
+    la misma petición acaba de escribir.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependencia para obtener sesión de base de datos asíncrona"""
     if AsyncSessionLocal is None:
@@ -54,10 +154,153 @@ async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+def _pool_snapshot(db_engine: Engine) -> Dict[str, Any]:
+    pool = db_engine.pool
+    snapshot: Dict[str, Any] = {"dialect": db_engine.dialect.name}
+    if hasattr(pool, "checkedout"):
+        snapshot.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return snapshot
+
+
+def database_snapshot() -> Dict[str, Any]:
+    """Uso de los pools de conexiones (primaria y réplica de lectura)"""
+    return {
+        "primary": _pool_snapshot(engine),
+        "read_replica": _pool_snapshot(read_engine) if read_engine is not engine else None,
+    }
+
+
+def add_missing_columns(conn) -> List[str]:
+    """Añadir a las tablas existentes las columnas nuevas de los modelos
+
+    create_all no modifica tablas ya creadas; las columnas añadidas después
+    (con server_default si no admiten NULL) se crean con ALTER TABLE ADD COLUMN.
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT '{column.server_default.arg}'"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            conn.execute(text(ddl))
+            added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info(f"Columnas añadidas a tablas existentes: {', '.join(added)}")
+    return added
+
+
+def add_missing_indexes(conn) -> List[str]:
+    """Crear en las tablas existentes los índices nuevos de los modelos"""
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=conn)
+                added.append(index.name)
+    if added:
+        logger.info(f"Índices añadidos a tablas existentes: {', '.join(added)}")
+    return added
+
+
+SEARCH_INDEX_NAME = "ix_messages_content_fts"
+
+
+def search_index_exists(conn) -> bool:
+    """Si la base de datos ya tiene el índice de texto completo de messages"""
+    if conn.dialect.name == "postgresql":
+        return conn.execute(
+            text("SELECT 1 FROM pg_indexes WHERE indexname = :name"), {"name": SEARCH_INDEX_NAME}
+        ).first() is not None
+    return conn.dialect.name == "sqlite" and "messages_fts" in inspect(conn).get_table_names()
+
+
+def create_search_index(conn) -> bool:
+    """Índice de texto completo sobre messages.content; devuelve si está disponible
+
+    - SQLite: tabla FTS5 de contenido externo (messages_fts, rowid = messages.id)
+      que mantiene _save_conversation; al crearla se indexa lo ya guardado.
+    - PostgreSQL: índice GIN sobre to_tsvector(SEARCH_TS_CONFIG, content); lo
+      mantiene el propio servidor.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX_NAME} ON messages "
+            f"USING GIN (to_tsvector('{settings.SEARCH_TS_CONFIG}', content))"
+        ))
+        return True
+    if conn.dialect.name != "sqlite":
+        return False
+
+    if "messages_fts" in inspect(conn).get_table_names():
+        return True
+    try:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE messages_fts USING fts5("
+            "content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        ))
+    except Exception as e:  # SQLite compilado sin FTS5
+        logger.warning(f"Búsqueda de texto completo no disponible: {e}")
+        return False
+    conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+    logger.info("Índice de texto completo messages_fts creado")
+    return True
+
+
+def _create_schema(conn):
+    Base.metadata.create_all(bind=conn)
+    add_missing_columns(conn)
+    add_missing_indexes(conn)
+    try:
+        # En un savepoint: en PostgreSQL un CREATE INDEX fallido invalidaría el resto de la transacción
+        with conn.begin_nested():
+            create_search_index(conn)
+    except Exception as e:
+        logger.warning(f"No se pudo crear el índice de texto completo, la búsqueda queda deshabilitada: {e}")
+
+
 async def init_db():
     """Inicializar base de datos"""
+    import app.models.conversation  # noqa: F401  Registra las tablas en Base.metadata
+
     if async_engine:
         async with async_engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_create_schema)
     else:
-        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            _create_schema(conn)
+
+    from app.services.search_service import search_index
+    search_index.refresh()  # El índice pudo crearse ahora: volver a comprobarlo en el próximo uso
+
+
+async def dispose_engines():
+    """Cerrar las conexiones abiertas de todos los pools"""
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+    if read_engine is not engine:
+        read_engine.dispose()
+
+
+async def init_db_before_fork():
+    """init_db en el proceso maestro, antes de lanzar los workers
+
+    Después se cierran sus conexiones: un worker no debe heredar por fork
+    conexiones del pool del maestro (compartirían socket o descriptor).
+    """
+    await init_db()
+    await dispose_engines()
@@ -0,0 +1,24 @@
+"""
+Autenticación de los endpoints de operador (exportaciones, trazas, retención, precalentamiento)
+"""
+
+import secrets
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from app.core.config import settings
+
+
+async def require_admin(x_admin_key: Optional[str] = Header(None, alias="X-Admin-Key")):
+    """Dependency que exige la cabecera X-Admin-Key igual a ADMIN_API_KEY
+
+    Sin ADMIN_API_KEY configurada responde 403: estos endpoints leen o borran
+    datos de todos los visitantes, así que no se exponen por defecto.
+    """
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Endpoint de operador deshabilitado (configura ADMIN_API_KEY)")
+    if x_admin_key is None or not secrets.compare_digest(
+        x_admin_key.encode("utf-8"), settings.ADMIN_API_KEY.encode("utf-8")
+    ):
+        raise HTTPException(status_code=401, detail="X-Admin-Key ausente o incorrecta")
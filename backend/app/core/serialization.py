@@ -0,0 +1,45 @@
+"""
+Serialización JSON de las respuestas de la API: orjson si está instalado, json de la stdlib si no
+"""
+
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional (lo instala langsmith): pip install orjson
+    orjson = None
+
+
+# Clase de respuesta por defecto de la app (FastAPI(default_response_class=...))
+DefaultJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+
+def _default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(value: Any) -> str:
+    """JSON compacto sin escapar acentos, para eventos SSE y WebSocket"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+def json_response(content: Any, status_code: int = 200) -> Response:
+    """Respuesta con contenido ya compatible con JSON (dicts, listas, datetimes)
+
+    Se salta la validación del response_model y jsonable_encoder: para las
+    páginas de historial, construir y volver a recorrer un modelo por mensaje
+    costaba más que la propia serialización. Sin orjson se recorre con
+    jsonable_encoder para convertir los datetimes.
+    """
+    if orjson is not None:
+        return ORJSONResponse(content, status_code=status_code)
+    return JSONResponse(jsonable_encoder(content), status_code=status_code)
@@ -0,0 +1,187 @@
+"""
+Estado compartido entre peticiones y workers (modelo activo, caché de respuestas, contadores)
+detrás de un backend intercambiable
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+
+
+class StateBackend(ABC):
+    """Almacén clave-valor con expiración opcional"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Valor de la clave o None si no existe o expiró"""
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        """Guardar un valor, opcionalmente con expiración"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Eliminar una clave"""
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        """Incrementar un contador; el TTL se fija al crearlo (ventana fija)"""
+
+    def get_json(self, key: str) -> Optional[Any]:
+        raw = self.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set_json(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        self.set(key, json.dumps(value, ensure_ascii=False, default=str), ttl_seconds)
+
+    def purge_expired(self) -> int:
+        """Eliminar entradas expiradas; devuelve cuántas se eliminaron"""
+        return 0
+
+
+class MemoryStateBackend(StateBackend):
+    """Backend en memoria del proceso: el más rápido, pero no se comparte entre workers"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl_seconds if ttl_seconds else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                value, expires_at = amount, time.time() + ttl_seconds if ttl_seconds else None
+            else:
+                value, expires_at = int(entry[0]) + amount, entry[1]
+            self._data[key] = (str(value), expires_at)
+            return value
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+            for key in expired:
+                del self._data[key]
+            return len(expired)
+
+
+class SQLiteStateBackend(StateBackend):
+    """Backend en un fichero SQLite local (WAL): compartido por todos los workers de la máquina"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_kv_expires_at ON kv (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Una conexión por hilo; autocommit con WAL para lecturas concurrentes"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        self._connection().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, time.time() + ttl_seconds if ttl_seconds else None)
+        )
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        now = time.time()
+        row = self._connection().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "value = CASE WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ? "
+            "THEN excluded.value ELSE CAST(kv.value AS INTEGER) + ? END, "
+            "expires_at = CASE WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ? "
+            "THEN excluded.expires_at ELSE kv.expires_at END "
+            "RETURNING value",
+            (key, str(amount), now + ttl_seconds if ttl_seconds else None, now, amount, now)
+        ).fetchone()
+        return int(row[0])
+
+    def purge_expired(self) -> int:
+        cursor = self._connection().execute(
+            "DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+
+_backend: Optional[StateBackend] = None
+
+
+def get_state_backend() -> StateBackend:
+    """Backend de estado configurado (STATE_BACKEND), creado una vez por proceso"""
+    global _backend
+    if _backend is None:
+        if settings.STATE_BACKEND == "sqlite":
+            _backend = SQLiteStateBackend(settings.STATE_DB_PATH)
+        elif settings.STATE_BACKEND == "memory":
+            _backend = MemoryStateBackend()
+        else:
+            raise ValueError(f"STATE_BACKEND no soportado: {settings.STATE_BACKEND}")
+        logger.info(f"Backend de estado compartido: {settings.STATE_BACKEND}")
+    return _backend
+
+
+async def purge_expired_periodically(interval_seconds: float = 600.0):
+    """Tarea de fondo que limpia entradas expiradas (contadores, caché) del backend"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            removed = await asyncio.to_thread(get_state_backend().purge_expired)
+            if removed:
+                logger.info(f"Estado compartido: {removed} entradas expiradas eliminadas")
+        except Exception as e:
+            logger.warning(f"Error limpiando estado compartido: {e}")
@@ -24,14 +24,17 @@ class Message(Base):
     __tablename__ = "messages"
 
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, index=True)
     role = Column(String(50), nullable=False)  # 'user' o 'assistant'
     content = Column(Text, nullable=False)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # Clave de partición mensual
     
     # Metadatos para análisis
     tokens_used = Column(Integer, nullable=True)
     response_time_ms = Column(Integer, nullable=True)
+    outcome = Column(String(20), nullable=False, default="completed", server_default="completed")  # 'completed' o 'cancelled'
+    intent = Column(String(20), nullable=True, index=True)
+    completion_tokens = Column(Integer, nullable=True)  # Solo respuestas generadas por el LLM (presupuestos de salida)
     
     # Relación con conversación
     conversation = relationship("Conversation", back_populates="messages")
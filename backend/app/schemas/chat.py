@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -25,6 +25,13 @@ class ChatRequest(BaseModel):
     temperature: float = Field(0.7, ge=0.0, le=2.0, description="Temperatura para generación")
 
 
+class ChatSocketMessage(BaseModel):
+    """Mensaje del cliente por WebSocket: una pregunta, cancelar el turno en curso o ping"""
+    type: Literal["message", "cancel", "ping"] = "message"
+    message: Optional[str] = Field(None, min_length=1, max_length=2000, description="Obligatorio con type=message")
+    temperature: float = Field(0.7, ge=0.0, le=2.0, description="Temperatura para generación")
+
+
 class ChatResponse(BaseModel):
     """Esquema para respuesta de chat"""
     response: str
@@ -32,6 +39,7 @@ class ChatResponse(BaseModel):
     timestamp: datetime
     tokens_used: Optional[int] = None
     response_time_ms: Optional[int] = None
+    suggestions: List[str] = Field(default_factory=list, description="Preguntas de seguimiento sugeridas")
 
 
 class ConversationSummary(BaseModel):
@@ -52,3 +60,22 @@ class MessageDetail(BaseModel):
     timestamp: datetime
     tokens_used: Optional[int] = None
     response_time_ms: Optional[int] = None
+
+
+class SearchHit(BaseModel):
+    """Mensaje encontrado por la búsqueda de texto completo"""
+    message_id: int
+    session_id: str
+    role: MessageRole
+    timestamp: datetime
+    score: float
+    snippet: str
+
+
+class SearchResults(BaseModel):
+    """Página de resultados de búsqueda ordenados por relevancia"""
+    query: str
+    hits: List[SearchHit]
+    limit: int
+    offset: int
+    next_offset: Optional[int] = None
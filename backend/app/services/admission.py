@@ -0,0 +1,101 @@
+"""
+Control de admisión de llamadas al LLM y cancelación cuando el cliente se desconecta
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, TypeVar
+
+from fastapi import Request
+from loguru import logger
+
+from app.core.config import settings
+from app.services.resilience import LLMUnavailableError
+
+T = TypeVar("T")
+
+
+class AdmissionRejected(LLMUnavailableError):
+    """No quedó un hueco libre para llamar al LLM dentro de ADMISSION_TIMEOUT_SECONDS"""
+
+
+class ClientDisconnected(Exception):
+    """El cliente cerró la conexión antes de recibir la respuesta"""
+
+
+class AdmissionController:
+    """Limita las llamadas concurrentes al LLM por proceso
+
+    Solo ocupan hueco las peticiones que llegan al modelo: respuestas de la base
+    de conocimientos y aciertos de caché no esperan, y las peticiones coalescidas
+    comparten el hueco de la única llamada upstream. Una petición cancelada
+    libera su hueco en cuanto se propaga la cancelación.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), settings.ADMISSION_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise AdmissionRejected(f"Capacidad del LLM agotada ({self.limit} peticiones en curso)")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+        }
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """Esperar el resultado vigilando la conexión; si el cliente se va se cancela el trabajo
+
+    La cancelación llega hasta la llamada HTTP al proveedor (y, con coalescing,
+    solo si nadie más espera la misma respuesta).
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Cliente desconectado: cancelando la generación en curso")
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+# Instancia global
+llm_admission = AdmissionController(settings.MAX_CONCURRENT_LLM_CALLS)
@@ -0,0 +1,43 @@
+"""
+Normalización de mensajes y claves de prompt compartidas por coalescing y caché de respuestas
+"""
+
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " ¿?¡!.,;:"
+
+
+def normalize_message(message: str) -> str:
+    """Normalizar un mensaje para que variaciones triviales compartan clave
+
+    Unifica formas Unicode, mayúsculas, espacios y la puntuación de los extremos
+    ("¿Qué proyectos tienes?" == "que proyectos tienes" salvo por la tilde).
+    """
+    text = unicodedata.normalize("NFKC", message).casefold()
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text.strip(_EDGE_PUNCTUATION)
+
+
+def prompt_cache_key(
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    model: str = "",
+    temperature: Optional[float] = None
+) -> str:
+    """Clave estable para un prompt: mensaje e historial normalizados, modelo y temperatura"""
+    payload = {
+        "m": normalize_message(message),
+        "h": [
+            [msg.get("role", ""), normalize_message(msg.get("content", ""))]
+            for msg in (history or [])
+        ],
+        "model": model,
+        "t": round(temperature, 2) if temperature is not None else None,
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return "prompt:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
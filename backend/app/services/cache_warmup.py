@@ -0,0 +1,215 @@
+"""
+Preguntas frecuentes extraídas del historial y precalentamiento de la caché de respuestas
+"""
+
+import asyncio
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import ReadSessionLocal
+from app.core.state import get_state_backend
+from app.models.conversation import Message
+from app.services.cache_keys import normalize_message
+from app.services.chat_service import ChatService
+from app.services.fact_answers import FACT_MODEL_ID
+from app.services.prompt_service import prompt_service
+
+LOCK_KEY = "cache-warmup:lock"
+RUNNING_KEY = "cache-warmup:running"
+WARMUP_SESSION_ID = "cache-warmup"
+
+
+class WarmupInProgress(Exception):
+    """Ya hay un ciclo de precalentamiento en curso (en este u otro worker)"""
+
+
+def mine_frequent_questions(
+    top_n: Optional[int] = None,
+    window_days: Optional[float] = None,
+    min_count: Optional[int] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Preguntas de usuario más repetidas por intención
+
+    Cada grupo reúne los mensajes con el mismo texto normalizado (normalize_message),
+    es decir, los que comparten entrada en la caché de respuestas. Como pregunta
+    representativa se usa la variante literal más frecuente del grupo.
+    """
+    top_n = top_n or settings.CACHE_WARMUP_TOP_N
+    window_days = window_days or settings.CACHE_WARMUP_WINDOW_DAYS
+    min_count = min_count or settings.CACHE_WARMUP_MIN_COUNT
+
+    since = datetime.now() - timedelta(days=window_days)
+    query = (
+        select(Message.content)
+        .where(Message.role == "user", Message.outcome == "completed", Message.timestamp >= since)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+    counts: Counter = Counter()
+    variants: Dict[str, Counter] = defaultdict(Counter)
+    db = ReadSessionLocal()
+    try:
+        for content in db.execute(query).scalars():
+            key = normalize_message(content)
+            if not key:
+                continue
+            counts[key] += 1
+            variants[key][content.strip()] += 1
+    finally:
+        db.close()
+
+    by_intent: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for key, count in counts.most_common():
+        if count < min_count:
+            break
+        question = variants[key].most_common(1)[0][0]
+        intent = prompt_service.classify_query_intent(question)
+        if len(by_intent[intent]) < top_n:
+            by_intent[intent].append({"question": question, "count": count, "variants": len(variants[key])})
+    return dict(by_intent)
+
+
+class CacheWarmer:
+    """Genera por adelantado las respuestas de las preguntas más frecuentes
+
+    Usa el mismo camino que una petición normal (ChatService.generate_response,
+    sin historial y con la temperatura por defecto), así que las respuestas quedan
+    bajo la misma clave de caché que consultará el primer visitante. No guarda
+    conversaciones, y sus trazas usan el nombre "warmup". Las preguntas que ya
+    están en caché o que se responden desde la base de conocimientos no llaman
+    al LLM.
+
+    Solo corre un ciclo a la vez en todo el despliegue: el periódico y los
+    lanzados a mano desde /chat/cache/warmup se excluyen con una marca en este
+    proceso y otra en el backend de estado compartido.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self.runs = 0
+        self.generated = 0
+        self.already_cached = 0
+        self.facts = 0
+        self.failed = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    async def warm(self) -> Dict[str, Any]:
+        """Un ciclo: minar preguntas frecuentes y generar las que falten en caché
+
+        Lanza WarmupInProgress si ya hay otro ciclo en marcha.
+        """
+        if self._running:
+            raise WarmupInProgress("Ya hay un precalentamiento en curso en este worker")
+        self._running = True
+        try:
+            # La marca caduca sola si el worker que la tiene muere a mitad del ciclo
+            claimed = await asyncio.to_thread(
+                get_state_backend().incr, RUNNING_KEY, ttl_seconds=settings.CACHE_WARMUP_INTERVAL_SECONDS
+            )
+            if claimed != 1:
+                raise WarmupInProgress("Ya hay un precalentamiento en curso en otro worker")
+            try:
+                return await self._warm()
+            finally:
+                await asyncio.to_thread(get_state_backend().delete, RUNNING_KEY)
+        finally:
+            self._running = False
+
+    async def _warm(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        questions = await asyncio.to_thread(mine_frequent_questions)
+        chat_service = ChatService()
+        semaphore = asyncio.Semaphore(settings.CACHE_WARMUP_CONCURRENCY)
+        outcomes: Counter = Counter()
+
+        async def warm_one(question: str):
+            async with semaphore:
+                try:
+                    result = await chat_service.generate_response(
+                        message=question,
+                        session_id=WARMUP_SESSION_ID,
+                        temperature=settings.TEMPERATURE,
+                        persist=False,
+                        run_name="warmup"
+                    )
+                except Exception as e:
+                    logger.warning(f"Precalentamiento: error generando '{question[:60]}': {e}")
+                    outcomes["failed"] += 1
+                    return
+                if result["model_used"] == FACT_MODEL_ID:
+                    outcomes["facts"] += 1
+                elif result["cached"]:
+                    outcomes["already_cached"] += 1
+                else:
+                    outcomes["generated"] += 1
+
+        await asyncio.gather(*(
+            warm_one(item["question"]) for items in questions.values() for item in items
+        ))
+
+        self.runs += 1
+        self.generated += outcomes["generated"]
+        self.already_cached += outcomes["already_cached"]
+        self.facts += outcomes["facts"]
+        self.failed += outcomes["failed"]
+        self.last_run = {
+            "finished_at": datetime.now().isoformat(),
+            "duration_ms": int((time.perf_counter() - started) * 1000),
+            "questions": sum(len(items) for items in questions.values()),
+            "by_intent": {intent: len(items) for intent, items in questions.items()},
+            **{key: outcomes[key] for key in ("generated", "already_cached", "facts", "failed")},
+        }
+        if outcomes["generated"]:
+            logger.info(f"Precalentamiento: {outcomes['generated']} respuestas frecuentes generadas en caché")
+        return self.last_run
+
+    async def warm_periodically(self):
+        """Tarea de fondo: un ciclo al arrancar y cada CACHE_WARMUP_INTERVAL_SECONDS en un único worker"""
+        while True:
+            try:
+                # Solo el worker que reclama el turno ejecuta el ciclo
+                claimed = await asyncio.to_thread(
+                    get_state_backend().incr, LOCK_KEY, ttl_seconds=settings.CACHE_WARMUP_INTERVAL_SECONDS
+                )
+                if claimed == 1:
+                    await self.warm()
+            except WarmupInProgress as e:
+                logger.info(f"Precalentamiento periódico omitido: {e}")
+            except Exception as e:
+                logger.warning(f"Error en el precalentamiento de caché: {e}")
+            await asyncio.sleep(settings.CACHE_WARMUP_INTERVAL_SECONDS)
+
+    def start(self):
+        """Iniciar el precalentamiento en segundo plano (llamar desde el lifespan de la app)"""
+        if self._task is None and settings.CACHE_WARMUP_ENABLED and settings.RESPONSE_CACHE_ENABLED:
+            self._task = asyncio.ensure_future(self.warm_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.CACHE_WARMUP_ENABLED,
+            "runs": self.runs,
+            "generated": self.generated,
+            "already_cached": self.already_cached,
+            "facts": self.facts,
+            "failed": self.failed,
+            "last_run": self.last_run,
+        }
+
+
+# Instancia global
+cache_warmer = CacheWarmer()
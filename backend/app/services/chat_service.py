@@ -1,74 +1,55 @@
 import openai
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import AsyncIterator, Iterable, List, Dict, Any, Optional, Tuple
+from itertools import islice
+from contextlib import aclosing
 import time
 import json
-import os
 from datetime import datetime
 from loguru import logger
 
 from app.core.config import settings
-from app.services.prompt_service import prompt_service
+from app.services.prompt_service import STRUCTURED_SCHEMAS, prompt_service
+from app.services.model_router import model_router
+from app.services.coalescing import llm_single_flight
+from app.services.cache_keys import prompt_cache_key
+from app.services.model_registry import active_model, model_registry
+from app.services.search_service import search_index
+from app.services.response_cache import response_cache
+from app.services.fact_answers import FACT_MODEL_ID, fact_answers
+from app.services.suggestions import suggestion_service
+from app.services.token_budgets import token_budgets
+from app.services.structured_output import IncrementalMarkdown, finalize
+from app.services.tracing import RunTrace, TokenUsageCallback, trace_recorder
+from app.services.langsmith_exporter import langsmith_exporter
+from app.services.admission import llm_admission
+from app.services.rate_limiter import RateLimitExceeded, rate_limiter
+from app.services.stages import StageGraph
 from app.models.conversation import Conversation, Message
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.output_parsers import StrOutputParser
 from app.schemas.chat import ChatMessage, MessageRole
 
-# LangSmith imports
-from langsmith import Client
-from langchain_core.tracers import LangChainTracer
-from langchain_core.callbacks import CallbackManager
 from langchain_core.runnables import RunnableConfig
+from starlette.concurrency import iterate_in_threadpool
+
+
+def _batched(items: Iterable, size: int) -> Iterable[List]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 
 class ChatService:
     """Servicio principal para el chatbot especializado"""
     
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.current_model = settings.FINE_TUNING_MODEL  # Modelo por defecto
-        
-        # Configurar LangSmith
-        self._setup_langsmith()
-    
-    def _setup_langsmith(self):
-        """Configurar LangSmith para tracing y monitoring"""
-        try:
-            if settings.LANGCHAIN_TRACING_V2 and settings.LANGCHAIN_API_KEY:
-                # Configurar variables de entorno para LangSmith
-                os.environ["LANGCHAIN_TRACING_V2"] = "true"
-                os.environ["LANGCHAIN_API_KEY"] = settings.LANGCHAIN_API_KEY
-                os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
-                os.environ["LANGCHAIN_ENDPOINT"] = settings.LANGCHAIN_ENDPOINT
-                
-                # Inicializar cliente de LangSmith
-                self.langsmith_client = Client(
-                    api_key=settings.LANGCHAIN_API_KEY,
-                    api_url=settings.LANGCHAIN_ENDPOINT
-                )
-                
-                # Configurar tracer
-                self.tracer = LangChainTracer(
-                    project_name=settings.LANGCHAIN_PROJECT,
-                    client=self.langsmith_client
-                )
-                
-                # Configurar callback manager
-                self.callback_manager = CallbackManager([self.tracer])
-                
-                logger.info(f"LangSmith configurado exitosamente para proyecto: {settings.LANGCHAIN_PROJECT}")
-            else:
-                self.langsmith_client = None
-                self.tracer = None
-                self.callback_manager = None
-                logger.info("LangSmith no está habilitado")
-                
-        except Exception as e:
-            logger.warning(f"Error configurando LangSmith: {e}")
-            self.langsmith_client = None
-            self.tracer = None
-            self.callback_manager = None
+    @property
+    def current_model(self) -> str:
+        """Modelo activo compartido por el proceso (y entre workers si se persiste)"""
+        return active_model.get()
     
     async def generate_response(
         self,
@@ -78,99 +59,85 @@ class ChatService:
         user_id: Optional[str] = None,
 
         temperature: float = 0.7,
-        model_override: Optional[str] = None
+        model_override: Optional[str] = None,
+        persist: bool = True,
+        run_name: str = "chat",
+        client_id: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Generar respuesta del chatbot usando prompt especializado"""
+        """Generar respuesta del chatbot usando prompt especializado
+
+        Con persist=False no se guarda la conversación (precalentamiento de caché);
+        run_name separa esas ejecuciones en las trazas. Con client_id se aplica el
+        rate limit como una etapa más de la preparación (RateLimitExceeded).
+        """
         
         start_time = time.time()
+        trace = trace_recorder.start(run_name, session_id, user_id)
         
         try:
-            # Preparar historial de conversación
-            history = []
-            if conversation_history:
-                history = [
-                    {"role": msg.role.value, "content": msg.content} 
-                    for msg in conversation_history[-settings.MAX_CONVERSATION_HISTORY:]
-                ]
-            
-
-            # Usar el sistema de prompts optimizado
-            prompt_config = prompt_service.get_optimized_prompt(message, history)
-            template = prompt_config["template"]
-            parser = prompt_config["parser"]
-            variables = prompt_config["variables"]
-            
-            # Generar prompt messages usando el template optimizado
-            prompt_messages = template.format_messages(**variables)
-            
-            # Generar respuesta con LangChain runnables (pipeline simple)
-            model_to_use = model_override or self.current_model
-            llm = ChatOpenAI(
-                model=model_to_use, 
-                temperature=temperature, 
-                api_key=settings.OPENAI_API_KEY
-            ).bind(max_tokens=1000)
+            # Cadena de modelos: override explícito o modelo principal + fallbacks
+            if model_override:
+                model_chain = [model_override]
+            else:
+                model_chain = model_router.build_chain(await active_model.aget())
 
-            # Crear pipeline optimizado con parser
-            chat_model = llm.with_config(
-                {"run_name": f"chat_model_{model_to_use}"}
+            # Historial, intención, respuesta determinista, caché y prompt como grafo de etapas
+            plan = await self._prepare(
+                message, session_id, conversation_history, model_chain, temperature, trace,
+                allow_facts=not model_override, client_id=client_id
             )
-            
-            # Pipeline: template -> model -> parser
-            pipeline = template | chat_model | parser
-            
-            # Configurar tracing si está disponible
-            config = {}
-            if self.callback_manager:
-                config = RunnableConfig(
-                    callbacks=self.callback_manager,
-                    tags=[
-                        "esteban-portfolio", 
-                        "chatbot", 
-                        f"model:{model_to_use}",
-                        f"session:{session_id}"
-                    ],
-                    metadata={
-                        "session_id": session_id,
-                        "user_id": user_id or "anonymous",
-                        "model": model_to_use,
-                        "temperature": temperature,
-                        "message_length": len(message),
-                        "conversation_length": len(history) if history else 0
-                    }
-                )
-            
-            # Invocar pipeline con configuración de tracing
-            lc_output = pipeline.invoke(variables, config=config)
-            
-            # Manejar diferentes tipos de respuesta (estructurada vs string)
-            if isinstance(lc_output, str):
-                content = lc_output
+            history, intent, cache_key, cached = plan["history"], plan["intent"], plan["cache_key"], plan["cached"]
+            completion_tokens = None
+            if plan["fact_answer"] is not None:
+                content, model_to_use = plan["fact_answer"], FACT_MODEL_ID
+            elif cached:
+                content, model_to_use, intent = cached["response"], cached["model_used"], cached["intent"]
             else:
-                # Si es una respuesta estructurada, convertir a string para compatibilidad
-                content = str(lc_output) if lc_output else "No pude generar una respuesta."
+                prompt_config = plan["prompt_config"]
+                intent = prompt_config["intent"]
+                with trace.span("llm"):
+                    content, model_to_use = await self._invoke_llm(
+                        prompt_config, model_chain, cache_key,
+                        session_id, user_id, temperature, message, history, trace
+                    )
+                completion_tokens = trace.completion_tokens or None
+                await asyncio.to_thread(response_cache.set, cache_key, content, model_to_use, intent)
+            trace.model, trace.intent, trace.cached = model_to_use, intent, cached is not None
             
             response = {
                 "content": content,
-                "tokens_used": None,
+                "tokens_used": trace.total_tokens or None,
                 "model": model_to_use,
-                "intent": prompt_config.get("intent", "general"),
-                "structured": not isinstance(lc_output, str)
+                "intent": intent,
+                "cached": cached is not None
             }
             
+            # Sugerencias de seguimiento (precalculadas); las ejecuciones internas no las necesitan
+            suggestions = []
+            if persist:
+                with trace.span("suggestions"):
+                    suggestions = suggestion_service.suggest(message, intent, content, conversation_history)
+                suggestion_service.prefetch(
+                    suggestions, self.generate_response, message, content, conversation_history, temperature
+                )
+            
             # Calcular tiempo de respuesta
             response_time_ms = int((time.time() - start_time) * 1000)
             
             # Guardar conversación en base de datos
-            await self._save_conversation(
-                session_id=session_id,
-                user_message=message,
-                assistant_response=response["content"],
-                user_id=user_id,
+            if persist:
+                with trace.span("save_conversation"):
+                    await self._save_conversation(
+                        session_id=session_id,
+                        user_message=message,
+                        assistant_response=response["content"],
+                        user_id=user_id,
 
-                tokens_used=response.get("tokens_used"),
-                response_time_ms=response_time_ms
-            )
+                        tokens_used=response.get("tokens_used"),
+                        response_time_ms=response_time_ms,
+                        intent=intent,
+                        completion_tokens=completion_tokens
+                    )
             
             # Preparar respuesta
             result = {
@@ -181,15 +148,415 @@ class ChatService:
                 "tokens_used": response.get("tokens_used"),
                 "response_time_ms": response_time_ms,
                 "model_used": model_to_use,
+                "cached": response["cached"],
+                "suggestions": [suggestion.text for suggestion in suggestions],
                 "rag_enabled": False
             }
             
+            trace.finish()
             logger.info(f"Respuesta generada en {response_time_ms}ms para sesión {session_id}")
             return result
             
-        except Exception as e:
-            logger.error(f"Error generando respuesta: {e}")
+        except BaseException as e:
+            trace.finish(error=e)
+            if isinstance(e, Exception) and not isinstance(e, RateLimitExceeded):
+                logger.error(f"Error generando respuesta: {e}")
+            elif isinstance(e, asyncio.CancelledError) and persist:
+                self._record_cancelled(session_id, message, user_id)
             raise
+        finally:
+            trace_recorder.record(trace)
+    
+    async def stream_response(
+        self,
+        message: str,
+        session_id: str,
+        conversation_history: Optional[List[ChatMessage]] = None,
+        user_id: Optional[str] = None,
+        temperature: float = 0.7
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Generar respuesta en streaming: eventos de tipo token y un evento final done"""
+        
+        trace = trace_recorder.start("chat_stream", session_id, user_id)
+        try:
+            events = self._stream_events(message, session_id, conversation_history, user_id, temperature, trace)
+            async with aclosing(events):
+                async for event in events:
+                    yield event
+            trace.finish()
+        except BaseException as e:
+            trace.finish(error=e)
+            if trace.status == "cancelled":
+                # Desconexión del cliente a mitad de la generación
+                self._record_cancelled(session_id, message, user_id)
+            raise
+        finally:
+            trace_recorder.record(trace)
+
+    async def _stream_events(
+        self,
+        message: str,
+        session_id: str,
+        conversation_history: Optional[List[ChatMessage]],
+        user_id: Optional[str],
+        temperature: float,
+        trace: RunTrace
+    ) -> AsyncIterator[Dict[str, Any]]:
+        start_time = time.time()
+        model_chain = model_router.build_chain(await active_model.aget())
+        model_to_use = model_chain[0]
+        plan = await self._prepare(message, session_id, conversation_history, model_chain, temperature, trace)
+        history, intent, cache_key, cached = plan["history"], plan["intent"], plan["cache_key"], plan["cached"]
+        fact_answer = plan["fact_answer"]
+        parts: List[str] = []
+        completion_tokens = None
+        truncated = False  # Stream cortado por el presupuesto de tokens
+
+        if fact_answer is not None:
+            model_to_use = FACT_MODEL_ID
+            parts.append(fact_answer)
+            trace.mark_first_token()
+            yield {"type": "token", "content": fact_answer}
+        elif cached:
+            model_to_use = cached["model_used"]
+            intent = cached["intent"]
+            parts.append(cached["response"])
+            trace.mark_first_token()
+            yield {"type": "token", "content": cached["response"]}
+        else:
+            prompt_config = plan["prompt_config"]
+            intent = prompt_config["intent"]
+            template = prompt_config["template"]
+            parser = prompt_config["parser"]
+            variables = prompt_config["variables"]
+
+            response_format = prompt_config.get("response_format")
+            max_tokens = token_budgets.budget(intent)
+
+            with trace.span("llm"):
+                if isinstance(parser, StrOutputParser) or response_format:
+                    def make_stream(model_id: str):
+                        pipeline = self._build_pipeline(
+                            template, parser, model_id, temperature, max_tokens, response_format
+                        )
+                        config = self._build_run_config(
+                            model_id, session_id, user_id, temperature, message, history, trace
+                        )
+                        return pipeline.astream(variables, config=config)
+
+                    # En modo json_schema llegan objetos parciales: se emiten como deltas de markdown
+                    incremental = IncrementalMarkdown(prompt_config["schema"]) if response_format else None
+                    partial = None
+                    received = 0
+
+                    async def source():
+                        # Solo ocupa hueco de admisión quien llama de verdad al LLM, no los seguidores
+                        async with llm_admission.slot():
+                            async with aclosing(model_router.stream(model_chain, make_stream)) as upstream:
+                                async for item in upstream:
+                                    yield item
+
+                    if settings.REQUEST_COALESCING_ENABLED:
+                        chunks = llm_single_flight.stream(cache_key, source, trace)
+                    else:
+                        chunks = source()
+                    async with aclosing(chunks):
+                        async for model_to_use, chunk in chunks:
+                            # Cada fragmento del modelo es ~1 token: se corta aunque el
+                            # proveedor no respete max_tokens (p. ej. en modo json_schema)
+                            received += 1
+                            if received > max_tokens:
+                                truncated = True
+                                token_budgets.record_stream_cutoff(intent)
+                                logger.info(f"Stream cortado en {max_tokens} tokens (intención {intent}) para sesión {session_id}")
+                                break
+                            if incremental is not None:
+                                partial = chunk
+                                chunk = incremental.feed(chunk)
+                            if chunk:
+                                parts.append(chunk)
+                                trace.mark_first_token()
+                                yield {"type": "token", "content": chunk}
+                    completion_tokens = trace.completion_tokens or min(received, max_tokens) or None
+
+                    if incremental is not None:
+                        tail = incremental.close(partial)
+                        if tail:
+                            parts.append(tail)
+                            trace.mark_first_token()
+                            yield {"type": "token", "content": tail}
+                else:
+                    # Modo prompt: la respuesta estructurada se parsea completa y se emite en un solo fragmento
+                    content, model_to_use = await self._invoke_llm(
+                        prompt_config, model_chain, cache_key,
+                        session_id, user_id, temperature, message, history, trace
+                    )
+                    completion_tokens = trace.completion_tokens or None
+                    parts.append(content)
+                    trace.mark_first_token()
+                    yield {"type": "token", "content": content}
+
+            # Una respuesta cortada por el presupuesto no se cachea: la siguiente pregunta
+            # igual se regenera (con el presupuesto ya ajustado) en vez de servir el corte
+            if not truncated:
+                await asyncio.to_thread(response_cache.set, cache_key, "".join(parts), model_to_use, intent)
+        trace.model, trace.intent, trace.cached = model_to_use, intent, cached is not None
+
+        with trace.span("suggestions"):
+            suggestions = suggestion_service.suggest(message, intent, "".join(parts), conversation_history)
+        suggestion_service.prefetch(
+            suggestions, self.generate_response, message, "".join(parts), conversation_history, temperature
+        )
+
+        response_time_ms = int((time.time() - start_time) * 1000)
+        with trace.span("save_conversation"):
+            await self._save_conversation(
+                session_id=session_id,
+                user_message=message,
+                assistant_response="".join(parts),
+                user_id=user_id,
+                tokens_used=trace.total_tokens or None,
+                response_time_ms=response_time_ms,
+                intent=intent,
+                completion_tokens=completion_tokens
+            )
+
+        logger.info(f"Respuesta en streaming generada en {response_time_ms}ms para sesión {session_id}")
+        yield {
+            "type": "done",
+            "session_id": session_id,
+            "timestamp": datetime.now().isoformat(),
+            "response_time_ms": response_time_ms,
+            "model_used": model_to_use,
+            "suggestions": [suggestion.text for suggestion in suggestions]
+        }
+
+    async def _invoke_llm(
+        self,
+        prompt_config: Dict[str, Any],
+        model_chain: List[str],
+        coalesce_key: str,
+        session_id: str,
+        user_id: Optional[str],
+        temperature: float,
+        message: str,
+        history: List[Dict[str, str]],
+        trace: Optional[RunTrace] = None
+    ) -> Tuple[str, str]:
+        """Invocar el pipeline con resiliencia, fallback y coalescing; devuelve (contenido, modelo usado)"""
+        template = prompt_config["template"]
+        parser = prompt_config["parser"]
+        variables = prompt_config["variables"]
+        response_format = prompt_config.get("response_format")
+        max_tokens = token_budgets.budget(prompt_config["intent"])
+
+        def make_factory(model_id: str):
+            pipeline = self._build_pipeline(template, parser, model_id, temperature, max_tokens, response_format)
+            config = self._build_run_config(
+                model_id, session_id, user_id, temperature, message, history, trace
+            )
+            return lambda: pipeline.ainvoke(variables, config=config)
+
+        # Deadlines, reintentos, circuit breaker, hedging y fallback; las peticiones
+        # idénticas concurrentes comparten una sola llamada upstream, y solo esa
+        # ocupa hueco de admisión (los seguidores esperan sin consumir capacidad)
+        async def invoke():
+            async with llm_admission.slot():
+                return await model_router.call(model_chain, make_factory)
+
+        if settings.REQUEST_COALESCING_ENABLED:
+            (lc_output, model_to_use), _ = await llm_single_flight.do(coalesce_key, invoke, trace)
+        else:
+            lc_output, model_to_use = await invoke()
+
+        # Las respuestas estructuradas se renderizan a markdown en el servidor
+        if isinstance(lc_output, str):
+            content = lc_output
+        elif lc_output and prompt_config.get("schema"):
+            content = finalize(prompt_config["schema"], lc_output)
+        else:
+            content = str(lc_output) if lc_output else "No pude generar una respuesta."
+        return content, model_to_use
+
+    async def _prepare(
+        self,
+        message: str,
+        session_id: str,
+        conversation_history: Optional[List[ChatMessage]],
+        model_chain: List[str],
+        temperature: float,
+        trace: RunTrace,
+        allow_facts: bool = True,
+        client_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Etapas previas al LLM ejecutadas como grafo (StageGraph)
+
+        El límite de peticiones se comprueba antes de lanzar el grafo: una petición
+        rechazada no debe cargar historial ni pagar la llamada de embeddings.
+        Después history y classify_intent arrancan a la vez. La consulta a la
+        caché depende del historial, que forma parte de la clave; el prompt, del
+        historial y de los ejemplos few-shot. La selección de ejemplos (una llamada
+        a la API de embeddings que solo depende del mensaje) se solapa con la carga
+        del historial desde la BD. Con una respuesta determinista no se consulta la
+        caché ni se eligen ejemplos, y tras un acierto de caché no se espera a los
+        ejemplos: se cancelan.
+        """
+        if client_id is not None:
+            with trace.span("rate_limit"):
+                await asyncio.to_thread(rate_limiter.enforce, client_id)
+
+        graph = StageGraph(trace)
+
+        async def load_history():
+            return await self._load_history(session_id, conversation_history)
+
+        async def classify_intent():
+            return prompt_service.classify_query_intent(message)
+
+        async def fact_answer(intent: str):
+            # Datos fijos (contacto, una habilidad, un proyecto) se responden sin LLM
+            return fact_answers.answer(message, intent) if allow_facts else None
+
+        async def cache_lookup(history: List[Dict[str, str]], fact: Optional[str]):
+            # La misma clave normalizada sirve para la caché de respuestas y el coalescing
+            cache_key = prompt_cache_key(message, history, model_chain[0], temperature)
+            if fact is not None:
+                return cache_key, None
+            return cache_key, await asyncio.to_thread(response_cache.get, cache_key)
+
+        async def select_examples(intent: str, fact: Optional[str], *cache_result):
+            # Solo el prompt general usa ejemplos, y no hacen falta tras un acierto de caché
+            if fact is not None or intent in STRUCTURED_SCHEMAS or prompt_service.example_selector is None:
+                return None
+            if cache_result and cache_result[0][1]:
+                return None
+            return await asyncio.to_thread(prompt_service.select_examples, message)
+
+        async def build_prompt(history: List[Dict[str, str]], fact: Optional[str], examples: Optional[List[tuple]]):
+            if fact is not None:
+                return None
+            return prompt_service.get_optimized_prompt(message, history, examples)
+
+        graph.add("history", load_history)
+        graph.add("classify_intent", classify_intent)
+        graph.add("fact_answer", fact_answer, "classify_intent")
+        graph.add("cache_lookup", cache_lookup, "history", "fact_answer")
+        # Con el historial en la petición la caché responde en menos de un milisegundo:
+        # se espera al fallo antes de pagar la llamada de embeddings. Si hay que cargarlo
+        # de la BD, la selección arranca ya y se solapa con la carga.
+        speculative = not conversation_history and settings.CHAT_HISTORY_FROM_DB
+        graph.add(
+            "select_examples", select_examples,
+            "classify_intent", "fact_answer", *(() if speculative else ("cache_lookup",))
+        )
+        graph.add("build_prompt", build_prompt, "history", "fact_answer", "select_examples")
+
+        try:
+            with trace.span("prepare"):
+                fact = await graph.result("fact_answer")
+                cache_key, cached = await graph.result("cache_lookup")
+                prompt_config = None
+                if fact is None and not cached:
+                    prompt_config = await graph.result("build_prompt")
+                else:
+                    graph.cancel("select_examples", "build_prompt")
+                return {
+                    "history": await graph.result("history"),
+                    "intent": await graph.result("classify_intent"),
+                    "fact_answer": fact,
+                    "cache_key": cache_key,
+                    "cached": cached,
+                    "prompt_config": prompt_config,
+                }
+        finally:
+            await graph.close()
+
+    async def _load_history(
+        self,
+        session_id: str,
+        conversation_history: Optional[List[ChatMessage]]
+    ) -> List[Dict[str, str]]:
+        """Historial de la petición o, con CHAT_HISTORY_FROM_DB, el guardado de la sesión"""
+        if conversation_history or not settings.CHAT_HISTORY_FROM_DB:
+            return self._prepare_history(conversation_history)
+        stored = await self.get_conversation_history(session_id, settings.MAX_CONVERSATION_HISTORY)
+        return [{"role": msg["role"], "content": msg["content"]} for msg in stored]
+
+    def _prepare_history(self, conversation_history: Optional[List[ChatMessage]]) -> List[Dict[str, str]]:
+        """Convertir el historial de la petición al formato de PromptService"""
+        if not conversation_history:
+            return []
+        return [
+            {"role": msg.role.value, "content": msg.content} 
+            for msg in conversation_history[-settings.MAX_CONVERSATION_HISTORY:]
+        ]
+
+    def _build_pipeline(
+        self,
+        template,
+        parser,
+        model_id: str,
+        temperature: float,
+        max_tokens: int = 1000,
+        response_format: Optional[Dict[str, Any]] = None
+    ):
+        """Construir pipeline template -> modelo -> parser para un modelo concreto
+
+        max_tokens es el presupuesto de salida de la intención (token_budgets).
+        """
+        # Los reintentos y timeouts los gestiona la capa de resiliencia, no el cliente
+        llm = ChatOpenAI(
+            model=model_id,
+            temperature=temperature,
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.LLM_ATTEMPT_TIMEOUT_SECONDS,
+            max_retries=0,
+            stream_usage=True
+        )
+        if response_format:
+            llm = llm.bind(max_tokens=max_tokens, response_format=response_format)
+        else:
+            llm = llm.bind(max_tokens=max_tokens)
+
+        chat_model = llm.with_config(
+            {"run_name": f"chat_model_{model_id}"}
+        )
+        
+        return template | chat_model | parser
+
+    def _build_run_config(
+        self,
+        model_id: str,
+        session_id: str,
+        user_id: Optional[str],
+        temperature: float,
+        message: str,
+        history: List[Dict[str, str]],
+        trace: Optional[RunTrace] = None
+    ) -> Dict[str, Any]:
+        """Callbacks de la invocación: tokens para la traza local y, si la invocación
+        sale en el muestreo, el tracer de LangSmith (que solo encola en el exportador)"""
+        callbacks = [TokenUsageCallback(trace)] if trace is not None else []
+        if not langsmith_exporter.sample():
+            return RunnableConfig(callbacks=callbacks) if callbacks else {}
+        return RunnableConfig(
+            callbacks=[langsmith_exporter.tracer, *callbacks],
+            tags=[
+                "esteban-portfolio", 
+                "chatbot", 
+                f"model:{model_id}",
+                f"session:{session_id}"
+            ],
+            metadata={
+                "session_id": session_id,
+                "user_id": user_id or "anonymous",
+                "model": model_id,
+                "temperature": temperature,
+                "message_length": len(message),
+                "conversation_length": len(history) if history else 0
+            }
+        )
     
     async def _build_chat_prompt(
         self,
@@ -222,10 +589,40 @@ class ChatService:
         assistant_response: str,
         user_id: Optional[str] = None,
         tokens_used: Optional[int] = None,
-        response_time_ms: Optional[int] = None
+        response_time_ms: Optional[int] = None,
+        intent: Optional[str] = None,
+        completion_tokens: Optional[int] = None
+    ):
+        """Guardar conversación en SQLite local
+
+        completion_tokens solo se indica para respuestas generadas por el LLM: son
+        las muestras con las que se ajustan los presupuestos de salida.
+        """
+        self._persist_conversation(
+            session_id, user_message, assistant_response, user_id, tokens_used, response_time_ms,
+            intent=intent, completion_tokens=completion_tokens
+        )
+
+    def _record_cancelled(self, session_id: str, user_message: str, user_id: Optional[str] = None):
+        """Guardar solo la pregunta con outcome 'cancelled': la respuesta no llegó a nadie
+
+        Es síncrono a propósito: se llama mientras se propaga una cancelación y
+        no debe tener puntos de espera que la vuelvan a interrumpir.
+        """
+        self._persist_conversation(session_id, user_message, None, user_id, outcome="cancelled")
+
+    def _persist_conversation(
+        self,
+        session_id: str,
+        user_message: str,
+        assistant_response: Optional[str],
+        user_id: Optional[str] = None,
+        tokens_used: Optional[int] = None,
+        response_time_ms: Optional[int] = None,
+        outcome: str = "completed",
+        intent: Optional[str] = None,
+        completion_tokens: Optional[int] = None
     ):
-        """Guardar conversación en SQLite local"""
-        
         try:
             db = next(get_db())
             
@@ -243,25 +640,40 @@ class ChatService:
                 db.add(conversation)
                 db.flush()
             
+            # Última actividad: la retención desactiva las sesiones inactivas
+            conversation.is_active = True
+            conversation.updated_at = datetime.now()
+            
             # Guardar mensaje del usuario
             user_msg = Message(
                 conversation_id=conversation.id,
                 role="user",
                 content=user_message,
+                outcome=outcome,
+                intent=intent,
                 timestamp=datetime.now()
             )
             db.add(user_msg)
             
             # Guardar respuesta del asistente
-            assistant_msg = Message(
-                conversation_id=conversation.id,
-                role="assistant",
-                content=assistant_response,
-                tokens_used=tokens_used,
-                response_time_ms=response_time_ms,
-                timestamp=datetime.now()
-            )
-            db.add(assistant_msg)
+            assistant_msg = None
+            if assistant_response is not None:
+                assistant_msg = Message(
+                    conversation_id=conversation.id,
+                    role="assistant",
+                    content=assistant_response,
+                    tokens_used=tokens_used,
+                    response_time_ms=response_time_ms,
+                    outcome=outcome,
+                    intent=intent,
+                    completion_tokens=completion_tokens,
+                    timestamp=datetime.now()
+                )
+                db.add(assistant_msg)
+            
+            # Índice de texto completo en la misma transacción
+            db.flush()
+            search_index.index_messages(db, [msg for msg in (user_msg, assistant_msg) if msg is not None])
             
             db.commit()
             
@@ -276,10 +688,12 @@ class ChatService:
         session_id: str,
         limit: int = 20
     ) -> List[Dict[str, Any]]:
-        """Obtener historial de conversación desde SQLite"""
-        
+        """Obtener historial de conversación (réplica de lectura si está configurada)"""
+        return await asyncio.to_thread(self._read_history, session_id, limit)
+    
+    def _read_history(self, session_id: str, limit: int) -> List[Dict[str, Any]]:
         try:
-            db = next(get_db())
+            db = next(get_read_db())
             
             conversation = db.query(Conversation).filter(
                 Conversation.session_id == session_id
@@ -315,12 +729,9 @@ class ChatService:
         """Cambiar a un modelo fine-tuned específico"""
         
         try:
-            # Verificar que el modelo existe
-            models = self.client.models.list()
-            available_models = [model.id for model in models.data]
-            
-            if model_id in available_models:
-                self.current_model = model_id
+            # Verificar contra el catálogo cacheado (O(1), sin descargarlo en cada cambio)
+            if await model_registry.is_available(model_id):
+                await active_model.aset(model_id)
                 logger.info(f"Modelo cambiado a: {model_id}")
                 return True
             else:
@@ -331,121 +742,106 @@ class ChatService:
             logger.error(f"Error cambiando modelo: {e}")
             return False
     
-    async def create_langsmith_dataset(self, dataset_name: str, conversations: List[Dict]) -> bool:
-        """Crear un dataset en LangSmith a partir de conversaciones"""
+    async def create_langsmith_dataset(self, dataset_name: str, conversations: Iterable[Dict]) -> Optional[int]:
+        """Crear un dataset en LangSmith a partir de pares de conversación
+
+        Las llamadas pasan por el exportador de LangSmith y se esperan sin bloquear
+        el event loop; los ejemplos se suben por lotes de EXPORT_BATCH_SIZE, así que
+        se puede pasar un iterador de export_service sin cargar todo en memoria.
+        Cada lote se lee del iterador en el threadpool (iterate_in_threadpool).
+        Devuelve el número de ejemplos subidos, o None si falló.
+        """
         try:
-            if not self.langsmith_client:
+            if not langsmith_exporter.configured:
                 logger.warning("LangSmith no está configurado")
-                return False
+                return None
             
             # Crear dataset
-            dataset = self.langsmith_client.create_dataset(
-                dataset_name=dataset_name,
-                description=f"Conversaciones del chatbot de portafolio de Esteban - {datetime.now().isoformat()}"
-            )
-            
-            # Agregar ejemplos al dataset
-            examples = []
-            for conv in conversations:
-                examples.append({
-                    "inputs": {"message": conv["user_message"]},
-                    "outputs": {"response": conv["assistant_response"]},
-                    "metadata": {
-                        "session_id": conv.get("session_id"),
-                        "timestamp": conv.get("timestamp"),
-                        "model": conv.get("model", "unknown")
-                    }
+            dataset = await langsmith_exporter.call("dataset", {
+                "dataset_name": dataset_name,
+                "description": f"Conversaciones del chatbot de portafolio de Esteban - {datetime.now().isoformat()}"
+            })
+            
+            total = 0
+            async for batch in iterate_in_threadpool(_batched(conversations, settings.EXPORT_BATCH_SIZE)):
+                await langsmith_exporter.call("examples", {
+                    "inputs": [{"message": conv["user_message"]} for conv in batch],
+                    "outputs": [{"response": conv["assistant_response"]} for conv in batch],
+                    "metadata": [
+                        {
+                            "session_id": conv.get("session_id"),
+                            "timestamp": conv["timestamp"].isoformat() if conv.get("timestamp") else None,
+                            "model": conv.get("model", "unknown")
+                        }
+                        for conv in batch
+                    ],
+                    "dataset_id": dataset.id
                 })
+                total += len(batch)
             
-            self.langsmith_client.create_examples(
-                inputs=[ex["inputs"] for ex in examples],
-                outputs=[ex["outputs"] for ex in examples],
-                metadata=[ex["metadata"] for ex in examples],
-                dataset_id=dataset.id
-            )
-            
-            logger.info(f"Dataset '{dataset_name}' creado con {len(examples)} ejemplos")
-            return True
+            logger.info(f"Dataset '{dataset_name}' creado con {total} ejemplos")
+            return total
             
         except Exception as e:
             logger.error(f"Error creando dataset en LangSmith: {e}")
-            return False
+            return None
     
     async def log_feedback(self, run_id: str, feedback_score: float, feedback_comment: str = "") -> bool:
-        """Registrar feedback en LangSmith"""
-        try:
-            if not self.langsmith_client:
-                logger.warning("LangSmith no está configurado")
-                return False
-            
-            self.langsmith_client.create_feedback(
-                run_id=run_id,
-                key="user_satisfaction",
-                score=feedback_score,
-                comment=feedback_comment
-            )
-            
-            logger.info(f"Feedback registrado para run {run_id}: {feedback_score}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error registrando feedback: {e}")
+        """Registrar feedback en LangSmith (se encola; el envío va en segundo plano)"""
+        if not langsmith_exporter.configured:
+            logger.warning("LangSmith no está configurado")
             return False
+        
+        queued = langsmith_exporter.submit("feedback", {
+            "run_id": run_id,
+            "key": "user_satisfaction",
+            "score": feedback_score,
+            "comment": feedback_comment
+        })
+        
+        if queued:
+            logger.info(f"Feedback encolado para run {run_id}: {feedback_score}")
+        else:
+            logger.warning(f"Feedback para run {run_id} descartado: cola de LangSmith llena")
+        return queued
     
-    async def get_langsmith_analytics(self, project_name: str = None) -> Dict[str, Any]:
-        """Obtener analíticas desde LangSmith"""
+    async def get_langsmith_analytics(self, project_name: str = None, since_hours: float = 24.0) -> Dict[str, Any]:
+        """Analíticas de runs desde el almacén local de trazas, sin llamadas a LangSmith
+
+        Mantiene la forma de la respuesta anterior; el tiempo medio es la latencia
+        medida de cada petición (antes se promediaba execution_order, que no es un tiempo).
+        """
         try:
-            if not self.langsmith_client:
-                return {"error": "LangSmith no está configurado"}
+            analytics = await asyncio.to_thread(trace_recorder.analytics, since_hours)
+            runs = analytics["runs"]
+            total_runs = runs.get("count", 0)
             
-            project_name = project_name or settings.LANGCHAIN_PROJECT
-            
-            # Obtener runs del proyecto
-            runs = list(self.langsmith_client.list_runs(
-                project_name=project_name,
-                limit=100
-            ))
-            
-            if not runs:
+            if not total_runs:
                 return {"message": "No hay runs disponibles"}
             
-            # Calcular métricas
-            total_runs = len(runs)
-            successful_runs = len([r for r in runs if r.status == "success"])
-            failed_runs = len([r for r in runs if r.status == "error"])
-            
-            # Tiempos de respuesta
-            execution_times = [r.execution_order for r in runs if r.execution_order]
-            avg_execution_time = sum(execution_times) / len(execution_times) if execution_times else 0
-            
-            # Tokens utilizados (si están disponibles)
-            total_tokens = sum([
-                r.extra.get("usage", {}).get("total_tokens", 0) 
-                for r in runs if r.extra and "usage" in r.extra
-            ])
-            
-            analytics = {
-                "project_name": project_name,
+            return {
+                "project_name": project_name or settings.LANGCHAIN_PROJECT,
+                "window_hours": since_hours,
                 "total_runs": total_runs,
-                "successful_runs": successful_runs,
-                "failed_runs": failed_runs,
-                "success_rate": (successful_runs / total_runs * 100) if total_runs > 0 else 0,
-                "avg_execution_time_ms": avg_execution_time,
-                "total_tokens_used": total_tokens,
-                "last_updated": datetime.now().isoformat()
+                "successful_runs": runs["successful"],
+                "failed_runs": runs["failed"],
+                "cancelled_runs": runs["cancelled"],
+                "success_rate": runs["successful"] / total_runs * 100,
+                "avg_execution_time_ms": runs["avg_ms"],
+                "p95_execution_time_ms": runs["p95"],
+                "total_tokens_used": runs["total_tokens"],
+                "last_updated": analytics["generated_at"]
             }
             
-            return analytics
-            
         except Exception as e:
-            logger.error(f"Error obteniendo analíticas de LangSmith: {e}")
+            logger.error(f"Error obteniendo analíticas de trazas: {e}")
             return {"error": str(e)}
 
     async def get_chat_analytics(self, session_id: Optional[str] = None) -> Dict[str, Any]:
-        """Obtener analíticas de chat desde SQLite"""
+        """Obtener analíticas de chat (réplica de lectura si está configurada)"""
         
         try:
-            db = next(get_db())
+            db = next(get_read_db())
             
             # Consultas base
             conversations_query = db.query(Conversation)
@@ -465,6 +861,7 @@ class ChatService:
             # Estadísticas básicas
             total_conversations = conversations_query.count()
             total_messages = messages_query.count()
+            cancelled_responses = messages_query.filter(Message.outcome == "cancelled").count()
             
             # Estadísticas de mensajes
             assistant_messages = messages_query.filter(Message.role == "assistant").all()
@@ -488,13 +885,14 @@ class ChatService:
                 "total_messages": total_messages,
                 "avg_response_time_ms": avg_response_time,
                 "total_tokens_used": total_tokens,
-                "current_model": self.current_model
+                "cancelled_responses": cancelled_responses,
+                "current_model": await active_model.aget()
             }
             
             return analytics
             
         except Exception as e:
             logger.error(f"Error obteniendo analíticas: {e}")
-            return {"current_model": self.current_model}
+            return {"current_model": await active_model.aget()}
         finally:
             db.close()
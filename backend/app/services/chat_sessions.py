@@ -0,0 +1,168 @@
+"""
+Sesiones de chat por WebSocket: una conexión por sesión con el historial en el servidor
+"""
+
+import asyncio
+import os
+from fnmatch import fnmatch
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import WebSocket
+from loguru import logger
+
+from app.core.config import settings
+from app.schemas.chat import ChatMessage, MessageRole
+
+# Códigos de cierre propios (4000-4999 quedan para la aplicación)
+CLOSE_REPLACED = 4000
+CLOSE_IDLE = 4001
+
+
+def origin_allowed(origin: Optional[str]) -> bool:
+    """CORS no se aplica a WebSocket: se comprueba la cabecera Origin contra ALLOWED_ORIGINS
+
+    Admite comodines como "https://*.vercel.app". Sin Origin (clientes que no
+    son navegadores) se acepta, igual que en HTTP.
+    """
+    return origin is None or any(fnmatch(origin, allowed) for allowed in settings.ALLOWED_ORIGINS)
+
+
+class SessionLimitReached(Exception):
+    """El worker ya mantiene WS_MAX_CONNECTIONS conexiones"""
+
+
+class ChatSession:
+    """Estado de una sesión mientras su conexión sigue abierta
+
+    El historial vive en el servidor: el cliente solo envía la pregunta de cada
+    turno. Se pasa a ChatService como si lo hubiera enviado el cliente, así las
+    claves de caché y el coalescing coinciden con los de /chat/ y /chat/stream.
+    """
+
+    def __init__(self, session_id: str, websocket: WebSocket, user_id: Optional[str], history: List[ChatMessage]):
+        self.session_id = session_id
+        self.websocket = websocket
+        self.user_id = user_id
+        self.history = history
+        self.turn: Optional[asyncio.Task] = None
+        self.turn_deadline = 0.0  # loop.time() hasta el que el turno en curso justifica seguir abierta
+        self.turns = 0
+
+    @property
+    def busy(self) -> bool:
+        return self.turn is not None and not self.turn.done()
+
+    def remember(self, message: str, answer: str):
+        """Añadir el turno completado, conservando los últimos MAX_CONVERSATION_HISTORY mensajes"""
+        self.history.append(ChatMessage(role=MessageRole.USER, content=message))
+        self.history.append(ChatMessage(role=MessageRole.ASSISTANT, content=answer))
+        del self.history[:-settings.MAX_CONVERSATION_HISTORY]
+        self.turns += 1
+
+    async def cancel_turn(self) -> bool:
+        """Cancelar el turno en curso y esperar a que termine; False si no había ninguno"""
+        if not self.busy:
+            return False
+        self.turn.cancel()
+        await asyncio.gather(self.turn, return_exceptions=True)
+        return True
+
+
+class ChatSessionRegistry:
+    """Conexiones WebSocket abiertas en este worker, una por session_id
+
+    Una segunda conexión para la misma sesión sustituye a la anterior, que se
+    cierra con el código 4000: el historial en memoria pasa a la nueva (p. ej.
+    una reconexión tras un corte de red). Si la sesión no está en este worker,
+    el historial se carga de la base de datos. Cada conexión abierta cuesta
+    poca memoria y ninguna plaza de admisión del LLM, que solo se ocupa durante
+    un turno.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, ChatSession] = {}
+        self.peak = 0
+        self.opened = 0
+        self.replaced = 0
+        self.rejected = 0
+        self.turns = 0
+        self.cancelled_turns = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def open(
+        self,
+        session_id: str,
+        websocket: WebSocket,
+        user_id: Optional[str],
+        load_history: Optional[Callable[[str], Awaitable[List[Dict[str, Any]]]]] = None
+    ) -> ChatSession:
+        """Registrar la conexión de una sesión; lanza SessionLimitReached si el worker está lleno
+
+        load_history(session_id) devuelve el historial guardado (get_conversation_history);
+        sin él la sesión empieza vacía (sesión nueva, no hay nada que leer de la BD).
+        """
+        previous = self._sessions.get(session_id)
+        if previous is None and len(self._sessions) >= settings.WS_MAX_CONNECTIONS:
+            self.rejected += 1
+            raise SessionLimitReached(f"Límite de {settings.WS_MAX_CONNECTIONS} conexiones por worker")
+
+        if previous is not None:
+            self.replaced += 1
+            await previous.cancel_turn()
+            history = previous.history
+            try:
+                await previous.websocket.close(code=CLOSE_REPLACED, reason="Sesión abierta en otra conexión")
+            except RuntimeError:
+                pass  # Ya estaba cerrada
+        elif load_history is not None:
+            history = [
+                ChatMessage(role=MessageRole(msg["role"]), content=msg["content"])
+                for msg in await load_history(session_id)
+            ]
+        else:
+            history = []
+
+        session = ChatSession(session_id, websocket, user_id, history)
+        self._sessions[session_id] = session
+        self.opened += 1
+        self.peak = max(self.peak, len(self._sessions))
+        logger.debug(f"WebSocket abierto para sesión {session_id} ({len(self._sessions)} en este worker)")
+        return session
+
+    def start_turn(self, session: ChatSession, turn: Awaitable[None]):
+        """Ejecutar el turno en segundo plano: el bucle de recepción sigue atendiendo cancel y ping"""
+        session.turn = asyncio.ensure_future(turn)
+        session.turn_deadline = asyncio.get_running_loop().time() + settings.WS_TURN_TIMEOUT_SECONDS
+        self.turns += 1
+
+    async def cancel_turn(self, session: ChatSession) -> bool:
+        cancelled = await session.cancel_turn()
+        if cancelled:
+            self.cancelled_turns += 1
+        return cancelled
+
+    async def close(self, session: ChatSession):
+        """Cancelar el turno en curso y olvidar la sesión (si no la sustituyó otra conexión)"""
+        await self.cancel_turn(session)
+        if self._sessions.get(session.session_id) is session:
+            del self._sessions[session.session_id]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "worker_pid": os.getpid(),
+            "connections": len(self._sessions),
+            "busy": sum(1 for session in self._sessions.values() if session.busy),
+            "peak": self.peak,
+            "max_connections": settings.WS_MAX_CONNECTIONS,
+            "opened": self.opened,
+            "replaced": self.replaced,
+            "rejected": self.rejected,
+            "turns": self.turns,
+            "cancelled_turns": self.cancelled_turns,
+        }
+
+
+# Instancia global (por worker)
+chat_sessions = ChatSessionRegistry()
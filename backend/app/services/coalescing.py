@@ -0,0 +1,182 @@
+"""
+Coalescing (single-flight) de peticiones idénticas en curso, con fan-out de streaming
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from loguru import logger
+
+from app.services.tracing import RunTrace
+
+T = TypeVar("T")
+
+
+def _usage(trace: Optional[RunTrace]) -> Tuple[int, int, int]:
+    if trace is None:
+        return 0, 0, 0
+    return trace.prompt_tokens, trace.completion_tokens, trace.total_tokens
+
+
+class _Flight:
+    """Ejecución upstream compartida; los tokens los cuenta la traza del líder"""
+
+    def __init__(self, trace: Optional[RunTrace]):
+        self.trace = trace
+        self._baseline = _usage(trace)
+        self.waiters = 0
+
+    def share_usage(self, follower: Optional[RunTrace]):
+        """Copiar a la traza de un seguidor los tokens que consumió la ejecución del líder"""
+        if follower is None or self.trace is None or follower is self.trace:
+            return
+        follower.add_usage(*(now - before for now, before in zip(_usage(self.trace), self._baseline)))
+
+
+class _InFlightCall(_Flight):
+    """Llamada en curso compartida por varios solicitantes"""
+
+    def __init__(self, task: asyncio.Task, trace: Optional[RunTrace]):
+        super().__init__(trace)
+        self.task = task
+
+
+class _Broadcast(_Flight):
+    """Difunde los fragmentos de un stream a todos los suscriptores, con replay para los tardíos"""
+
+    def __init__(self, trace: Optional[RunTrace]):
+        super().__init__(trace)
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def pump(self, stream_factory: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for chunk in stream_factory():
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución upstream
+
+    La ejecución corre en una tarea independiente: si un solicitante se cancela
+    los demás siguen esperando, y solo cuando no queda ninguno se cancela el
+    trabajo upstream. Los callbacks de tokens solo llegan a la traza del líder:
+    al terminar, cada seguidor suma a la suya los tokens de la ejecución
+    compartida, para que el coste por petición y los presupuestos de salida
+    (TokenBudgets) no se queden cortos con carga.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _InFlightCall] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    @staticmethod
+    def _forget(registry: Dict[str, Any], key: str, entry: Any):
+        if registry.get(key) is entry:
+            del registry[key]
+
+    async def do(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[T]],
+        trace: Optional[RunTrace] = None
+    ) -> Tuple[T, bool]:
+        """Ejecutar factory() una sola vez por clave en curso; devuelve (resultado, compartido)
+
+        trace es la traza del solicitante: la del líder es la que recibe los
+        tokens de factory(); la de un seguidor recibe una copia al terminar.
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = self._calls[key] = _InFlightCall(asyncio.ensure_future(factory()), trace)
+            call.task.add_done_callback(lambda _task, c=call: self._forget(self._calls, key, c))
+            self.leaders += 1
+        else:
+            self.followers += 1
+            logger.debug(f"[{self.name}] Petición coalescida con una llamada en curso")
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+            if shared:
+                call.share_usage(trace)
+            return result, shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    async def stream(
+        self,
+        key: str,
+        stream_factory: Callable[[], AsyncIterator[T]],
+        trace: Optional[RunTrace] = None
+    ) -> AsyncIterator[T]:
+        """Suscribirse al stream en curso para la clave o iniciarlo si no existe
+
+        Un seguidor que recibe el stream completo suma los tokens del líder a su traza.
+        """
+        broadcast = self._streams.get(key)
+        shared = broadcast is not None
+        if broadcast is None:
+            broadcast = self._streams[key] = _Broadcast(trace)
+            broadcast.task = asyncio.ensure_future(broadcast.pump(stream_factory))
+            broadcast.task.add_done_callback(lambda _task, b=broadcast: self._forget(self._streams, key, b))
+            self.leaders += 1
+        else:
+            self.followers += 1
+            logger.debug(f"[{self.name}] Stream coalescido con uno en curso")
+
+        broadcast.waiters += 1
+        try:
+            async for chunk in broadcast.subscribe():
+                yield chunk
+            if shared:
+                broadcast.share_usage(trace)
+        finally:
+            broadcast.waiters -= 1
+            if broadcast.waiters == 0 and not broadcast.task.done():
+                broadcast.task.cancel()
+
+    def snapshot(self) -> Dict[str, int]:
+        """Métricas de coalescing"""
+        return {
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
+
+
+# Instancia global para las llamadas al LLM
+llm_single_flight = SingleFlight("llm")
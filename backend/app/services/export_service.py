@@ -0,0 +1,187 @@
+"""
+Exportación masiva de conversaciones (pares usuario/asistente) a NDJSON o Parquet
+sin cargar el historial completo en memoria
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from loguru import logger
+from pydantic import BaseModel
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import ReadSessionLocal
+from app.models.conversation import Conversation, Message
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet es opcional: pip install pyarrow
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ("ndjson", "parquet")
+
+
+class ExportFormatUnavailable(Exception):
+    """El formato pedido necesita una dependencia que no está instalada"""
+
+
+class ExportFilters(BaseModel):
+    """Filtros de exportación: rango [start, end) sobre la fecha del mensaje y sesiones"""
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    session_ids: Optional[List[str]] = None
+
+
+def iter_message_pairs(filters: ExportFilters, batch_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Pares usuario -> asistente en orden cronológico por conversación
+
+    Una sola consulta messages JOIN conversations leída por lotes (yield_per,
+    cursor de servidor en PostgreSQL): la memoria no crece con el historial.
+    Se lee de la réplica de lectura si está configurada.
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    query = (
+        select(
+            Conversation.session_id,
+            Conversation.user_id,
+            Message.conversation_id,
+            Message.id,
+            Message.role,
+            Message.content,
+            Message.timestamp,
+            Message.tokens_used,
+            Message.response_time_ms,
+        )
+        .join(Conversation, Message.conversation_id == Conversation.id)
+        .order_by(Message.conversation_id, Message.timestamp, Message.id)
+    )
+    if filters.start is not None:
+        query = query.where(Message.timestamp >= filters.start)
+    if filters.end is not None:
+        query = query.where(Message.timestamp < filters.end)
+    if filters.session_ids:
+        query = query.where(Conversation.session_id.in_(filters.session_ids))
+
+    db = ReadSessionLocal()
+    try:
+        rows = db.execute(query.execution_options(yield_per=batch_size))
+        pending = None  # Último mensaje de usuario sin respuesta todavía
+        for row in rows:
+            if row.role == "user":
+                pending = row
+            elif row.role == "assistant" and pending is not None and pending.conversation_id == row.conversation_id:
+                yield {
+                    "session_id": pending.session_id,
+                    "user_id": pending.user_id,
+                    "message_id": pending.id,
+                    "user_message": pending.content,
+                    "assistant_response": row.content,
+                    "timestamp": pending.timestamp,
+                    "tokens_used": row.tokens_used,
+                    "response_time_ms": row.response_time_ms,
+                }
+                pending = None
+    finally:
+        db.close()
+
+
+def json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Una línea JSON por par; pensado para StreamingResponse"""
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False, default=json_default) + "\n"
+
+
+def _parquet_schema():
+    return pa.schema([
+        ("session_id", pa.string()),
+        ("user_id", pa.string()),
+        ("message_id", pa.int64()),
+        ("user_message", pa.string()),
+        ("assistant_response", pa.string()),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("tokens_used", pa.int64()),
+        ("response_time_ms", pa.int64()),
+    ])
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def write_parquet(records: Iterable[Dict[str, Any]], path: str, batch_size: Optional[int] = None) -> int:
+    """Escribir los pares en Parquet, un row group por lote; devuelve el número de filas"""
+    if pq is None:
+        raise ExportFormatUnavailable("La exportación a Parquet requiere pyarrow (pip install pyarrow)")
+
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    schema = _parquet_schema()
+    total = 0
+    batch: List[Dict[str, Any]] = []
+
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        def flush():
+            columns = {name: [record[name] for record in batch] for name in schema.names}
+            columns["timestamp"] = [_as_utc(value) for value in columns["timestamp"]]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush()
+                total += len(batch)
+                batch = []
+        if batch:
+            flush()
+            total += len(batch)
+    return total
+
+
+def write_ndjson(records: Iterable[Dict[str, Any]], path: str) -> int:
+    total = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for line in iter_ndjson(records):
+            f.write(line)
+            total += 1
+    return total
+
+
+def export_to_file(format: str, filters: ExportFilters, path: Optional[str] = None) -> Dict[str, Any]:
+    """Exportar a un fichero local de dataset (EXPORT_DIR) que cualquier uploader puede consumir"""
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado: {format}")
+    if format == "parquet" and pq is None:
+        raise ExportFormatUnavailable("La exportación a Parquet requiere pyarrow (pip install pyarrow)")
+
+    if path is None:
+        os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+        # Sufijo aleatorio: dos exportaciones en el mismo segundo no se pisan
+        filename = f"conversations_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{format}"
+        path = os.path.join(settings.EXPORT_DIR, filename)
+
+    # Se escribe a un temporal y se renombra: un uploader nunca ve un fichero a medias
+    tmp_path = f"{path}.partial"
+    records = iter_message_pairs(filters)
+    try:
+        rows = write_parquet(records, tmp_path) if format == "parquet" else write_ndjson(records, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    size = os.path.getsize(path)
+    logger.info(f"Exportados {rows} pares de conversación a {path} ({size} bytes)")
+    return {"path": path, "format": format, "rows": rows, "bytes": size}
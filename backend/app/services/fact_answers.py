@@ -0,0 +1,168 @@
+"""
+Respuestas deterministas sin LLM para intenciones de datos fijos (contacto, habilidades, proyectos)
+"""
+
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+from loguru import logger
+
+from app.core.config import settings
+from app.services.knowledge_base import KnowledgeBase, knowledge_base, normalize_term
+from app.services.prompt_service import prompt_service
+
+DEFAULT_TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates" / "facts"
+
+# Valor de model_used para respuestas servidas desde la base de conocimientos
+FACT_MODEL_ID = "knowledge-base"
+
+STATUS_TERMS = {
+    "completed": ["completado", "completados", "terminado", "terminados", "finalizado", "finalizados", "completed", "finished"],
+    "in_progress": ["en desarrollo", "en progreso", "en curso", "actuales", "in progress", "ongoing"],
+}
+STATUS_LABELS = {"completed": "completados", "in_progress": "en desarrollo"}
+
+# Preguntas directas por el contacto (sobre el mensaje normalizado). Mencionar una
+# palabra clave ("¿has contactado con clientes?") no basta: eso lo responde el LLM.
+CONTACT_CHANNELS = r"(contacto|contact|email|e-mail|correo|linkedin|github|instagram|redes sociales)"
+CONTACT_QUESTIONS = [
+    # Solo el canal: "contacto", "¿email?", "su linkedin"
+    re.compile(rf"^(su |tu |el |his )?{CONTACT_CHANNELS}$"),
+    # "¿cómo puedo contactarlo?", "¿dónde le escribo?", "how can i contact him?"
+    re.compile(r"\b(como|donde|por donde|how|where)\b( \S+){0,4} (contactar\w*|escribir\w*|contact|reach|get in touch)\b"),
+    # "¿cuál es su email?", "¿tiene linkedin?", "what is his email?"; el canal cierra la
+    # pregunta, así "¿tienes github copilot?" no cuenta
+    re.compile(rf"\b(cual|cuales|dame|dime|pasame|comparte|compartes|tiene|tienes|what|share|give)\b( \S+){{0,4}} {CONTACT_CHANNELS}( (de|of) \S+)?$"),
+    # "quiero contactar con él", "me gustaría colaborar", "i'd like to get in touch"
+    re.compile(r"\b(quiero|quisiera|gustaria|puedo|podria|want|like|can)\b( \S+){0,3} (contactar\w*|colaborar|contact|collaborate|get in touch)\b"),
+]
+
+# Consultas directas por una habilidad o un proyecto; además, cualquier mensaje de hasta
+# LOOKUP_MAX_WORDS palabras ("CV Analyzer", "proyectos completados") cuenta como consulta
+LOOKUP_MAX_WORDS = 4
+LOOKUP_LEADS = r"^(hablame|cuentame|describe\w*|tell me|info|informacion|detalles)\b"
+SKILL_QUESTIONS = [
+    re.compile(LOOKUP_LEADS),
+    # "¿qué sabes de LangChain?", "¿maneja Docker?", "do you know FastAPI?"
+    re.compile(r"\b(sabe|sabes|conoce|conoces|maneja|manejas|domina|dominas|usa|usas|utiliza|utilizas|know|knows|use|used)\b"),
+    # "¿qué experiencia tiene con Python?", "nivel de React", "experience with AWS"
+    re.compile(r"\b(experiencia|nivel|experience|level)\b"),
+]
+PROJECT_QUESTIONS = [
+    re.compile(LOOKUP_LEADS),
+    # "¿en qué proyectos usó RAG?", "¿qué proyectos tiene en desarrollo?", "which projects..."
+    re.compile(r"\b(que|cual|cuales|cuantos|which|what|how many)\b( \S+){0,2} (proyecto|proyectos|project|projects)\b"),
+    # "¿qué es LegalGPT?", "¿de qué trata CV Analyzer?", "estado de ATS Inteligente"
+    re.compile(r"\b(que es|en que consiste|de que trata|what is|estado|status|progreso|progress)\b"),
+]
+# Lo que la ficha no responde: comparaciones, porqués, cómos, retos o una segunda pregunta
+NOT_A_LOOKUP = [
+    re.compile(r"\b(diferencia\w*|difference\w*|compar\w*|vs|versus|frente a|mejor|peor|better|worse|prefer\w*)\b"),
+    re.compile(r"\b(por que|porque|para que|why)\b"),
+    re.compile(r"(^| y | and )(como|how)\b|\bhow (do|does|did|would|could|can|to)\b"),
+    re.compile(r"\b(reto|retos|desafio\w*|dificultad\w*|problema\w*|challenge\w*|aprendi\w*|leccion\w*|learn\w*|explica\w*|explain\w*|opina\w*|opinion\w*|recomienda\w*)\b"),
+    re.compile(r" (y|and) (cual|cuales|que|como|donde|cuando|cuanto|cuanta|what|which|how|why|where|when)\b"),
+]
+
+
+def is_lookup(message: str, questions: List[re.Pattern]) -> bool:
+    """Si el mensaje solo pide la ficha (de una habilidad o un proyecto) y nada más"""
+    normalized = normalize_term(message)
+    if any(pattern.search(normalized) for pattern in NOT_A_LOOKUP):
+        return False
+    return len(normalized.split()) <= LOOKUP_MAX_WORDS or any(pattern.search(normalized) for pattern in questions)
+
+
+class FactAnswerService:
+    """Renderiza respuestas desde la base de conocimientos estructurada con plantillas Jinja
+
+    Solo responde cuando la pregunta se resuelve con datos fijos (la ficha de un
+    proyecto o habilidad concretos, un estado de proyecto, una petición directa
+    del contacto). Mencionar un proyecto o una habilidad no basta: comparaciones,
+    porqués, cómos o preguntas compuestas devuelven None y siguen el camino
+    normal del LLM.
+    """
+
+    def __init__(self, kb: KnowledgeBase, templates_dir: Optional[str] = None):
+        self.kb = kb
+        self.env = Environment(
+            loader=FileSystemLoader(templates_dir or str(DEFAULT_TEMPLATES_DIR)),
+            undefined=StrictUndefined,
+            trim_blocks=True,
+            autoescape=False
+        )
+        self.answered: Dict[str, int] = {}
+
+    def _render(self, template_name: str, **context) -> str:
+        return self.env.get_template(template_name).render(**context).strip()
+
+    def _answer_contact(self, message: str) -> Optional[str]:
+        normalized = normalize_term(message)
+        if not any(pattern.search(normalized) for pattern in CONTACT_QUESTIONS):
+            return None
+        return self._render("contact.md.j2", profile=self.kb.profile, contact=self.kb.profile.contact)
+
+    def _answer_skills(self, message: str) -> Optional[str]:
+        if not is_lookup(message, SKILL_QUESTIONS):
+            return None
+        skills = self.kb.find_skills(message)
+        if not skills:
+            return None
+        projects_by_skill = {
+            skill.name: [project.name for project in self.kb.projects_using_skill(skill)]
+            for skill in skills
+        }
+        return self._render("skills.md.j2", skills=skills, projects_by_skill=projects_by_skill)
+
+    def _answer_projects(self, message: str) -> Optional[str]:
+        if not is_lookup(message, PROJECT_QUESTIONS):
+            return None
+        projects = self.kb.find_projects(message)
+        if projects:
+            return self._render("projects.md.j2", projects=projects)
+
+        normalized = f" {normalize_term(message)} "
+        for status, terms in STATUS_TERMS.items():
+            if any(f" {term} " in normalized for term in terms):
+                return self._render(
+                    "projects_by_status.md.j2",
+                    projects=self.kb.projects_by_status(status),
+                    status_label=STATUS_LABELS[status]
+                )
+        return None
+
+    def answer(self, message: str, intent: Optional[str] = None) -> Optional[str]:
+        """Respuesta determinista para el mensaje, o None si necesita el LLM"""
+        if not settings.FACT_ANSWERS_ENABLED:
+            return None
+
+        intent = intent or prompt_service.classify_query_intent(message)
+        if intent not in settings.FACT_ANSWER_INTENTS:
+            return None
+
+        handler = getattr(self, f"_answer_{intent}", None)
+        if handler is None:
+            return None
+        try:
+            content = handler(message)
+        except Exception as e:
+            # Una plantilla rota no debe tumbar el chat: se delega en el LLM
+            logger.error(f"Error renderizando respuesta determinista ({intent}): {e}")
+            return None
+
+        if content is not None:
+            self.answered[intent] = self.answered.get(intent, 0) + 1
+        return content
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.FACT_ANSWERS_ENABLED,
+            "intents": settings.FACT_ANSWER_INTENTS,
+            "answered": dict(self.answered),
+        }
+
+
+# Instancia global
+fact_answers = FactAnswerService(knowledge_base, settings.FACT_TEMPLATES_DIR)
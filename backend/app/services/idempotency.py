@@ -0,0 +1,145 @@
+"""
+Claves de idempotencia (cabecera Idempotency-Key) sobre el backend de estado compartido
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.state import get_state_backend
+from app.services.coalescing import SingleFlight
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(Exception):
+    """Uso incorrecto de una clave de idempotencia"""
+
+
+class IdempotencyKeyReused(IdempotencyError):
+    """La clave ya se usó con una petición distinta"""
+
+
+class IdempotencyInProgress(IdempotencyError):
+    """Otra ejecución con la misma clave sigue en curso tras el tiempo de espera"""
+
+
+def request_fingerprint(payload: Any) -> str:
+    """Huella estable del cuerpo de la petición para detectar claves reutilizadas"""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Ejecuta cada clave una sola vez y guarda el resultado para repetirlo
+
+    - Duplicados en el mismo worker esperan a la primera ejecución (single-flight).
+    - Entre workers, el primero en reclamar la clave (incr == 1) ejecuta y los
+      demás sondean el resultado; si el reclamo caduca sin resultado, lo retoman.
+    - Solo se guardan ejecuciones correctas: un error permite reintentar.
+    El almacén está acotado: cada entrada caduca a los IDEMPOTENCY_TTL_SECONDS.
+    Las operaciones sobre el backend se hacen fuera del event loop (to_thread).
+    """
+
+    def __init__(self):
+        self._flight = SingleFlight("idempotency")
+        self.executed = 0
+        self.replayed = 0
+        self.conflicts = 0
+
+    @staticmethod
+    def _keys(scope: str, key: str) -> Tuple[str, str]:
+        return f"idem:{scope}:{key}", f"idem-lock:{scope}:{key}"
+
+    def _stored(self, result_key: str, fingerprint: str) -> Any:
+        entry = get_state_backend().get_json(result_key)
+        if entry is None:
+            return None
+        if entry["fingerprint"] != fingerprint:
+            self.conflicts += 1
+            raise IdempotencyKeyReused("La Idempotency-Key ya se usó con una petición distinta")
+        return entry
+
+    async def execute(
+        self,
+        scope: str,
+        key: str,
+        fingerprint: str,
+        factory: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Resultado de la primera ejecución de la clave; devuelve (resultado, repetido)"""
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyError(f"Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres")
+
+        result_key, lock_key = self._keys(scope, key)
+        entry = await asyncio.to_thread(self._stored, result_key, fingerprint)
+        if entry is not None:
+            self.replayed += 1
+            return entry["response"], True
+
+        # Duplicados con otro cuerpo no se agrupan: acaban en IdempotencyKeyReused
+        (response, executed), shared = await self._flight.do(
+            f"{result_key}:{fingerprint}", lambda: self._claim_and_run(result_key, lock_key, fingerprint, factory)
+        )
+        if shared or not executed:
+            self.replayed += 1
+            return response, True
+        self.executed += 1
+        return response, False
+
+    async def _claim_and_run(
+        self,
+        result_key: str,
+        lock_key: str,
+        fingerprint: str,
+        factory: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Tuple[Dict[str, Any], bool]:
+        backend = get_state_backend()
+        deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_SECONDS
+        while True:
+            claimed = await asyncio.to_thread(backend.incr, lock_key, ttl_seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+            if claimed == 1:
+                try:
+                    response = await factory()
+                except BaseException:
+                    # Sin resultado guardado: el siguiente reintento vuelve a ejecutar
+                    # (de forma síncrona: el await de to_thread podría cancelarse antes de liberar)
+                    backend.delete(lock_key)
+                    raise
+                await asyncio.to_thread(
+                    backend.set_json,
+                    result_key,
+                    {"fingerprint": fingerprint, "response": response},
+                    settings.IDEMPOTENCY_TTL_SECONDS
+                )
+                await asyncio.to_thread(backend.delete, lock_key)
+                return response, True
+
+            # Otro worker la está ejecutando: esperar su resultado
+            logger.debug(f"Idempotency-Key en curso en otro worker, esperando resultado ({result_key})")
+            while time.monotonic() < deadline:
+                await asyncio.sleep(settings.IDEMPOTENCY_POLL_SECONDS)
+                entry = await asyncio.to_thread(self._stored, result_key, fingerprint)
+                if entry is not None:
+                    return entry["response"], False
+                if await asyncio.to_thread(backend.get, lock_key) is None:
+                    break  # La ejecución falló o caducó: se reclama de nuevo
+            else:
+                raise IdempotencyInProgress("Ya hay una petición en curso con esta Idempotency-Key")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "conflicts": self.conflicts,
+            **self._flight.snapshot(),
+        }
+
+
+# Instancia global
+idempotency_store = IdempotencyStore()
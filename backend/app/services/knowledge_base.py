@@ -0,0 +1,232 @@
+"""
+Base de conocimientos estructurada del portafolio con índices en memoria
+"""
+
+import json
+import re
+import unicodedata
+from collections import Counter
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from jinja2 import Environment, FileSystemLoader
+from pydantic import BaseModel, Field
+
+APP_DIR = Path(__file__).resolve().parent.parent
+KNOWLEDGE_BASE_PATH = APP_DIR / "data" / "knowledge_base.json"
+TEMPLATES_DIR = APP_DIR / "templates"
+
+STATUS_LABELS = {"in_progress": "En desarrollo", "completed": "Completado"}
+
+_TERM_RE = re.compile(r"[a-z0-9+#./-]+")
+
+
+class Contact(BaseModel):
+    email: str
+    github: str
+    linkedin: str
+    instagram: Optional[str] = None
+
+
+class Profile(BaseModel):
+    name: str
+    role: str
+    location: str
+    description: str
+    traits: List[str] = Field(default_factory=list)
+    contact: Contact
+    availability_status: str = ""
+
+
+class Education(BaseModel):
+    period: str
+    title: str
+    institution: str
+
+
+class Course(BaseModel):
+    period: str
+    name: str
+    status: str
+
+
+class Skill(BaseModel):
+    name: str
+    category: str
+    level: Optional[str] = None
+    experience_months: Optional[int] = None
+    notes: Optional[str] = None
+    aliases: List[str] = Field(default_factory=list)
+
+
+class Project(BaseModel):
+    name: str
+    description: str
+    technologies: List[str]
+    status: str  # "in_progress" | "completed"
+    status_detail: str
+    progress: int
+    highlights: Dict[str, str] = Field(default_factory=dict)
+    aliases: List[str] = Field(default_factory=list)
+
+    @property
+    def status_label(self) -> str:
+        return STATUS_LABELS.get(self.status, self.status)
+
+
+class Specialization(BaseModel):
+    name: str
+    details: Dict[str, str]
+
+
+class Language(BaseModel):
+    name: str
+    level: str
+
+
+def normalize_term(text: str) -> str:
+    """Minúsculas sin tildes ni espacios repetidos, para indexar y buscar términos"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(_tokens(text))
+
+
+def _tokens(text: str) -> List[str]:
+    return [token.strip(".-/") for token in _TERM_RE.findall(text) if token.strip(".-/")]
+
+
+class KnowledgeBase:
+    """Datos estructurados del portafolio cargados una vez, con índices por nombre, alias,
+    tecnología y estado
+
+    Es la única fuente de verdad: el texto del prompt y el resumen se generan desde aquí.
+    """
+
+    def __init__(self, data: Dict):
+        self.profile = Profile(**data["profile"])
+        self.education = [Education(**item) for item in data.get("education", [])]
+        self.courses = [Course(**item) for item in data.get("courses", [])]
+        self.skills = [Skill(**skill) for skill in data["skills"]]
+        self.projects = [Project(**project) for project in data["projects"]]
+        self.specializations = [Specialization(**item) for item in data.get("specializations", [])]
+        self.languages = [Language(**item) for item in data.get("languages", [])]
+        self.learning: Dict[str, str] = data.get("learning", {})
+        self.goals: List[str] = data.get("goals", [])
+        self.availability: List[str] = data.get("availability", [])
+
+        self._skill_index = self._build_index(self.skills)
+        self._project_index = self._build_index(self.projects)
+        self._technology_index: Dict[str, List[Project]] = {}
+        self._status_index: Dict[str, List[Project]] = {}
+        for project in self.projects:
+            self._status_index.setdefault(project.status, []).append(project)
+            for technology in project.technologies:
+                self._technology_index.setdefault(normalize_term(technology), []).append(project)
+        self._skills_by_category: Dict[str, List[Skill]] = {}
+        for skill in self.skills:
+            self._skills_by_category.setdefault(skill.category, []).append(skill)
+        self._max_term_words = max(
+            len(term.split()) for term in [*self._skill_index, *self._project_index]
+        )
+
+    @classmethod
+    def load(cls, path: Path = KNOWLEDGE_BASE_PATH) -> "KnowledgeBase":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _build_index(items) -> Dict[str, object]:
+        index = {}
+        for item in items:
+            for term in [item.name, *item.aliases]:
+                index[normalize_term(term)] = item
+        return index
+
+    def get_skill(self, name: str) -> Optional[Skill]:
+        return self._skill_index.get(normalize_term(name))
+
+    def get_project(self, name: str) -> Optional[Project]:
+        return self._project_index.get(normalize_term(name))
+
+    def _find(self, index: Dict[str, object], message: str) -> List:
+        """Entradas mencionadas en el mensaje, en orden de aparición
+
+        Coincidencia voraz del término más largo en cada posición, así
+        "aws bedrock" no cuenta además como "aws".
+        """
+        tokens = normalize_term(message).split()
+        found = []
+        position = 0
+        while position < len(tokens):
+            for size in range(min(self._max_term_words, len(tokens) - position), 0, -1):
+                item = index.get(" ".join(tokens[position:position + size]))
+                if item is not None:
+                    if item not in found:
+                        found.append(item)
+                    position += size
+                    break
+            else:
+                position += 1
+        return found
+
+    def find_skills(self, message: str) -> List[Skill]:
+        """Habilidades mencionadas en el mensaje"""
+        return self._find(self._skill_index, message)
+
+    def find_projects(self, message: str) -> List[Project]:
+        """Proyectos mencionados en el mensaje"""
+        return self._find(self._project_index, message)
+
+    def projects_with_technology(self, technology: str) -> List[Project]:
+        return list(self._technology_index.get(normalize_term(technology), []))
+
+    def projects_using_skill(self, skill: Skill) -> List[Project]:
+        """Proyectos cuyo stack incluye la habilidad (por nombre o alias)"""
+        found = []
+        for term in [skill.name, *skill.aliases]:
+            for project in self.projects_with_technology(term):
+                if project not in found:
+                    found.append(project)
+        return found
+
+    def projects_by_status(self, status: str) -> List[Project]:
+        return list(self._status_index.get(status, []))
+
+    @property
+    def skills_by_category(self) -> Dict[str, List[Skill]]:
+        return self._skills_by_category
+
+    def top_technologies(self, limit: int = 5) -> List[str]:
+        """Tecnologías presentes en más proyectos"""
+        counts = Counter(technology for project in self.projects for technology in project.technologies)
+        return [technology for technology, _ in counts.most_common(limit)]
+
+    @cached_property
+    def markdown(self) -> str:
+        """Texto de la base de conocimientos para los prompts de sistema (se genera una vez)"""
+        env = Environment(loader=FileSystemLoader(str(TEMPLATES_DIR)), trim_blocks=True, lstrip_blocks=True)
+        return env.get_template("knowledge_base.md.j2").render(kb=self).strip()
+
+    def summary(self) -> Dict[str, Any]:
+        """Resumen numérico derivado de los datos (no puede desincronizarse del prompt)"""
+        return {
+            "projects_total": len(self.projects),
+            "projects_completed": len(self.projects_by_status("completed")),
+            "projects_in_progress": len(self.projects_by_status("in_progress")),
+            "main_technologies": self.top_technologies(),
+            "specializations": [item.name for item in self.specializations],
+            "experience_months": {
+                re.sub(r"[^a-z0-9]+", "_", normalize_term(skill.name)): skill.experience_months
+                for skill in self.skills
+                if skill.experience_months
+            },
+            "skills_total": len(self.skills),
+            "courses_in_progress": len([course for course in self.courses if course.status == "in_progress"]),
+            "location": self.profile.location,
+            "status": self.profile.availability_status,
+        }
+
+
+# Instancia global
+knowledge_base = KnowledgeBase.load()
@@ -0,0 +1,264 @@
+"""
+Exportador a LangSmith en segundo plano: trazas, feedback y datasets pasan por una cola
+acotada que se envía por lotes, con muestreo y reintentos, fuera del camino de la petición
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from langchain_core.tracers import LangChainTracer
+from langsmith import Client
+from langsmith.utils import (
+    LangSmithAPIError,
+    LangSmithConnectionError,
+    LangSmithRateLimitError,
+    LangSmithRequestTimeout,
+)
+from loguru import logger
+
+from app.core.config import settings
+
+# Errores transitorios: se reintentan con backoff exponencial
+RETRYABLE_ERRORS = (LangSmithConnectionError, LangSmithRateLimitError, LangSmithRequestTimeout, LangSmithAPIError)
+
+RUN_KINDS = ("run_create", "run_update")
+
+# Campos que LangSmith acepta al cerrar un run (los mismos que Client.update_run)
+RUN_UPDATE_FIELDS = ("trace_id", "parent_run_id", "dotted_order", "end_time", "error", "outputs", "events", "extra", "tags")
+
+
+class ExportQueueFull(Exception):
+    """La cola del exportador está llena y la operación se descartó"""
+
+
+class _Operation:
+    __slots__ = ("kind", "payload", "future")
+
+    def __init__(self, kind: str, payload: Dict[str, Any], future: Optional[Future]):
+        self.kind = kind
+        self.payload = payload
+        self.future = future
+
+
+class _QueueingClient:
+    """Cliente que LangChainTracer usa para crear y cerrar runs: encola en vez de enviar"""
+
+    tracing_queue = None
+
+    def __init__(self, exporter: "LangSmithExporter"):
+        self._exporter = exporter
+
+    def create_run(self, name: str, inputs: Dict[str, Any], run_type: str, *, project_name: Optional[str] = None, **kwargs: Any):
+        kwargs.pop("revision_id", None)
+        self._exporter.submit("run_create", {
+            **kwargs,
+            "session_name": project_name or settings.LANGCHAIN_PROJECT,
+            "name": name,
+            "inputs": inputs,
+            "run_type": run_type,
+        })
+
+    def update_run(self, run_id: Any, **kwargs: Any):
+        payload = {field: kwargs[field] for field in RUN_UPDATE_FIELDS if kwargs.get(field) is not None}
+        self._exporter.submit("run_update", {"id": run_id, **payload})
+
+    def get_run_url(self, *args: Any, **kwargs: Any) -> str:
+        return self._exporter.client.get_run_url(*args, **kwargs)
+
+
+class LangSmithExporter:
+    """Única vía de salida hacia LangSmith
+
+    Las peticiones solo añaden operaciones a una cola acotada (si está llena se
+    descartan y se cuentan); una tarea de fondo la vacía cada
+    LANGSMITH_FLUSH_INTERVAL_SECONDS en lotes, agrupando los runs en una sola
+    llamada batch_ingest_runs. Las trazas se muestrean por petición con
+    LANGSMITH_SAMPLE_RATE; feedback y datasets nunca se muestrean.
+    """
+
+    def __init__(self):
+        self._queue: Deque[_Operation] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._client: Optional[Client] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.tracer = LangChainTracer(project_name=settings.LANGCHAIN_PROJECT, client=_QueueingClient(self))
+        self.submitted = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.sampled_out = 0
+
+    @property
+    def configured(self) -> bool:
+        return bool(settings.LANGCHAIN_API_KEY)
+
+    @property
+    def tracing_enabled(self) -> bool:
+        return settings.LANGCHAIN_TRACING_V2 and self.configured
+
+    @property
+    def client(self) -> Client:
+        if self._client is None:
+            # Sin hilo de batching propio: el lote lo arma este exportador
+            self._client = Client(
+                api_key=settings.LANGCHAIN_API_KEY,
+                api_url=settings.LANGCHAIN_ENDPOINT,
+                auto_batch_tracing=False
+            )
+        return self._client
+
+    def sample(self) -> bool:
+        """Decidir si la petición actual se traza en LangSmith"""
+        if not self.tracing_enabled:
+            return False
+        if random.random() < settings.LANGSMITH_SAMPLE_RATE:
+            return True
+        self.sampled_out += 1
+        return False
+
+    def _enqueue(self, operation: _Operation) -> bool:
+        with self._lock:
+            if len(self._queue) >= settings.LANGSMITH_QUEUE_MAX:
+                self.dropped += 1
+                return False
+            self._queue.append(operation)
+            self.submitted += 1
+        return True
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> bool:
+        """Encolar una operación sin bloquear; False si la cola está llena y se descartó"""
+        return self._enqueue(_Operation(kind, payload, None))
+
+    async def call(self, kind: str, payload: Dict[str, Any]) -> Any:
+        """Encolar y esperar el resultado sin bloquear el event loop (p. ej. crear un dataset)"""
+        future: Future = Future()
+        if not self._enqueue(_Operation(kind, payload, future)):
+            raise ExportQueueFull("Cola de exportación a LangSmith llena")
+        return await asyncio.wrap_future(future)
+
+    def _with_retry(self, send: Callable[[], Any], count: int, label: str) -> Any:
+        for attempt in range(settings.LANGSMITH_MAX_RETRIES + 1):
+            try:
+                return send()
+            except RETRYABLE_ERRORS as e:
+                if attempt == settings.LANGSMITH_MAX_RETRIES:
+                    self.failed += count
+                    logger.warning(f"LangSmith: {label} descartado tras {attempt + 1} intentos ({e})")
+                    raise
+                self.retries += 1
+                time.sleep(settings.LANGSMITH_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+            except Exception as e:
+                self.failed += count
+                logger.warning(f"LangSmith: error no recuperable enviando {label} ({e})")
+                raise
+
+    def _send_runs(self, operations: List[_Operation]):
+        """Un único batch_ingest_runs por lote; creación y cierre del mismo run se fusionan"""
+        creates: Dict[str, Dict[str, Any]] = {}
+        updates: List[Dict[str, Any]] = []
+        for operation in operations:
+            run_id = str(operation.payload["id"])
+            if operation.kind == "run_create":
+                creates[run_id] = operation.payload
+            elif run_id in creates:
+                creates[run_id].update(operation.payload)
+            else:
+                updates.append(operation.payload)
+        try:
+            self._with_retry(
+                lambda: self.client.batch_ingest_runs(create=list(creates.values()), update=updates, pre_sampled=True),
+                len(operations), f"{len(operations)} eventos de traza"
+            )
+            self.sent += len(operations)
+        except Exception:
+            pass  # Ya contado y registrado en _with_retry; las trazas no se reencolan
+
+    def _send_operation(self, operation: _Operation):
+        handlers = {
+            "feedback": self.client.create_feedback,
+            "dataset": self.client.create_dataset,
+            "examples": self.client.create_examples,
+        }
+        try:
+            result = self._with_retry(lambda: handlers[operation.kind](**operation.payload), 1, operation.kind)
+        except Exception as e:
+            if operation.future is not None:
+                operation.future.set_exception(e)
+            return
+        self.sent += 1
+        if operation.future is not None:
+            operation.future.set_result(result)
+
+    def flush(self) -> int:
+        """Vaciar la cola en lotes de LANGSMITH_BATCH_SIZE; devuelve cuántas operaciones se procesaron"""
+        processed = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    size = min(len(self._queue), settings.LANGSMITH_BATCH_SIZE)
+                    batch = [self._queue.popleft() for _ in range(size)]
+                if not batch:
+                    return processed
+                runs = [operation for operation in batch if operation.kind in RUN_KINDS]
+                if runs:
+                    self._send_runs(runs)
+                for operation in batch:
+                    if operation.kind not in RUN_KINDS:
+                        self._send_operation(operation)
+                processed += len(batch)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.LANGSMITH_FLUSH_INTERVAL_SECONDS)
+            if self._queue:
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception as e:
+                    logger.warning(f"Error en el exportador de LangSmith: {e}")
+
+    def start(self):
+        """Iniciar el envío en segundo plano (llamar desde el lifespan de la app)"""
+        if self._flush_task is None and self.configured:
+            self._flush_task = asyncio.ensure_future(self._flush_loop())
+            logger.info(f"Exportador de LangSmith iniciado (muestreo {settings.LANGSMITH_SAMPLE_RATE:.0%})")
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+            await asyncio.to_thread(self.flush)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "tracing_enabled": self.tracing_enabled,
+            "sample_rate": settings.LANGSMITH_SAMPLE_RATE,
+            "queued": len(self._queue),
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retries": self.retries,
+            "sampled_out": self.sampled_out,
+        }
+
+
+# El tracing automático de LangChain por variable de entorno enviaría cada run por
+# su propio cliente; las trazas salen solo por el exportador, que se adjunta a cada
+# invocación muestreada
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+os.environ["LANGSMITH_TRACING"] = "false"
+
+# Instancia global
+langsmith_exporter = LangSmithExporter()
@@ -0,0 +1,155 @@
+"""
+Registro de modelos con caché TTL y modelo activo compartido por todo el proceso
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, FrozenSet, List, Optional
+
+import openai
+from loguru import logger
+
+from app.core.config import settings
+from app.core.state import get_state_backend
+
+ACTIVE_MODEL_KEY = "active_model"
+
+
+class ModelRegistry:
+    """Catálogo de modelos del proveedor cacheado en memoria con refresco en segundo plano"""
+
+    def __init__(self):
+        self._model_ids: FrozenSet[str] = frozenset()
+        self._fetched_at: float = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._client: Optional[openai.AsyncOpenAI] = None
+
+    def _get_client(self) -> openai.AsyncOpenAI:
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL
+            )
+        return self._client
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._fetched_at > settings.MODEL_REGISTRY_TTL_SECONDS
+
+    async def refresh(self) -> bool:
+        """Descargar el catálogo de modelos; devuelve False si el proveedor falla"""
+        async with self._refresh_lock:
+            try:
+                model_ids = frozenset([model.id async for model in self._get_client().models.list()])
+            except Exception as e:
+                logger.warning(f"No se pudo refrescar el catálogo de modelos: {e}")
+                return False
+
+            self._model_ids = model_ids
+            self._fetched_at = time.monotonic()
+            logger.info(f"Catálogo de modelos actualizado: {len(model_ids)} modelos")
+            return True
+
+    async def is_available(self, model_id: str) -> bool:
+        """Validar un id de modelo en O(1) contra el catálogo cacheado
+
+        Solo se espera al proveedor si todavía no hay catálogo; si está
+        caducado se responde con el cacheado y se refresca en segundo plano.
+        """
+        if not self._model_ids:
+            await self.refresh()
+        elif self.is_stale and not self._refresh_lock.locked():
+            asyncio.ensure_future(self.refresh())
+        return model_id in self._model_ids
+
+    def fine_tuned_models(self) -> List[str]:
+        """Modelos fine-tuned del catálogo cacheado"""
+        return sorted(model_id for model_id in self._model_ids if model_id.startswith("ft:"))
+
+    async def _refresh_loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(settings.MODEL_REGISTRY_TTL_SECONDS)
+
+    def start(self):
+        """Iniciar el refresco periódico (llamar desde el lifespan de la app)"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "models_cached": len(self._model_ids),
+            "age_s": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at else None,
+            "stale": self.is_stale,
+        }
+
+
+class ActiveModelStore:
+    """Modelo activo compartido por todas las peticiones del proceso
+
+    Se guarda en el backend de estado compartido (STATE_BACKEND) y cada worker
+    lo relee como mucho cada ACTIVE_MODEL_SYNC_SECONDS, de modo que un cambio
+    hecho en un worker se propaga al resto y sobrevive a reinicios. Desde código
+    asíncrono se usan aget/aset: el backend SQLite hace E/S de disco y se
+    consulta fuera del event loop.
+    """
+
+    def __init__(self):
+        self._model_id = settings.FINE_TUNING_MODEL
+        self._synced_at = 0.0
+
+    def _claim_sync(self) -> bool:
+        """True si toca releer el backend (y marca la relectura para no repetirla en paralelo)"""
+        if time.monotonic() - self._synced_at <= settings.ACTIVE_MODEL_SYNC_SECONDS:
+            return False
+        self._synced_at = time.monotonic()
+        return True
+
+    def _sync(self):
+        try:
+            stored = get_state_backend().get(ACTIVE_MODEL_KEY)
+        except Exception as e:
+            logger.warning(f"No se pudo leer el modelo activo compartido: {e}")
+            stored = None
+        if stored:
+            self._model_id = stored
+
+    def _store(self, model_id: str):
+        try:
+            get_state_backend().set(ACTIVE_MODEL_KEY, model_id)
+        except Exception as e:
+            logger.error(f"No se pudo guardar el modelo activo compartido: {e}")
+
+    def get(self) -> str:
+        if self._claim_sync():
+            self._sync()
+        return self._model_id
+
+    async def aget(self) -> str:
+        if self._claim_sync():
+            await asyncio.to_thread(self._sync)
+        return self._model_id
+
+    def set(self, model_id: str):
+        self._model_id = model_id
+        self._synced_at = time.monotonic()
+        self._store(model_id)
+
+    async def aset(self, model_id: str):
+        self._model_id = model_id
+        self._synced_at = time.monotonic()
+        await asyncio.to_thread(self._store, model_id)
+
+
+# Instancias globales
+model_registry = ModelRegistry()
+active_model = ActiveModelStore()
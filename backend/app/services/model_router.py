@@ -0,0 +1,242 @@
+"""
+Enrutador de modelos con cadena de fallback y seguimiento de latencia/errores por modelo
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import openai
+from loguru import logger
+
+from app.core.config import settings
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMUnavailableError,
+    get_llm_executor,
+    is_retryable_error,
+)
+
+T = TypeVar("T")
+
+
+class ModelStats:
+    """Ventana deslizante de resultados (latencia, éxito) de un modelo"""
+
+    def __init__(self, window_size: int):
+        self._outcomes: Deque[Tuple[float, bool]] = deque(maxlen=window_size)
+
+    def record(self, latency_s: float, ok: bool):
+        self._outcomes.append((latency_s, ok))
+
+    @property
+    def samples(self) -> int:
+        return len(self._outcomes)
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self._outcomes if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(round(q * (len(latencies) - 1))))]
+
+
+class ModelRouter:
+    """Ordena la cadena de modelos según su salud y ejecuta con fallback"""
+
+    def __init__(self):
+        self._stats: Dict[str, ModelStats] = {}
+
+    def _stats_for(self, model_id: str) -> ModelStats:
+        stats = self._stats.get(model_id)
+        if stats is None:
+            stats = self._stats[model_id] = ModelStats(settings.MODEL_ROUTER_WINDOW)
+        return stats
+
+    def build_chain(self, primary_model: str) -> List[str]:
+        """Cadena ordenada: modelo principal seguido de los fallbacks configurados"""
+        chain = [primary_model]
+        for model_id in settings.MODEL_FALLBACK_CHAIN:
+            if model_id not in chain:
+                chain.append(model_id)
+        return chain
+
+    def is_degraded(self, model_id: str) -> bool:
+        """Un modelo está degradado si su circuito no está cerrado o sus métricas superan los umbrales
+
+        Semiabierto también cuenta: solo admite la llamada de prueba y rechaza el resto.
+        """
+        if get_llm_executor(model_id).breaker.state in (CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+            return True
+
+        stats = self._stats_for(model_id)
+        if stats.samples < settings.MODEL_ROUTER_MIN_SAMPLES:
+            return False
+        if stats.error_rate > settings.MODEL_ROUTER_MAX_ERROR_RATE:
+            return True
+        p95 = stats.latency_percentile(0.95)
+        return p95 is not None and p95 > settings.MODEL_ROUTER_MAX_P95_SECONDS
+
+    def plan(self, chain: List[str]) -> List[str]:
+        """Reordenar la cadena moviendo los modelos degradados al final
+
+        Una pequeña fracción del tráfico respeta el orden original para que un
+        modelo degradado siga recibiendo muestras y pueda recuperarse.
+        """
+        if len(chain) < 2 or random.random() < settings.MODEL_ROUTER_PROBE_RATE:
+            return list(chain)
+        healthy = [model_id for model_id in chain if not self.is_degraded(model_id)]
+        degraded = [model_id for model_id in chain if model_id not in healthy]
+        return healthy + degraded
+
+    def record(self, model_id: str, latency_s: float, ok: bool):
+        self._stats_for(model_id).record(latency_s, ok)
+
+    async def call(
+        self,
+        chain: List[str],
+        make_factory: Callable[[str], Callable[[], Awaitable[T]]]
+    ) -> Tuple[T, str]:
+        """Ejecutar con el primer modelo sano de la cadena; devuelve (resultado, modelo usado)"""
+        loop = asyncio.get_running_loop()
+        overall_deadline = loop.time() + settings.LLM_TOTAL_TIMEOUT_SECONDS
+        ordered = self.plan(chain)
+        last_error: Optional[BaseException] = None
+
+        for position, model_id in enumerate(ordered):
+            is_last = position == len(ordered) - 1
+            # Los modelos intermedios reciben una porción del deadline para dejar margen al fallback
+            deadline = overall_deadline if is_last else min(
+                overall_deadline, loop.time() + settings.MODEL_FALLBACK_SLICE_SECONDS
+            )
+
+            started = time.monotonic()
+            try:
+                result = await get_llm_executor(model_id).call(make_factory(model_id), deadline=deadline)
+            except (LLMUnavailableError, openai.NotFoundError) as e:
+                self.record(model_id, time.monotonic() - started, ok=False)
+                last_error = e
+                if not is_last:
+                    logger.warning(f"Modelo {model_id} no disponible ({e}), usando fallback {ordered[position + 1]}")
+                continue
+
+            self.record(model_id, time.monotonic() - started, ok=True)
+            if position > 0:
+                logger.info(f"Respuesta servida por modelo de fallback {model_id}")
+            return result, model_id
+
+        if isinstance(last_error, LLMUnavailableError):
+            raise last_error
+        raise LLMUnavailableError(f"Ningún modelo de la cadena respondió: {last_error!r}") from last_error
+
+    async def stream(
+        self,
+        chain: List[str],
+        make_stream: Callable[[str], AsyncIterator[T]]
+    ) -> AsyncIterator[Tuple[str, T]]:
+        """Stream con fallback: se cambia de modelo solo si falla antes del primer fragmento
+
+        Cada fragmento está sujeto a LLM_ATTEMPT_TIMEOUT_SECONDS para que un
+        stream colgado no retenga la petición indefinidamente, y el stream entero
+        (fallbacks incluidos) a LLM_TOTAL_TIMEOUT_SECONDS, como call: un modelo que
+        envía fragmentos justo por debajo del timeout no puede alargarlo sin fin.
+        """
+        loop = asyncio.get_running_loop()
+        overall_deadline = loop.time() + settings.LLM_TOTAL_TIMEOUT_SECONDS
+        ordered = self.plan(chain)
+        last_error: Optional[BaseException] = None
+
+        def chunk_timeout() -> float:
+            return min(settings.LLM_ATTEMPT_TIMEOUT_SECONDS, max(0.0, overall_deadline - loop.time()))
+
+        for model_id in ordered:
+            if loop.time() >= overall_deadline:
+                break
+            executor = get_llm_executor(model_id)
+            try:
+                probe = executor.breaker.before_call()
+            except CircuitOpenError as e:
+                last_error = e
+                continue
+
+            started = time.monotonic()
+            chunks = make_stream(model_id).__aiter__()
+            settled = False  # Éxito o fallo ya registrado en el circuit breaker
+            try:
+                try:
+                    first = await asyncio.wait_for(chunks.__anext__(), timeout=chunk_timeout())
+                except StopAsyncIteration:
+                    executor.breaker.record_success()
+                    settled = True
+                    self.record(model_id, time.monotonic() - started, ok=True)
+                    return
+                except Exception as e:
+                    if is_retryable_error(e):
+                        executor.breaker.record_failure()
+                        settled = True
+                    elif not isinstance(e, openai.NotFoundError):
+                        raise  # Error de la petición: no cuenta para el circuito (el finally libera la prueba)
+                    self.record(model_id, time.monotonic() - started, ok=False)
+                    last_error = e
+                    logger.warning(f"Stream de {model_id} falló antes del primer fragmento ({e!r})")
+                    continue
+
+                try:
+                    yield model_id, first
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=chunk_timeout())
+                        except StopAsyncIteration:
+                            break
+                        yield model_id, chunk
+                except asyncio.TimeoutError as e:
+                    executor.breaker.record_failure()
+                    settled = True
+                    self.record(model_id, time.monotonic() - started, ok=False)
+                    if loop.time() >= overall_deadline:
+                        raise LLMUnavailableError(f"Stream de {model_id} superó el deadline total") from e
+                    raise LLMUnavailableError(f"Stream de {model_id} sin actividad") from e
+                except Exception as e:
+                    if is_retryable_error(e):
+                        executor.breaker.record_failure()
+                        settled = True
+                    self.record(model_id, time.monotonic() - started, ok=False)
+                    raise
+
+                executor.breaker.record_success()
+                settled = True
+                executor.latencies.add(time.monotonic() - started)
+                self.record(model_id, time.monotonic() - started, ok=True)
+                return
+            finally:
+                await chunks.aclose()
+                if probe and not settled:
+                    # El consumidor cortó el stream (break, cancelación, desconexión) o el error no
+                    # dice nada del modelo (400, auth, 404): ni éxito ni fallo, pero la prueba queda libre
+                    executor.breaker.release_probe()
+
+        raise LLMUnavailableError(f"Ningún modelo de la cadena pudo iniciar el stream: {last_error!r}")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Métricas de enrutamiento por modelo"""
+        return {
+            model_id: {
+                "samples": stats.samples,
+                "error_rate": stats.error_rate,
+                "latency_p95_s": stats.latency_percentile(0.95),
+                "degraded": self.is_degraded(model_id),
+            }
+            for model_id, stats in self._stats.items()
+        }
+
+
+# Instancia global (las métricas se comparten entre peticiones del proceso)
+model_router = ModelRouter()
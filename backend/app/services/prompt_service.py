@@ -11,12 +11,16 @@ from langchain_core.prompts import (
     MessagesPlaceholder,
     FewShotChatMessagePromptTemplate
 )
-from langchain_core.output_parsers import StrOutputParser, PydanticOutputParser
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser, PydanticOutputParser
 from langchain_core.example_selectors import SemanticSimilarityExampleSelector
 from langchain_openai import OpenAIEmbeddings
 from pydantic import BaseModel, Field
 import os
 
+from app.core.config import settings
+from app.services.knowledge_base import knowledge_base
+from app.services.structured_output import json_schema_response_format
+
 # Modelos para respuestas estructuradas
 class ProjectInfo(BaseModel):
     """Información estructurada de un proyecto"""
@@ -40,6 +44,17 @@ class ContactResponse(BaseModel):
     github: Optional[str] = Field(description="URL de GitHub")
     linkedin: Optional[str] = Field(description="URL de LinkedIn")
 
+STRUCTURED_SCHEMAS = {
+    "projects": ProjectInfo,
+    "skills": SkillAssessment,
+    "contact": ContactResponse,
+}
+STRUCTURED_QUERY_VARIABLES = {
+    "projects": "project_query",
+    "skills": "skill_query",
+    "contact": "contact_query",
+}
+
 class PromptService:
     """Servicio optimizado para generar prompts contextualizados con LangChain"""
     
@@ -59,6 +74,23 @@ class PromptService:
         self.project_template = self._create_project_template()
         self.skills_template = self._create_skills_template()
         self.contact_template = self._create_contact_template()
+
+        # Modo json_schema: el esquema viaja en response_format, no en el prompt
+        self.native_templates = {
+            "projects": self._create_project_template(format_instructions=False),
+            "skills": self._create_skills_template(format_instructions=False),
+            "contact": self._create_contact_template(format_instructions=False),
+        }
+        self.prompt_mode_templates = {
+            "projects": (self.project_template, self.project_parser),
+            "skills": (self.skills_template, self.skill_parser),
+            "contact": (self.contact_template, self.contact_parser),
+        }
+        self.json_parser = JsonOutputParser()
+        self.response_formats = {
+            intent: json_schema_response_format(schema)
+            for intent, schema in STRUCTURED_SCHEMAS.items()
+        }
         
         # Configurar few-shot examples
         self.few_shot_examples = self._create_few_shot_examples()
@@ -69,7 +101,7 @@ class PromptService:
         try:
             api_key = os.getenv("OPENAI_API_KEY")
             if api_key:
-                self.embeddings = OpenAIEmbeddings(api_key=api_key)
+                self.embeddings = OpenAIEmbeddings(api_key=api_key, base_url=os.getenv("OPENAI_BASE_URL"))
             else:
                 self.embeddings = None
                 print("Warning: OpenAI API key not found, few-shot examples disabled")
@@ -78,150 +110,12 @@ class PromptService:
             self.embeddings = None
     
     def _load_knowledge_base(self) -> str:
-        """Cargar toda la información del portafolio"""
-        return """
-# INFORMACIÓN PERSONAL Y PROFESIONAL DE ESTEBAN ORTIZ
-
-## PERFIL PERSONAL
-- **Nombre**: Esteban Ortiz
-- **Rol**: Junior AI Developer
-- **Ubicación**: Pereira, Colombia
-- **Descripción**: Apasionado por la IA generativa, explorando los límites entre creatividad y tecnología
-- **Características**: Curioso, autodidacta, innovador, persistente
-- **Email**: esteban.ortiz.dev@gmail.com
-- **GitHub**: https://github.com/EstebanDevJR
-- **LinkedIn**: https://www.linkedin.com/in/esteban-ortiz-restrepo
-- **Instagram**: @esteban_ortiz_0
-
-## FORMACIÓN ACADÉMICA
-- **2023 - Actualidad**: Tecnología en Desarrollo de Software - Universidad Tecnológica de Pereira
-- **2021 - 2022**: Técnico en Asesoría Comercial - SENA
-
-## CURSOS ACTUALES
-- **Enero 2025 - Actualidad**: LLM Engineering: Master AI, Language Models, and Agents
-- **Febrero 2025 - Actualidad**: Bootcamp 2025 Generative AI, LLM Apps, AI Agents, AI Cursor
-
-## STACK TECNOLÓGICO
-
-### Lenguajes de Programación
-- **Python**: Intermedio (8 meses de experiencia) - Especialidad en IA/ML
-- **Java**: Básico
-- **JavaScript**: Básico (4 meses)
-- **TypeScript**: Básico (4 meses)
-- **HTML/CSS**: Básico
-
-### IA y Machine Learning
-- **OpenAI API**: Intermedio (8 meses)
-- **LangChain**: Aprendiendo (6 meses)
-- **HuggingFace**: Intermedio
-- **MCP (Model Context Protocol)**: Básico
-- **AWS Bedrock**: Aprendiendo
-- **AWS SageMaker**: Aprendiendo
-- **Fine-tuning**: Aprendiendo (5 meses)
-- **RAG**: Aprendiendo (5 meses)
-- **Sentence Transformers**: Intermedio
-
-### Bases de Datos
-- **PostgreSQL**: Intermedio
-- **Bases de datos vectoriales**: FAISS, ChromaDB, Pinecone (5 meses)
-- **Supabase**: Intermedio
-
-### Frameworks y Herramientas
-- **FastAPI**: Aprendiendo (2 meses)
-- **React**: Básico (4 meses)
-- **Next.js**: Básico
-- **Streamlit**: Intermedio
-- **Gradio**: Intermedio
-- **Node.js**: Básico (4 meses)
-
-### Cloud y DevOps
-- **AWS**: Aprendiendo (2 meses) - Textract, Bedrock, SageMaker
-- **Azure**: Aprendiendo (1 mes)
-- **Docker**: Básico
-
-### Otros
-- **Git/GitHub**: Intermedio
-- **n8n**: Básico (automatización)
-- **ElevenLabs**: Síntesis de voz
-- **Pandas**: Análisis de datos
-- **PyPDF2**: Procesamiento de documentos
-
-## PROYECTOS
-
-### 1. LegalGPT (En desarrollo - 50%)
-**Descripción**: Asesor legal automatizado para PYMEs colombianas que no comprenden contratos, leyes laborales o tributarias.
-**Tecnologías**: Python, React, OpenAI, Fine-tuning, RAG, LangChain, Pinecone, FastAPI, Supabase, TypeScript
-**Estado**: En desarrollo activo
-**Impacto**: Democratizar acceso a asesoría legal para pequeñas empresas
-
-### 2. ATS Inteligente (En desarrollo - 10%)
-**Descripción**: Sistema de seguimiento de candidatos con agentes de IA para procesamiento de CVs, clasificación de candidatos y asistencia de RRHH.
-**Tecnologías**: Python, Streamlit, OpenAI, Fine-tuning, RAG, LangChain, Pinecone, FastAPI, Supabase, n8n workflow, WhatsApp bot, sistema multiagente, notificaciones email
-**Estado**: Desarrollo inicial
-**Características**: Multiagente, integración WhatsApp, automatización completa
-
-### 3. CV Analyzer (Completado - 100%)
-**Descripción**: Analizador inteligente de currículums que usa RAG y fine-tuning para análisis detallados, recomendaciones de trabajo y hojas de ruta profesionales.
-**Tecnologías**: Python, Streamlit, OpenAI, Fine-tuning, RAG, LangChain, ChromaDB, pandas, PyPDF2, AWS Textract
-**Estado**: Completado y funcional
-**Logros**: Sistema completo de análisis y recomendaciones
-
-### 4. DocumentAssistant-AI (Completado - 100%)
-**Descripción**: Asistente multimodal que analiza documentos (PDF, CSV, Excel) y mantiene conversaciones inteligentes con síntesis de voz.
-**Tecnologías**: Python, Gradio, LangChain, OpenAI, AWS Textract, Pandas, ElevenLabs, PyPDF2
-**Estado**: Completado
-**Características**: Multimodal, síntesis de voz, procesamiento de múltiples formatos
-
-### 5. LLM Conversational Demo (Completado - 100%)
-**Descripción**: Aplicación que permite conversaciones entre múltiples modelos de IA (GPT-4o-mini, Claude, DeepSeek) con síntesis de voz usando ElevenLabs.
-**Tecnologías**: Python, OpenAI, ElevenLabs, DeepSeek, Gradio
-**Estado**: Completado
-**Características**: Multi-modelo, síntesis de voz optimizada, división inteligente
-
-## ESPECIALIZACIONES
-
-### RAG (Retrieval-Augmented Generation)
-- **Experiencia**: 5 meses implementando sistemas RAG
-- **Tecnologías**: Embeddings, Pinecone, ChromaDB, FAISS
-- **Aplicaciones**: Q&A empresariales, chatbots especializados, asistentes de documentación
-- **Técnicas**: Chunking, retrieval optimization, similarity search
-
-### Fine-tuning de Modelos
-- **Experiencia**: 5 meses personalizando modelos de lenguaje
-- **Modelos**: GPT-3.5, GPT-4o-mini
-- **Aplicaciones**: LegalGPT (contexto legal colombiano), CV Analyzer, ATS
-- **Técnicas**: Datasets de calidad, data augmentation, evaluación continua
-
-### Desarrollo Multimodal
-- **Experiencia**: Procesamiento de texto, imágenes y documentos
-- **Herramientas**: AWS Textract, computer vision, OCR
-- **Aplicaciones**: DocumentAssistant-AI, chatbot empresarial
-
-## IDIOMAS
-- **Español**: Nativo
-- **Inglés**: Básico-Intermedio
-
-## ENFOQUE DE APRENDIZAJE
-- **Metodología**: Autodidacta con enfoque práctico
-- **Dedicación**: 2 horas diarias de estudio
-- **Filosofía**: "Aprender haciendo" - todos los proyectos tienen aplicaciones reales
-- **Enfoque actual**: Construir aplicaciones potenciadas por LLMs
-
-## OBJETIVOS Y MOTIVACIONES
-- Explorar los límites entre creatividad y tecnología
-- Resolver problemas reales con impacto social (especialmente para el mercado colombiano/latinoamericano)
-- Democratizar acceso a herramientas inteligentes
-- Crear soluciones de IA que generen valor real en entornos empresariales
-
-## DISPONIBILIDAD
-- Abierto a colaboraciones y nuevas oportunidades
-- Interesado en proyectos de IA generativa
-- Disponible para trabajo remoto y presencial en Pereira, Colombia
-- Enfoque en proyectos que combinen innovación técnica con aplicabilidad práctica
-"""
-    
+        """Texto de la base de conocimientos generado desde los datos estructurados"""
+        return knowledge_base.markdown
+
     def _create_chat_template(self) -> ChatPromptTemplate:
         """Crear template principal de chat optimizado"""
+        contact = knowledge_base.profile.contact
         system_template = f"""Eres un asistente de IA especializado en representar a Esteban Ortiz, un Junior AI Developer de Pereira, Colombia.
 
 ## INFORMACIÓN COMPLETA SOBRE ESTEBAN:
@@ -236,9 +130,9 @@ class PromptService:
 - Menciona el contexto colombiano/latinoamericano cuando sea relevante
 
 ## CONTACTO (cuando sea relevante):
-- Email: esteban.ortiz.dev@gmail.com
-- GitHub: https://github.com/EstebanDevJR
-- LinkedIn: https://www.linkedin.com/in/esteban-ortiz-restrepo
+- Email: {contact.email}
+- GitHub: {contact.github}
+- LinkedIn: {contact.linkedin}
 
 Responde en el idioma del usuario."""
 
@@ -249,7 +143,12 @@ Responde en el idioma del usuario."""
             ("human", "{input}")
         ])
 
-    def _create_project_template(self) -> ChatPromptTemplate:
+    @staticmethod
+    def _format_instructions(parser) -> str:
+        """Instrucciones de formato del parser con las llaves escapadas para ChatPromptTemplate"""
+        return parser.get_format_instructions().replace("{", "{{").replace("}", "}}")
+
+    def _create_project_template(self, format_instructions: bool = True) -> ChatPromptTemplate:
         """Template específico para consultas sobre proyectos"""
         system_template = f"""Eres un experto en los proyectos de IA de Esteban Ortiz.
 
@@ -258,14 +157,14 @@ Responde en el idioma del usuario."""
 Responde consultas sobre proyectos con información específica: nombre, descripción, tecnologías, estado y progreso.
 Usa el formato estructurado que se te solicite.
 
-{self.project_parser.get_format_instructions()}"""
+{self._format_instructions(self.project_parser) if format_instructions else ""}"""
 
         return ChatPromptTemplate.from_messages([
             ("system", system_template),
             ("human", "Información sobre el proyecto: {project_query}")
         ])
 
-    def _create_skills_template(self) -> ChatPromptTemplate:
+    def _create_skills_template(self, format_instructions: bool = True) -> ChatPromptTemplate:
         """Template específico para consultas sobre habilidades"""
         system_template = f"""Eres un evaluador de las habilidades técnicas de Esteban Ortiz.
 
@@ -273,24 +172,25 @@ Usa el formato estructurado que se te solicite.
 
 Evalúa y describe habilidades específicas con nivel, experiencia y detalles.
 
-{self.skill_parser.get_format_instructions()}"""
+{self._format_instructions(self.skill_parser) if format_instructions else ""}"""
 
         return ChatPromptTemplate.from_messages([
             ("system", system_template),
             ("human", "Evalúa la habilidad: {skill_query}")
         ])
 
-    def _create_contact_template(self) -> ChatPromptTemplate:
+    def _create_contact_template(self, format_instructions: bool = True) -> ChatPromptTemplate:
         """Template específico para información de contacto"""
+        contact = knowledge_base.profile.contact
         system_template = f"""Eres el asistente de contacto de Esteban Ortiz.
 
 Información de contacto:
-- Email: esteban.ortiz.dev@gmail.com
-- GitHub: https://github.com/EstebanDevJR
-- LinkedIn: https://www.linkedin.com/in/esteban-ortiz-restrepo
-- Ubicación: Pereira, Colombia
+- Email: {contact.email}
+- GitHub: {contact.github}
+- LinkedIn: {contact.linkedin}
+- Ubicación: {knowledge_base.profile.location}
 
-{self.contact_parser.get_format_instructions()}"""
+{self._format_instructions(self.contact_parser) if format_instructions else ""}"""
 
         return ChatPromptTemplate.from_messages([
             ("system", system_template),
@@ -388,10 +288,12 @@ Mi enfoque es **"aprender haciendo"** - todos mis proyectos tienen aplicaciones
             print(f"Warning: Could not create example selector: {e}")
             return None
 
-    def get_contextualized_prompt(self, user_message: str, conversation_history: list = None) -> Dict[str, Any]:
-        """Generar prompt contextualizado con few-shot examples"""
-        
-        # Seleccionar ejemplos relevantes
+    def select_examples(self, user_message: str) -> List[tuple]:
+        """Ejemplos few-shot más parecidos al mensaje (llamada a la API de embeddings)
+
+        Solo depende del mensaje, así que ChatService la lanza a la vez que la
+        carga del historial y la consulta a la caché.
+        """
         few_shot_examples = []
         if self.example_selector:
             try:
@@ -403,6 +305,19 @@ Mi enfoque es **"aprender haciendo"** - todos mis proyectos tienen aplicaciones
                     ])
             except Exception as e:
                 print(f"Warning: Could not select examples: {e}")
+        return few_shot_examples
+
+    def get_contextualized_prompt(
+        self,
+        user_message: str,
+        conversation_history: list = None,
+        few_shot_examples: Optional[List[tuple]] = None
+    ) -> Dict[str, Any]:
+        """Generar prompt contextualizado con few-shot examples (seleccionados aquí si no se pasan)"""
+        
+        # Seleccionar ejemplos relevantes
+        if few_shot_examples is None:
+            few_shot_examples = self.select_examples(user_message)
         
         # Preparar historial de chat
         chat_history = []
@@ -456,54 +371,54 @@ Mi enfoque es **"aprender haciendo"** - todos mis proyectos tienen aplicaciones
         else:
             return "general"
     
-    def get_optimized_prompt(self, user_message: str, conversation_history: list = None) -> Dict[str, Any]:
-        """Obtener prompt optimizado basado en la intención de la consulta"""
+    def get_optimized_prompt(
+        self,
+        user_message: str,
+        conversation_history: list = None,
+        few_shot_examples: Optional[List[tuple]] = None
+    ) -> Dict[str, Any]:
+        """Obtener prompt optimizado basado en la intención de la consulta
+
+        Para intenciones estructuradas se incluye "schema" (modelo Pydantic) y, en
+        modo json_schema, "response_format" para la salida estructurada nativa.
+        """
         intent = self.classify_query_intent(user_message)
         
-        if intent == "projects":
+        if intent in STRUCTURED_SCHEMAS:
+            variables = {STRUCTURED_QUERY_VARIABLES[intent]: user_message}
+
+            if settings.STRUCTURED_OUTPUT_MODE == "json_schema":
+                return {
+                    "template": self.native_templates[intent],
+                    "parser": self.json_parser,
+                    "variables": variables,
+                    "intent": intent,
+                    "schema": STRUCTURED_SCHEMAS[intent],
+                    "response_format": self.response_formats[intent]
+                }
+
+            template, parser = self.prompt_mode_templates[intent]
             return {
-                "template": self.project_template,
-                "parser": self.project_parser,
-                "variables": {"project_query": user_message}
-            }
-        elif intent == "skills":
-            return {
-                "template": self.skills_template,
-                "parser": self.skill_parser,
-                "variables": {"skill_query": user_message}
-            }
-        elif intent == "contact":
-            return {
-                "template": self.contact_template,
-                "parser": self.contact_parser,
-                "variables": {"contact_query": user_message}
+                "template": template,
+                "parser": parser,
+                "variables": variables,
+                "intent": intent,
+                "schema": STRUCTURED_SCHEMAS[intent]
             }
         else:
             # Usar template general con few-shot examples
-            variables = self.get_contextualized_prompt(user_message, conversation_history)
+            variables = self.get_contextualized_prompt(user_message, conversation_history, few_shot_examples)
             return {
                 "template": self.chat_template,
                 "parser": StrOutputParser(),
-                "variables": variables
+                "variables": variables,
+                "intent": intent
             }
 
     def get_knowledge_summary(self) -> Dict[str, Any]:
         """Obtener resumen de la base de conocimientos"""
         return {
-            "projects_total": 5,
-            "projects_completed": 3,
-            "projects_in_progress": 2,
-            "main_technologies": ["Python", "OpenAI API", "LangChain", "FastAPI", "React"],
-            "specializations": ["RAG", "Fine-tuning", "Multimodal AI"],
-            "experience_months": {
-                "python": 8,
-                "openai": 8,
-                "langchain": 6,
-                "rag": 5,
-                "fine_tuning": 5
-            },
-            "location": "Pereira, Colombia",
-            "status": "Available for collaboration",
+            **knowledge_base.summary(),
             "features": [
                 "Few-shot prompting",
                 "Intent classification",
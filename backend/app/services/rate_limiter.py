@@ -0,0 +1,88 @@
+"""
+Limitador de peticiones por cliente con contadores en el backend de estado compartido
+"""
+
+import asyncio
+import time
+from typing import Tuple
+
+from fastapi import HTTPException, Request
+from starlette.requests import HTTPConnection
+from loguru import logger
+
+from app.core.config import settings
+from app.core.state import get_state_backend
+
+
+class RateLimitExceeded(Exception):
+    """El cliente superó RATE_LIMIT_PER_MINUTE en la ventana actual"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Demasiadas peticiones, intenta de nuevo en unos segundos")
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Ventana fija por minuto: los contadores viven en el backend de estado, así que
+    todos los workers aplican el mismo límite"""
+
+    WINDOW_SECONDS = 60
+
+    def check(self, identity: str) -> Tuple[bool, int]:
+        """Registrar una petición; devuelve (permitida, segundos hasta la siguiente ventana)"""
+        limit = settings.RATE_LIMIT_PER_MINUTE
+        if limit <= 0:
+            return True, 0
+
+        window = int(time.time() // self.WINDOW_SECONDS)
+        retry_after = self.WINDOW_SECONDS - int(time.time() % self.WINDOW_SECONDS)
+        try:
+            count = get_state_backend().incr(
+                f"ratelimit:{identity}:{window}", ttl_seconds=self.WINDOW_SECONDS * 2
+            )
+        except Exception as e:
+            # Si el backend falla se prioriza la disponibilidad
+            logger.warning(f"Error en rate limiter: {e}")
+            return True, 0
+        return count <= limit, retry_after
+
+    def enforce(self, identity: str):
+        """Registrar una petición o lanzar RateLimitExceeded"""
+        allowed, retry_after = self.check(identity)
+        if not allowed:
+            raise RateLimitExceeded(retry_after)
+
+
+def client_identity(request: HTTPConnection) -> str:
+    """IP del cliente (petición HTTP o WebSocket)
+
+    X-Forwarded-For solo se tiene en cuenta con TRUSTED_PROXY_HOPS > 0: cada
+    proxy de confianza añade a la derecha la IP que le conectó, así que el
+    cliente es la entrada TRUSTED_PROXY_HOPS contando desde la derecha. Lo que
+    hay más a la izquierda lo escribe el propio cliente y no sirve para
+    identificarlo (rotando la cabecera se saltaría el límite).
+    """
+    peer = request.client.host if request.client else "unknown"
+    hops = settings.TRUSTED_PROXY_HOPS
+    forwarded = request.headers.get("x-forwarded-for") if hops > 0 else None
+    if not forwarded:
+        return peer
+    addresses = [address.strip() for address in forwarded.split(",") if address.strip()]
+    if not addresses:
+        return peer
+    return addresses[-min(hops, len(addresses))]
+
+
+rate_limiter = RateLimiter()
+
+
+async def enforce_rate_limit(request: Request):
+    """Dependency que responde 429 cuando el cliente supera RATE_LIMIT_PER_MINUTE"""
+    try:
+        await asyncio.to_thread(rate_limiter.enforce, client_identity(request))
+    except RateLimitExceeded as e:
+        raise rate_limit_http_error(e)
+
+
+def rate_limit_http_error(error: RateLimitExceeded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)})
@@ -0,0 +1,245 @@
+"""
+Capa de resiliencia para las llamadas al LLM: timeouts, reintentos con backoff,
+circuit breaker y peticiones cubiertas (hedging)
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import openai
+from loguru import logger
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class LLMUnavailableError(Exception):
+    """El LLM no respondió dentro del presupuesto de reintentos o del deadline total"""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """El circuit breaker del modelo está abierto y rechaza llamadas"""
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """Determinar si un error del proveedor es transitorio y vale la pena reintentar"""
+    if isinstance(exc, (asyncio.TimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+class LatencyTracker:
+    """Ventana deslizante de latencias exitosas para estimar percentiles"""
+
+    def __init__(self, window_size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window_size)
+
+    def add(self, latency_s: float):
+        self._samples.append(latency_s)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Percentil q (0-1) de la ventana, o None si no hay muestras"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """Circuit breaker clásico: closed -> open -> half_open -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout_s: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self) -> bool:
+        """Lanzar CircuitOpenError si el circuito no admite la llamada
+
+        Devuelve True si la llamada es la de prueba del circuito semiabierto.
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout_s:
+                raise CircuitOpenError("Circuito abierto: el modelo está fallando de forma sostenida")
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError("Circuito semiabierto: ya hay una llamada de prueba en curso")
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """Liberar la llamada de prueba sin contarla como éxito ni como fallo (p. ej. si se canceló)"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit breaker abierto tras {self.consecutive_failures} fallos consecutivos")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class ResilientExecutor:
+    """Ejecuta llamadas al LLM con deadlines, reintentos con jitter, circuit breaker y hedging"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout_s=settings.LLM_CIRCUIT_RESET_SECONDS
+        )
+        self.latencies = LatencyTracker()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Backoff exponencial con full jitter"""
+        ceiling = min(
+            settings.LLM_BACKOFF_MAX_SECONDS,
+            settings.LLM_BACKOFF_BASE_SECONDS * (2 ** (attempt - 1))
+        )
+        return random.uniform(0, ceiling)
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Retraso tras el cual lanzar la petición cubierta, basado en el percentil observado"""
+        if not settings.LLM_HEDGING_ENABLED or len(self.latencies) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        observed = self.latencies.percentile(settings.LLM_HEDGE_PERCENTILE)
+        return max(settings.LLM_HEDGE_MIN_DELAY_SECONDS, observed or 0.0)
+
+    async def _hedged_attempt(self, factory: Callable[[], Awaitable[T]], hedge_delay: float) -> T:
+        """Lanzar una segunda petición si la primera supera hedge_delay; gana la primera exitosa"""
+        primary = asyncio.ensure_future(factory())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                logger.info(f"[{self.name}] Lanzando petición cubierta tras {hedge_delay:.2f}s")
+                tasks.add(asyncio.ensure_future(factory()))
+
+            last_error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _attempt(self, factory: Callable[[], Awaitable[T]], timeout_s: float) -> T:
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or hedge_delay >= timeout_s:
+            return await asyncio.wait_for(factory(), timeout=timeout_s)
+        return await asyncio.wait_for(self._hedged_attempt(factory, hedge_delay), timeout=timeout_s)
+
+    async def call(self, factory: Callable[[], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        """Ejecutar factory() (que crea una corrutina nueva por intento) con la política de resiliencia
+
+        deadline es un instante absoluto del reloj del event loop; por defecto
+        se usa LLM_TOTAL_TIMEOUT_SECONDS desde ahora.
+        """
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + settings.LLM_TOTAL_TIMEOUT_SECONDS
+        attempt = 0
+
+        while True:
+            attempt += 1
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise LLMUnavailableError(f"Deadline total agotado para {self.name}")
+            probe = self.breaker.before_call()
+            timeout_s = min(settings.LLM_ATTEMPT_TIMEOUT_SECONDS, remaining)
+
+            started = time.monotonic()
+            try:
+                result = await self._attempt(factory, timeout_s)
+            except Exception as e:
+                if not is_retryable_error(e):
+                    # Errores de la petición (400, auth...) no dicen nada de la salud del modelo:
+                    # ni éxito ni fallo, pero la llamada de prueba queda libre
+                    if probe:
+                        self.breaker.release_probe()
+                    raise
+                self.breaker.record_failure()
+
+                if attempt > settings.LLM_MAX_RETRIES:
+                    raise LLMUnavailableError(
+                        f"{self.name} no respondió tras {attempt} intentos: {e!r}"
+                    ) from e
+
+                delay = self._backoff_delay(attempt)
+                if loop.time() + delay >= deadline:
+                    raise LLMUnavailableError(f"Deadline total agotado para {self.name}: {e!r}") from e
+
+                logger.warning(f"[{self.name}] Intento {attempt} falló ({e!r}), reintentando en {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelada (desconexión del cliente, turno cancelado...): el modelo no falló,
+                # pero si era la llamada de prueba del circuito semiabierto debe quedar libre
+                if probe:
+                    self.breaker.release_probe()
+                raise
+
+            self.breaker.record_success()
+            self.latencies.add(time.monotonic() - started)
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado actual para métricas"""
+        return {
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "latency_samples": len(self.latencies),
+            "latency_p50_s": self.latencies.percentile(0.5),
+            "latency_p95_s": self.latencies.percentile(0.95),
+        }
+
+
+# Un executor (y por tanto un circuit breaker) por modelo, compartido en el proceso
+_executors: Dict[str, ResilientExecutor] = {}
+
+
+def get_llm_executor(model_id: str) -> ResilientExecutor:
+    """Obtener el executor resiliente asociado a un modelo"""
+    executor = _executors.get(model_id)
+    if executor is None:
+        executor = _executors[model_id] = ResilientExecutor(model_id)
+    return executor
+
+
+def resilience_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Estado de todos los executors para el endpoint de métricas"""
+    return {model_id: executor.snapshot() for model_id, executor in _executors.items()}
@@ -0,0 +1,57 @@
+"""
+Caché de respuestas del LLM sobre el backend de estado compartido
+"""
+
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.state import get_state_backend
+
+
+class ResponseCache:
+    """Respuestas completas indexadas por la clave normalizada del prompt (cache_keys.prompt_cache_key)"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        try:
+            entry = get_state_backend().get_json(key)
+        except Exception as e:
+            logger.warning(f"Error leyendo caché de respuestas: {e}")
+            return None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def set(self, key: str, response: str, model_used: str, intent: str, ttl_seconds: Optional[float] = None):
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return
+        try:
+            get_state_backend().set_json(
+                key,
+                {"response": response, "model_used": model_used, "intent": intent},
+                ttl_seconds or settings.RESPONSE_CACHE_TTL_SECONDS
+            )
+        except Exception as e:
+            logger.warning(f"Error guardando en caché de respuestas: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": settings.RESPONSE_CACHE_ENABLED,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# Instancia global
+response_cache = ResponseCache()
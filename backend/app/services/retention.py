@@ -0,0 +1,340 @@
+"""
+Retención de conversaciones: particiones mensuales, archivado comprimido de los meses
+antiguos y desactivación de sesiones inactivas
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import delete, func, select, text, update
+
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.core.state import get_state_backend
+from app.models.conversation import Conversation, Message
+from app.services.export_service import json_default
+from app.services.search_service import search_index
+
+LOCK_KEY = "retention:lock"
+
+ARCHIVE_COLUMNS = (
+    Message.id,
+    Message.conversation_id,
+    Conversation.session_id,
+    Conversation.user_id,
+    Message.role,
+    Message.content,
+    Message.timestamp,
+    Message.tokens_used,
+    Message.response_time_ms,
+    Message.outcome,
+)
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"messages_p{month:%Y%m}"
+
+
+class RetentionService:
+    """Mantiene acotada la tabla caliente de mensajes
+
+    Los mensajes se agrupan por mes (la partición). Se conservan los
+    RETENTION_HOT_MONTHS meses completos más recientes más el mes en curso. Cada
+    mes anterior se vuelca a RETENTION_ARCHIVE_DIR/messages-AAAA-MM.ndjson.gz y
+    después se elimina:
+      - PostgreSQL con messages particionada (PARTITION BY RANGE (timestamp)):
+        se crean por adelantado las particiones de los próximos meses, y las
+        particiones antiguas se separan (DETACH) y se borran enteras. La tabla
+        particionada no la crea init_db (create_all genera una tabla normal con
+        id como clave primaria, que no admite particionar por timestamp): hay
+        que migrarla a mano (ver README); sin migrar se usa el borrado por lotes.
+      - SQLite (o una tabla sin particionar): se borra por lotes de
+        RETENTION_DELETE_BATCH_SIZE filas, con un commit por lote, para no
+        retener el bloqueo de escritura.
+    Las conversaciones sin actividad en RETENTION_IDLE_SESSION_HOURS se marcan
+    inactivas; las inactivas que se quedan sin mensajes se eliminan.
+
+    Cada archivo lleva en el nombre el rango de ids que contiene
+    (messages-AAAA-MM.<primero>-<último>.ndjson.gz). Si un ciclo se interrumpe
+    entre el archivado y el borrado, el siguiente encuentra el archivo, borra
+    ese rango sin volver a archivarlo y solo archiva lo que quede fuera.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.deactivated_sessions = 0
+        self.archived_messages = 0
+        self.deleted_messages = 0
+        self.deleted_conversations = 0
+        self.dropped_partitions = 0
+        self.archives: List[str] = []
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    # Particiones nativas (PostgreSQL)
+
+    def native_partitioning(self) -> bool:
+        """True si messages es una tabla particionada de PostgreSQL"""
+        if engine.dialect.name != "postgresql":
+            return False
+        with engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('messages')"
+            )).first() is not None
+
+    def ensure_partitions(self, now: Optional[datetime] = None) -> List[str]:
+        """Crear las particiones del mes en curso y de los RETENTION_PARTITIONS_AHEAD siguientes"""
+        if not self.native_partitioning():
+            return []
+        current = month_start(now or datetime.now())
+        created = []
+        with engine.begin() as conn:
+            for offset in range(settings.RETENTION_PARTITIONS_AHEAD + 1):
+                month = add_months(current, offset)
+                name = partition_name(month)
+                if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+                    continue
+                conn.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF messages "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+                ))
+                created.append(name)
+        if created:
+            logger.info(f"Retención: particiones creadas {', '.join(created)}")
+        return created
+
+    # Sesiones inactivas
+
+    def deactivate_idle_sessions(self, now: Optional[datetime] = None) -> int:
+        cutoff = (now or datetime.now()) - timedelta(hours=settings.RETENTION_IDLE_SESSION_HOURS)
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(Conversation)
+                .where(Conversation.is_active.is_(True))
+                .where(func.coalesce(Conversation.updated_at, Conversation.created_at) < cutoff)
+                .values(is_active=False)
+            )
+            db.commit()
+            return result.rowcount or 0
+        finally:
+            db.close()
+
+    # Archivado de meses antiguos
+
+    def cold_months(self, now: Optional[datetime] = None) -> List[datetime]:
+        """Meses con mensajes anteriores a la ventana caliente, del más antiguo al más reciente"""
+        cutoff = add_months(month_start(now or datetime.now()), -settings.RETENTION_HOT_MONTHS)
+        db = SessionLocal()
+        try:
+            oldest = db.execute(select(func.min(Message.timestamp))).scalar()
+        finally:
+            db.close()
+        if oldest is None:
+            return []
+        if isinstance(oldest, str):  # SQLite sin tipos nativos
+            oldest = datetime.fromisoformat(oldest)
+        months = []
+        month = month_start(oldest)
+        while month < cutoff:
+            months.append(month)
+            month = add_months(month, 1)
+        return months
+
+    @staticmethod
+    def _archive_path(month: datetime, min_id: int, max_id: int) -> str:
+        return os.path.join(settings.RETENTION_ARCHIVE_DIR, f"messages-{month:%Y-%m}.{min_id}-{max_id}.ndjson.gz")
+
+    @staticmethod
+    def archived_ranges(month: datetime) -> List[Tuple[int, int]]:
+        """Rangos de ids (primero, último) ya volcados a archivos del mes"""
+        if not os.path.isdir(settings.RETENTION_ARCHIVE_DIR):
+            return []
+        pattern = re.compile(rf"^messages-{month:%Y-%m}\.(\d+)-(\d+)\.ndjson\.gz$")
+        matches = (pattern.match(name) for name in os.listdir(settings.RETENTION_ARCHIVE_DIR))
+        return sorted((int(match[1]), int(match[2])) for match in matches if match)
+
+    def _write_archive(self, month: datetime) -> Dict[str, Any]:
+        """Volcar los mensajes del mes a un NDJSON comprimido; devuelve ruta, filas e ids mínimo y máximo"""
+        query = (
+            select(*ARCHIVE_COLUMNS)
+            .outerjoin(Conversation, Message.conversation_id == Conversation.id)
+            .where(Message.timestamp >= month, Message.timestamp < add_months(month, 1))
+            .order_by(Message.id)
+            .execution_options(yield_per=settings.RETENTION_DELETE_BATCH_SIZE)
+        )
+        os.makedirs(settings.RETENTION_ARCHIVE_DIR, exist_ok=True)
+        # El rango de ids solo se conoce al terminar: se escribe a un temporal y se renombra
+        tmp_path = os.path.join(settings.RETENTION_ARCHIVE_DIR, f"messages-{month:%Y-%m}.ndjson.gz.partial")
+        path, rows, min_id, max_id = None, 0, None, None
+        db = SessionLocal()  # Siempre la primaria: la réplica podría no tener todo lo que se va a borrar
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                for row in db.execute(query):
+                    f.write(json.dumps(dict(row._mapping), ensure_ascii=False, default=json_default) + "\n")
+                    rows += 1
+                    min_id = row.id if min_id is None else min_id
+                    max_id = row.id
+            if rows:
+                path = self._archive_path(month, min_id, max_id)
+                os.replace(tmp_path, path)
+        finally:
+            db.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return {"path": path, "rows": rows, "min_id": min_id, "max_id": max_id}
+
+    def _drop_partition(self, month: datetime) -> bool:
+        name = partition_name(month)
+        with engine.begin() as conn:
+            if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+                return False
+            conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+        return True
+
+    def _delete_in_batches(self, month: datetime, min_id: int, max_id: int) -> int:
+        """Borrar solo lo archivado (min_id <= id <= max_id), un commit por lote"""
+        deleted = 0
+        db = SessionLocal()
+        try:
+            while True:
+                ids = db.execute(
+                    select(Message.id)
+                    .where(Message.timestamp >= month, Message.timestamp < add_months(month, 1))
+                    .where(Message.id.between(min_id, max_id))
+                    .limit(settings.RETENTION_DELETE_BATCH_SIZE)
+                ).scalars().all()
+                if not ids:
+                    return deleted
+                search_index.unindex_messages(db, ids)
+                db.execute(delete(Message).where(Message.id.in_(ids)))
+                db.commit()
+                deleted += len(ids)
+        finally:
+            db.close()
+
+    def _delete_empty_conversations(self) -> int:
+        deleted = 0
+        db = SessionLocal()
+        try:
+            while True:
+                ids = db.execute(
+                    select(Conversation.id)
+                    .where(Conversation.is_active.is_(False))
+                    .where(~select(Message.id).where(Message.conversation_id == Conversation.id).exists())
+                    .limit(settings.RETENTION_DELETE_BATCH_SIZE)
+                ).scalars().all()
+                if not ids:
+                    return deleted
+                db.execute(delete(Conversation).where(Conversation.id.in_(ids)))
+                db.commit()
+                deleted += len(ids)
+        finally:
+            db.close()
+
+    def archive_month(self, month: datetime, native: bool = False) -> Dict[str, Any]:
+        # Reanudar un ciclo interrumpido: lo que ya está en un archivo se borra sin volver a archivarlo
+        deleted = sum(self._delete_in_batches(month, min_id, max_id) for min_id, max_id in self.archived_ranges(month))
+        if deleted:
+            logger.info(f"Retención: {deleted} mensajes de {month:%Y-%m} ya archivados borrados (ciclo anterior interrumpido)")
+
+        archive = self._write_archive(month)
+        dropped = native and self._drop_partition(month)
+        if not dropped and archive["max_id"] is not None:
+            deleted += self._delete_in_batches(month, archive["min_id"], archive["max_id"])
+        elif dropped:
+            deleted += archive["rows"]
+            self.dropped_partitions += 1
+
+        self.archived_messages += archive["rows"]
+        self.deleted_messages += deleted
+        if archive["path"]:
+            self.archives.append(archive["path"])
+            logger.info(f"Retención: {archive['rows']} mensajes de {month:%Y-%m} archivados en {archive['path']}")
+        return {"month": f"{month:%Y-%m}", "archive": archive["path"], "archived": archive["rows"], "deleted": deleted}
+
+    def run(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Un ciclo completo: particiones futuras, sesiones inactivas, archivado y limpieza"""
+        started = time.perf_counter()
+        native = self.native_partitioning()
+        created = self.ensure_partitions(now) if native else []
+        deactivated = self.deactivate_idle_sessions(now)
+        months = [self.archive_month(month, native) for month in self.cold_months(now)]
+        conversations = self._delete_empty_conversations()
+
+        self.runs += 1
+        self.deactivated_sessions += deactivated
+        self.deleted_conversations += conversations
+        self.last_run = {
+            "finished_at": datetime.now().isoformat(),
+            "duration_ms": int((time.perf_counter() - started) * 1000),
+            "native_partitioning": native,
+            "partitions_created": created,
+            "deactivated_sessions": deactivated,
+            "months": months,
+            "deleted_conversations": conversations,
+        }
+        return self.last_run
+
+    async def run_periodically(self):
+        """Tarea de fondo: un ciclo cada RETENTION_INTERVAL_SECONDS en un único worker"""
+        while True:
+            try:
+                # Solo el worker que reclama el turno ejecuta el ciclo
+                claimed = await asyncio.to_thread(
+                    get_state_backend().incr, LOCK_KEY, ttl_seconds=settings.RETENTION_INTERVAL_SECONDS
+                )
+                if claimed == 1:
+                    await asyncio.to_thread(self.run)
+            except Exception as e:
+                logger.warning(f"Error en el ciclo de retención: {e}")
+            await asyncio.sleep(settings.RETENTION_INTERVAL_SECONDS)
+
+    def start(self):
+        """Iniciar la retención en segundo plano (llamar desde el lifespan de la app)"""
+        if self._task is None and settings.RETENTION_ENABLED:
+            self._task = asyncio.ensure_future(self.run_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.RETENTION_ENABLED,
+            "hot_months": settings.RETENTION_HOT_MONTHS,
+            "runs": self.runs,
+            "deactivated_sessions": self.deactivated_sessions,
+            "archived_messages": self.archived_messages,
+            "deleted_messages": self.deleted_messages,
+            "deleted_conversations": self.deleted_conversations,
+            "dropped_partitions": self.dropped_partitions,
+            "recent_archives": self.archives[-5:],
+            "last_run": self.last_run,
+        }
+
+
+# Instancia global
+retention_service = RetentionService()
@@ -0,0 +1,257 @@
+"""
+Búsqueda de texto completo sobre las conversaciones guardadas
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import ReadSessionLocal, engine, search_index_exists
+from app.models.conversation import Message
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+
+# FTS5 ejecuta una consulta por cada valor de "rowid IN (...)" (y recalcula bm25 en cada
+# una); con el rango la consulta es única y el "+" impide pasarle la lista al índice
+ID_FILTER = "f.rowid BETWEEN :lo AND :hi AND +f.rowid IN :ids"
+
+# Palabras de la consulta; un * final busca por prefijo ("analy*")
+_TERM = re.compile(r"\w+\*?", re.UNICODE)
+
+
+class SearchUnavailable(Exception):
+    """La base de datos no tiene índice de texto completo"""
+
+
+def fts5_query(query: str) -> str:
+    """Consulta del usuario como términos FTS5 entre comillas (AND implícito)
+
+    Se entrecomilla cada término para que la sintaxis de FTS5 (NEAR, OR, -,
+    paréntesis) no pueda romper la consulta.
+    """
+    terms = []
+    for term in _TERM.findall(query):
+        prefix = term.endswith("*")
+        word = term.rstrip("*")
+        terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """Índice de texto completo de messages.content
+
+    En SQLite es una tabla FTS5 de contenido externo: los mensajes se indexan en
+    la misma transacción que los guarda (_save_conversation) y se retiran antes
+    de borrarlos (retención). En PostgreSQL es un índice GIN de expresión y
+    no requiere mantenimiento desde la aplicación.
+    """
+
+    def __init__(self):
+        self._available: Optional[bool] = None
+        self.searches = 0
+        self.indexed = 0
+
+    @property
+    def dialect(self) -> str:
+        return engine.dialect.name
+
+    def available(self) -> bool:
+        # Se comprueba una vez por proceso (cada guardado lo consulta); init_db llama a refresh
+        if self._available is None:
+            with engine.connect() as conn:
+                self._available = search_index_exists(conn)
+        return self._available
+
+    def refresh(self):
+        """Olvidar el resultado de available() (tras crear o borrar el índice)"""
+        self._available = None
+
+    def _maintained_here(self) -> bool:
+        return self.dialect == "sqlite" and self.available()
+
+    def index_messages(self, db: Session, messages: Iterable[Message]):
+        """Indexar mensajes ya insertados (con id) dentro de la transacción en curso"""
+        if not self._maintained_here():
+            return
+        rows = [{"id": message.id, "content": message.content} for message in messages]
+        if rows:
+            db.execute(text("INSERT INTO messages_fts(rowid, content) VALUES (:id, :content)"), rows)
+            self.indexed += len(rows)
+
+    def unindex_messages(self, db: Session, ids: List[int]):
+        """Retirar del índice mensajes que se van a borrar (antes del DELETE)"""
+        if not self._maintained_here() or not ids:
+            return
+        statement = text(
+            "INSERT INTO messages_fts(messages_fts, rowid, content) "
+            "SELECT 'delete', id, content FROM messages WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True))
+        db.execute(statement, {"ids": list(ids)})
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        session_id: Optional[str] = None,
+        role: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Mensajes que contienen todos los términos, por relevancia, con fragmento resaltado
+
+        La relevancia se calcula solo entre las SEARCH_RANK_CANDIDATES coincidencias
+        más recientes (o los últimos mensajes de la sesión): ordenar por bm25 todas
+        las coincidencias de un término frecuente costaría segundos con millones de
+        mensajes. Se pide una fila de más para saber si hay otra página sin contar
+        el total; los fragmentos solo se calculan para la página devuelta.
+        """
+        if not self.available():
+            raise SearchUnavailable("La base de datos no tiene índice de texto completo")
+        limit = max(1, min(limit, settings.SEARCH_MAX_LIMIT))
+        offset = max(0, offset)
+
+        db = ReadSessionLocal()
+        try:
+            if self.dialect == "postgresql":
+                rows = self._search_postgres(db, query, limit + 1, offset, session_id, role)
+            else:
+                match = fts5_query(query)
+                if not match:
+                    raise ValueError("La consulta no contiene términos buscables")
+                rows = self._search_sqlite(db, match, limit + 1, offset, session_id, role)
+        finally:
+            db.close()
+
+        self.searches += 1
+        return {
+            "query": query,
+            "hits": rows[:limit],
+            "limit": limit,
+            "offset": offset,
+            "next_offset": offset + limit if len(rows) > limit else None,
+        }
+
+    def _search_sqlite(
+        self,
+        db: Session,
+        match: str,
+        limit: int,
+        offset: int,
+        session_id: Optional[str],
+        role: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        params: Dict[str, Any] = {"match": match, "role": role, "limit": limit, "offset": offset}
+        role_filter = "AND m.role = :role" if role is not None else ""
+
+        if session_id is not None:
+            # Una sesión tiene pocos mensajes: se puntúan solo sus ids
+            params["ids"] = db.execute(text(f"""
+                SELECT m.id FROM conversations c JOIN messages m ON m.conversation_id = c.id
+                WHERE c.session_id = :session_id {role_filter}
+                ORDER BY m.id DESC LIMIT :candidates
+            """), {"session_id": session_id, "role": role, "candidates": settings.SEARCH_RANK_CANDIDATES}).scalars().all()
+            if not params["ids"]:
+                return []
+            params.update(lo=min(params["ids"]), hi=max(params["ids"]))
+            ranked = text(f"""
+                SELECT f.rowid AS id, f.rank AS rank FROM messages_fts f
+                WHERE messages_fts MATCH :match AND {ID_FILTER}
+                ORDER BY +f.rank LIMIT :limit OFFSET :offset
+            """).bindparams(bindparam("ids", expanding=True))
+        else:
+            # FTS5 recorre las coincidencias por rowid sin ordenarlas todas; bm25 solo para los candidatos
+            params["candidates"] = settings.SEARCH_RANK_CANDIDATES
+            join = "JOIN messages m ON m.id = f.rowid" if role is not None else ""
+            ranked = text(f"""
+                SELECT id, rank FROM (
+                    SELECT f.rowid AS id, f.rank AS rank FROM messages_fts f {join}
+                    WHERE messages_fts MATCH :match {role_filter}
+                    ORDER BY f.rowid DESC LIMIT :candidates
+                )
+                ORDER BY rank LIMIT :limit OFFSET :offset
+            """)
+        page = db.execute(ranked, params).all()
+        if not page:
+            return []
+
+        details = db.execute(text(f"""
+            SELECT f.rowid AS id, c.session_id, m.role, m.timestamp,
+                   snippet(messages_fts, 0, '{SNIPPET_START}', '{SNIPPET_END}', '…', 16) AS snippet
+            FROM messages_fts f
+            JOIN messages m ON m.id = f.rowid
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE messages_fts MATCH :match AND {ID_FILTER}
+        """).bindparams(bindparam("ids", expanding=True)), {
+            "match": match, "ids": [row.id for row in page], "lo": min(row.id for row in page), "hi": max(row.id for row in page)
+        }).mappings()
+        by_id = {row["id"]: row for row in details}
+        return [
+            {
+                "message_id": row.id,
+                "session_id": by_id[row.id]["session_id"],
+                "role": by_id[row.id]["role"],
+                "timestamp": by_id[row.id]["timestamp"],
+                "score": -row.rank,  # bm25 de FTS5: más negativo = más relevante
+                "snippet": by_id[row.id]["snippet"],
+            }
+            for row in page
+            if row.id in by_id
+        ]
+
+    def _search_postgres(
+        self,
+        db: Session,
+        query: str,
+        limit: int,
+        offset: int,
+        session_id: Optional[str],
+        role: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        config = settings.SEARCH_TS_CONFIG
+        filters = []
+        if session_id is not None:
+            filters.append("AND c.session_id = :session_id")
+        if role is not None:
+            filters.append("AND m.role = :role")
+        # La expresión to_tsvector debe coincidir con la del índice GIN
+        sql = f"""
+            WITH candidates AS (
+                SELECT m.id, m.content, c.session_id, m.role, m.timestamp, q
+                FROM messages m
+                JOIN conversations c ON c.id = m.conversation_id,
+                     websearch_to_tsquery('{config}', :query) q
+                WHERE to_tsvector('{config}', m.content) @@ q {" ".join(filters)}
+                ORDER BY m.id DESC
+                LIMIT :candidates
+            ), page AS (
+                SELECT *, ts_rank(to_tsvector('{config}', content), q) AS score
+                FROM candidates
+                ORDER BY score DESC
+                LIMIT :limit OFFSET :offset
+            )
+            SELECT id AS message_id, session_id, role, timestamp, score,
+                   ts_headline('{config}', content, q,
+                               'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords=24, MinWords=8') AS snippet
+            FROM page
+            ORDER BY score DESC
+        """
+        params = {
+            "query": query, "session_id": session_id, "role": role,
+            "candidates": settings.SEARCH_RANK_CANDIDATES, "limit": limit, "offset": offset,
+        }
+        return [dict(row) for row in db.execute(text(sql), params).mappings()]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "available": self.available(),
+            "backend": "tsvector" if self.dialect == "postgresql" else "fts5",
+            "searches": self.searches,
+            "indexed": self.indexed,
+        }
+
+
+# Instancia global
+search_index = SearchIndex()
@@ -0,0 +1,62 @@
+"""
+Grafo de etapas asíncronas previas al LLM con medición por etapa
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.tracing import RunTrace
+
+
+class StageGraph:
+    """Etapas con dependencias que arrancan en cuanto terminan las suyas
+
+    Cada etapa es una corrutina que recibe los resultados de sus dependencias
+    y se mide como un span de la traza (solo su propio trabajo, no la espera).
+    Las etapas independientes se ejecutan a la vez, así el coste de la
+    preparación es el de la rama más lenta y no la suma. Quien consume el
+    grafo espera solo los resultados que necesita y cancela el resto (p. ej.
+    el prompt tras un acierto de caché).
+
+    Con PIPELINE_PARALLEL_STAGES=false cada etapa espera además a la anterior
+    en orden de alta: el comportamiento en serie de antes, para comparar.
+    """
+
+    def __init__(self, trace: RunTrace, parallel: Optional[bool] = None):
+        self.trace = trace
+        self.parallel = settings.PIPELINE_PARALLEL_STAGES if parallel is None else parallel
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._order: List[str] = []
+
+    def add(self, name: str, stage: Callable[..., Awaitable[Any]], *deps: str):
+        """Registrar y lanzar una etapa; recibe los resultados de deps en el mismo orden"""
+        waits_for = [*deps]
+        if not self.parallel and self._order:
+            waits_for.append(self._order[-1])
+        upstream = [self._tasks[dep] for dep in waits_for]
+
+        async def run():
+            if upstream:
+                await asyncio.gather(*upstream)
+            results = [task.result() for task in upstream[:len(deps)]]
+            with self.trace.span(name):
+                return await stage(*results)
+
+        self._tasks[name] = asyncio.ensure_future(run())
+        self._order.append(name)
+
+    async def result(self, name: str) -> Any:
+        return await self._tasks[name]
+
+    def cancel(self, *names: str):
+        """Cancelar las etapas indicadas (todas si no se indica ninguna) que sigan en curso"""
+        for name in names or self._order:
+            task = self._tasks[name]
+            if not task.done():
+                task.cancel()
+
+    async def close(self):
+        """Cancelar lo pendiente y esperar a que termine (sin propagar sus errores)"""
+        self.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
@@ -0,0 +1,116 @@
+"""
+Salida estructurada nativa (JSON schema del proveedor) y renderizado a markdown en servidor
+"""
+
+from typing import Any, Dict, List, Optional, Type
+
+from langchain_core.utils.function_calling import convert_to_openai_function
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+# Formato de cada campo en markdown, en el orden en que el modelo emite el JSON.
+# Ningún formato lleva texto después del valor: así el render de un objeto parcial
+# siempre es prefijo del render final y se puede emitir en streaming como deltas.
+MARKDOWN_LAYOUTS: Dict[str, Dict[str, str]] = {
+    "ProjectInfo": {
+        "name": "### {}",
+        "description": "{}",
+        "technologies": "\n- **Tecnologías**: {}",
+        "status": "- **Estado**: {}",
+        "progress_percentage": "- **Progreso**: {}%",
+    },
+    "SkillAssessment": {
+        "skill": "### {}",
+        "level": "- **Nivel**: {}",
+        "experience_months": "- **Experiencia**: {} meses",
+        "description": "\n{}",
+    },
+    "ContactResponse": {
+        "message": "{}",
+        "email": "\n- **Email**: {}",
+        "github": "- **GitHub**: {}",
+        "linkedin": "- **LinkedIn**: {}",
+    },
+}
+
+
+def json_schema_response_format(schema: Type[BaseModel]) -> Dict[str, Any]:
+    """response_format de OpenAI en modo json_schema estricto para un modelo Pydantic"""
+    function = convert_to_openai_function(schema, strict=True)
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": function["name"],
+            "description": function.get("description", ""),
+            "schema": function["parameters"],
+            "strict": True,
+        },
+    }
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    return str(value)
+
+
+def render_markdown(schema: Type[BaseModel], data: Any, final: bool = True) -> str:
+    """Renderizar un objeto estructurado (completo o parcial) a markdown
+
+    Con final=False solo se incluyen los campos cerrados (ya empezó el siguiente)
+    y el último si es texto, que crece por el final; números y listas esperan a
+    cerrarse para no reescribir lo ya emitido.
+    """
+    if isinstance(data, BaseModel):
+        data = data.model_dump()
+    if not isinstance(data, dict):
+        return str(data) if data else ""
+
+    layout = MARKDOWN_LAYOUTS.get(schema.__name__) or {name: f"- **{name}**: {{}}" for name in schema.model_fields}
+    present = [name for name in layout if name in data]
+    lines: List[str] = []
+    for index, name in enumerate(present):
+        value = data[name]
+        is_open = not final and index == len(present) - 1
+        if is_open and not isinstance(value, str):
+            break
+        if value is None or value == "" or value == []:
+            continue
+        lines.append(layout[name].format(_format_value(value)))
+    return "\n".join(lines)
+
+
+def finalize(schema: Type[BaseModel], data: Any) -> str:
+    """Render final; un objeto que no valida se muestra igualmente con lo que tenga"""
+    if isinstance(data, dict):
+        try:
+            schema.model_validate(data)
+        except ValidationError as e:
+            logger.warning(f"Salida estructurada {schema.__name__} incompleta: {e.error_count()} errores")
+    return render_markdown(schema, data, final=True)
+
+
+class IncrementalMarkdown:
+    """Convierte los objetos parciales de un stream JSON en deltas de markdown"""
+
+    def __init__(self, schema: Type[BaseModel]):
+        self.schema = schema
+        self.emitted = ""
+
+    def _delta(self, rendered: str) -> Optional[str]:
+        if rendered.startswith(self.emitted) and len(rendered) > len(self.emitted):
+            delta = rendered[len(self.emitted):]
+            self.emitted = rendered
+            return delta
+        return None
+
+    def feed(self, partial: Any) -> Optional[str]:
+        return self._delta(render_markdown(self.schema, partial, final=False))
+
+    def close(self, data: Any) -> Optional[str]:
+        rendered = finalize(self.schema, data)
+        if not rendered.startswith(self.emitted):
+            # No debería ocurrir con los layouts actuales; se registra en vez de duplicar texto
+            logger.warning(f"Render final de {self.schema.__name__} no extiende lo emitido")
+            return None
+        return self._delta(rendered)
@@ -0,0 +1,257 @@
+"""
+Sugerencias de seguimiento precalculadas desde la base de conocimientos
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from loguru import logger
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.schemas.chat import ChatMessage, MessageRole
+from app.services.cache_keys import normalize_message
+from app.services.knowledge_base import KnowledgeBase, knowledge_base, normalize_term
+from app.services.prompt_service import prompt_service
+
+PREFETCH_SESSION_ID = "suggestion-prefetch"
+
+# Sugerencias que FactAnswerService resuelve con una plantilla (sin LLM)
+FACT_KINDS = {"project", "skill", "status", "contact"}
+
+
+class Suggestion(BaseModel):
+    """Pregunta sugerida y si su respuesta sale de la base de conocimientos"""
+    text: str
+    kind: str
+    intent: str
+    key: str  # normalize_message(text)
+
+    @property
+    def instant(self) -> bool:
+        return (
+            self.kind in FACT_KINDS
+            and settings.FACT_ANSWERS_ENABLED
+            and self.intent in settings.FACT_ANSWER_INTENTS
+        )
+
+
+def project_topic(name: str) -> str:
+    return f"project:{normalize_term(name)}"
+
+
+def skill_topic(name: str) -> str:
+    return f"skill:{normalize_term(name)}"
+
+
+class SuggestionService:
+    """Preguntas de seguimiento indexadas por intención y por tema de la base de conocimientos
+
+    Se generan una vez desde los datos (proyectos, habilidades, contacto) sin
+    llamar al LLM, y cada respuesta elige las de los proyectos y habilidades
+    que menciona y las de su intención. Las que FactAnswerService responde con
+    plantillas son instantáneas al pulsarlas; para la primera que necesita LLM
+    se puede generar la respuesta en segundo plano (SUGGESTION_PREFETCH_ENABLED)
+    con el historial que enviará el cliente, de modo que el clic sea un acierto
+    de caché.
+    """
+
+    def __init__(self, kb: KnowledgeBase):
+        self.kb = kb
+        self.by_intent: Dict[str, List[Suggestion]] = {}
+        self.by_topic: Dict[str, List[Suggestion]] = {}
+        self._keys: Set[str] = set()
+        self._prefetch_tasks: Set[asyncio.Task] = set()
+        self._prefetch_semaphore: Optional[asyncio.Semaphore] = None
+        self.served = 0
+        self.clicks = 0
+        self.prefetch_started = 0
+        self.prefetch_skipped = 0
+        self.prefetch_failed = 0
+        self.build()
+
+    def _make(self, text: str, kind: str) -> Suggestion:
+        suggestion = Suggestion(
+            text=text, kind=kind, intent=prompt_service.classify_query_intent(text), key=normalize_message(text)
+        )
+        self._keys.add(suggestion.key)
+        return suggestion
+
+    def build(self):
+        """Precalcular el índice (al importar; llamar de nuevo si cambia la base de conocimientos)"""
+        kb = self.kb
+        name = kb.profile.name.split()[0]
+        self._keys = set()
+
+        projects = {
+            project.name: self._make(f"Cuéntame más sobre el proyecto {project.name}", "project")
+            for project in kb.projects
+        }
+        skills = {
+            skill.name: self._make(f"¿Qué experiencia tiene {name} con {skill.name}?", "skill")
+            for skill in kb.skills
+        }
+        in_progress = self._make("¿Qué proyectos tiene en desarrollo?", "status")
+        completed = self._make("¿Qué proyectos tiene completados?", "status")
+        contact = self._make(f"¿Cómo puedo contactar a {name}?", "contact")
+        availability = self._make(f"¿Está {name} disponible para trabajo remoto?", "general")
+        education = self._make(f"¿Dónde estudia {name}?", "general")
+        specialization = self._make(f"¿En qué se especializa {name}?", "general")
+
+        # Habilidades con más meses de experiencia primero
+        top_skills = [
+            skills[skill.name]
+            for skill in sorted(kb.skills, key=lambda skill: -(skill.experience_months or 0))[:3]
+        ]
+
+        self.by_intent = {
+            "projects": [in_progress, completed, *projects.values()],
+            "skills": [*top_skills, in_progress],
+            "contact": [availability, in_progress, education],
+            "general": [in_progress, specialization, contact, *top_skills[:1]],
+        }
+
+        self.by_topic = {}
+        for project in kb.projects:
+            related_skills = [
+                skills[skill.name]
+                for skill in (kb.get_skill(technology) for technology in project.technologies)
+                if skill is not None
+            ]
+            related_projects = [
+                projects[other.name]
+                for other in kb.projects
+                if other is not project and set(other.technologies) & set(project.technologies)
+            ]
+            self.by_topic[project_topic(project.name)] = [*related_skills[:2], *related_projects[:1], contact]
+        for skill in kb.skills:
+            used_in = [projects[project.name] for project in kb.projects_using_skill(skill)]
+            same_category = [
+                skills[other.name]
+                for other in kb.skills_by_category.get(skill.category, [])
+                if other is not skill
+            ]
+            self.by_topic[skill_topic(skill.name)] = [*used_in[:2], *same_category[:1], in_progress]
+
+    def suggest(
+        self,
+        message: str,
+        intent: str,
+        answer: str = "",
+        conversation_history: Optional[List[ChatMessage]] = None,
+        limit: Optional[int] = None
+    ) -> List[Suggestion]:
+        """Sugerencias para una respuesta: temas mencionados primero, después los de la intención
+
+        Se excluyen la propia pregunta y las ya hechas en el historial.
+        """
+        if not settings.SUGGESTIONS_ENABLED:
+            return []
+        limit = limit or settings.SUGGESTIONS_MAX
+        asked = {normalize_message(message)}
+        asked.update(
+            normalize_message(msg.content) for msg in (conversation_history or []) if msg.role == MessageRole.USER
+        )
+        if normalize_message(message) in self._keys:
+            self.clicks += 1
+
+        # Temas de la pregunta y, si no menciona ninguno, los de la respuesta
+        topics = [project_topic(p.name) for p in self.kb.find_projects(message)]
+        topics += [skill_topic(s.name) for s in self.kb.find_skills(message)]
+        if not topics and answer:
+            topics = [project_topic(p.name) for p in self.kb.find_projects(answer)][:2]
+
+        picked: List[Suggestion] = []
+        for group in [*(self.by_topic.get(topic, []) for topic in topics), self.by_intent.get(intent, [])]:
+            for suggestion in group:
+                if suggestion.key not in asked:
+                    asked.add(suggestion.key)
+                    picked.append(suggestion)
+                if len(picked) >= limit:
+                    break
+            if len(picked) >= limit:
+                break
+
+        self.served += len(picked)
+        return picked
+
+    def prefetch(
+        self,
+        suggestions: List[Suggestion],
+        generate: Callable[..., Awaitable[Dict[str, Any]]],
+        message: str,
+        answer: str,
+        conversation_history: Optional[List[ChatMessage]],
+        temperature: float
+    ):
+        """Generar en segundo plano la respuesta de la primera sugerencia que necesita LLM
+
+        El historial es el que enviará el cliente al pulsarla (el anterior más
+        este turno), así la respuesta queda bajo la misma clave de caché. Es
+        trabajo especulativo: si ya hay SUGGESTION_PREFETCH_CONCURRENCY en curso
+        se descarta en lugar de esperar.
+        """
+        if not (settings.SUGGESTION_PREFETCH_ENABLED and settings.RESPONSE_CACHE_ENABLED):
+            return
+        target = next((suggestion for suggestion in suggestions if not suggestion.instant), None)
+        if target is None:
+            return
+        if self._prefetch_semaphore is None:
+            self._prefetch_semaphore = asyncio.Semaphore(settings.SUGGESTION_PREFETCH_CONCURRENCY)
+        if self._prefetch_semaphore.locked():
+            self.prefetch_skipped += 1
+            return
+
+        history = [
+            *(conversation_history or []),
+            ChatMessage(role=MessageRole.USER, content=message),
+            ChatMessage(role=MessageRole.ASSISTANT, content=answer),
+        ]
+
+        async def run():
+            async with self._prefetch_semaphore:
+                try:
+                    await generate(
+                        message=target.text,
+                        session_id=PREFETCH_SESSION_ID,
+                        conversation_history=history,
+                        temperature=temperature,
+                        persist=False,
+                        run_name="prefetch"
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.prefetch_failed += 1
+                    logger.warning(f"Sugerencias: error precargando '{target.text}': {e}")
+
+        self.prefetch_started += 1
+        task = asyncio.ensure_future(run())
+        self._prefetch_tasks.add(task)
+        task.add_done_callback(self._prefetch_tasks.discard)
+
+    async def stop(self):
+        """Cancelar las precargas en curso (llamar desde el lifespan de la app)"""
+        for task in list(self._prefetch_tasks):
+            task.cancel()
+        await asyncio.gather(*self._prefetch_tasks, return_exceptions=True)
+        self._prefetch_tasks.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.SUGGESTIONS_ENABLED,
+            "indexed": {"intents": len(self.by_intent), "topics": len(self.by_topic), "questions": len(self._keys)},
+            "served": self.served,
+            "clicks": self.clicks,
+            "prefetch": {
+                "enabled": settings.SUGGESTION_PREFETCH_ENABLED,
+                "started": self.prefetch_started,
+                "skipped": self.prefetch_skipped,
+                "failed": self.prefetch_failed,
+                "in_flight": len(self._prefetch_tasks),
+            },
+        }
+
+
+# Instancia global
+suggestion_service = SuggestionService(knowledge_base)
@@ -0,0 +1,141 @@
+"""
+Presupuestos de tokens de salida (max_tokens) por intención, ajustados con las longitudes observadas
+"""
+
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import ReadSessionLocal
+from app.models.conversation import Message
+
+
+def percentile(values: List[int], q: float) -> int:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TokenBudgets:
+    """max_tokens de cada intención
+
+    Parte de OUTPUT_TOKEN_BUDGETS. Con OUTPUT_BUDGET_ADAPTIVE, cada
+    OUTPUT_BUDGET_REFRESH_SECONDS se recalcula desde los completion_tokens de las
+    últimas respuestas generadas por el LLM (Message.completion_tokens). Se usa
+    el percentil OUTPUT_BUDGET_PERCENTILE con un margen de OUTPUT_BUDGET_HEADROOM,
+    dentro de [OUTPUT_BUDGET_MIN_TOKENS, OUTPUT_BUDGET_MAX_TOKENS]. Las
+    respuestas que llegaron al presupuesto están recortadas y no dicen cuánto
+    habrían ocupado: si superan OUTPUT_BUDGET_TRUNCATION_RATE, el presupuesto
+    crece un 50% en lugar de recalcularse. Cada worker lo recalcula por su cuenta
+    (solo lecturas, con el mismo resultado).
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.adaptive: Dict[str, int] = {}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.stream_cutoffs: Dict[str, int] = {}
+        self.last_refresh: Optional[str] = None
+
+    def static_budget(self, intent: str) -> int:
+        budgets = settings.OUTPUT_TOKEN_BUDGETS
+        return budgets.get(intent, budgets.get("general", settings.OUTPUT_BUDGET_MAX_TOKENS))
+
+    def budget(self, intent: Optional[str]) -> int:
+        intent = intent or "general"
+        if settings.OUTPUT_BUDGET_ADAPTIVE and intent in self.adaptive:
+            return self.adaptive[intent]
+        return self.static_budget(intent)
+
+    def record_stream_cutoff(self, intent: Optional[str]):
+        intent = intent or "general"
+        self.stream_cutoffs[intent] = self.stream_cutoffs.get(intent, 0) + 1
+
+    def _samples(self, intent: str, since: datetime) -> List[int]:
+        db = ReadSessionLocal()
+        try:
+            return db.execute(
+                select(Message.completion_tokens)
+                .where(
+                    Message.intent == intent,
+                    Message.role == "assistant",
+                    Message.outcome == "completed",
+                    Message.completion_tokens.is_not(None),
+                    Message.timestamp >= since,
+                )
+                .order_by(Message.id.desc())
+                .limit(settings.OUTPUT_BUDGET_SAMPLE_SIZE)
+            ).scalars().all()
+        finally:
+            db.close()
+
+    def _next_budget(self, current: int, samples: List[int]) -> Dict[str, Any]:
+        truncated = sum(1 for value in samples if value >= current) / len(samples)
+        observed = percentile(samples, settings.OUTPUT_BUDGET_PERCENTILE)
+        if truncated > settings.OUTPUT_BUDGET_TRUNCATION_RATE:
+            proposed = math.ceil(current * 1.5)
+        else:
+            proposed = math.ceil(observed * settings.OUTPUT_BUDGET_HEADROOM)
+        budget = max(settings.OUTPUT_BUDGET_MIN_TOKENS, min(settings.OUTPUT_BUDGET_MAX_TOKENS, proposed))
+        return {"samples": len(samples), "observed": observed, "truncated_rate": round(truncated, 3), "budget": budget}
+
+    def refresh(self, now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+        """Recalcular los presupuestos de las intenciones con muestras suficientes"""
+        since = (now or datetime.now()) - timedelta(days=settings.OUTPUT_BUDGET_WINDOW_DAYS)
+        for intent in settings.OUTPUT_TOKEN_BUDGETS:
+            samples = self._samples(intent, since)
+            if len(samples) < settings.OUTPUT_BUDGET_MIN_SAMPLES:
+                self.stats[intent] = {"samples": len(samples), "budget": self.budget(intent)}
+                continue
+            current = self.budget(intent)
+            stats = self._next_budget(current, samples)
+            if stats["budget"] != current:
+                logger.info(f"Presupuesto de tokens de '{intent}': {current} -> {stats['budget']}")
+            self.adaptive[intent] = stats["budget"]
+            self.stats[intent] = stats
+        self.last_refresh = datetime.now().isoformat()
+        return self.stats
+
+    async def refresh_periodically(self):
+        """Tarea de fondo: recalcular cada OUTPUT_BUDGET_REFRESH_SECONDS"""
+        while True:
+            try:
+                started = time.perf_counter()
+                await asyncio.to_thread(self.refresh)
+                logger.debug(f"Presupuestos de tokens recalculados en {(time.perf_counter() - started) * 1000:.0f}ms")
+            except Exception as e:
+                logger.warning(f"Error recalculando presupuestos de tokens: {e}")
+            await asyncio.sleep(settings.OUTPUT_BUDGET_REFRESH_SECONDS)
+
+    def start(self):
+        """Iniciar el ajuste en segundo plano (llamar desde el lifespan de la app)"""
+        if self._task is None and settings.OUTPUT_BUDGET_ADAPTIVE:
+            self._task = asyncio.ensure_future(self.refresh_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "adaptive": settings.OUTPUT_BUDGET_ADAPTIVE,
+            "budgets": {intent: self.budget(intent) for intent in settings.OUTPUT_TOKEN_BUDGETS},
+            "static": dict(settings.OUTPUT_TOKEN_BUDGETS),
+            "stats": self.stats,
+            "stream_cutoffs": dict(self.stream_cutoffs),
+            "last_refresh": self.last_refresh,
+        }
+
+
+# Instancia global
+token_budgets = TokenBudgets()
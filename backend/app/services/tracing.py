@@ -0,0 +1,452 @@
+"""
+Trazas locales por petición (etapas, latencia, tokens, modelo, intención, errores)
+en un SQLite de solo inserción, con API de consulta indexada para analíticas
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from loguru import logger
+
+from app.core.config import settings
+
+# Columnas por las que se puede agrupar en las analíticas
+GROUP_BY_FIELDS = ("model", "intent", "status", "name")
+
+# Percentiles calculados en SQL con funciones de ventana
+PERCENTILES = {"p50": 0.50, "p95": 0.95, "p99": 0.99}
+
+
+class Span:
+    """Etapa de una petición, con inicio relativo al comienzo de la traza"""
+
+    __slots__ = ("name", "offset_ms", "duration_ms", "status", "error")
+
+    def __init__(self, name: str, offset_ms: float):
+        self.name = name
+        self.offset_ms = offset_ms
+        self.duration_ms = 0.0
+        self.status = "success"
+        self.error: Optional[str] = None
+
+
+class RunTrace:
+    """Traza de una petición de chat: se completa durante la petición y se registra al final"""
+
+    def __init__(self, name: str, session_id: Optional[str] = None, user_id: Optional[str] = None):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.session_id = session_id
+        self.user_id = user_id
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = 0.0
+        self.ttft_ms: Optional[float] = None
+        self.status = "success"
+        self.error: Optional[str] = None
+        self.model: Optional[str] = None
+        self.intent: Optional[str] = None
+        self.cached = False
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.spans: List[Span] = []
+
+    def _elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        """Medir una etapa; válido también alrededor de código con await"""
+        span = Span(name, self._elapsed_ms())
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error" if isinstance(e, Exception) else "cancelled"
+            span.error = repr(e)
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - start) * 1000
+            self.spans.append(span)
+
+    def mark_first_token(self):
+        if self.ttft_ms is None:
+            self.ttft_ms = self._elapsed_ms()
+
+    def add_usage(self, prompt_tokens: int, completion_tokens: int, total_tokens: int):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.total_tokens += total_tokens
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.duration_ms = self._elapsed_ms()
+        if error is not None:
+            self.status = "error" if isinstance(error, Exception) else "cancelled"
+            self.error = repr(error)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Suma en la traza los tokens que devuelve el proveedor en cada llamada al modelo"""
+
+    run_inline = True
+
+    def __init__(self, trace: RunTrace):
+        self.trace = trace
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self.trace.add_usage(
+                        usage.get("input_tokens", 0),
+                        usage.get("output_tokens", 0),
+                        usage.get("total_tokens", 0)
+                    )
+                    return
+        # Algunos modelos solo informan el uso agregado en llm_output
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            self.trace.add_usage(
+                usage.get("prompt_tokens", 0),
+                usage.get("completion_tokens", 0),
+                usage.get("total_tokens", 0)
+            )
+
+
+class TraceStore:
+    """Tablas runs y spans en un fichero SQLite (WAL) compartido por los workers de la máquina"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id TEXT PRIMARY KEY, name TEXT NOT NULL, started_at REAL NOT NULL, "
+            "duration_ms REAL NOT NULL, ttft_ms REAL, status TEXT NOT NULL, error TEXT, "
+            "session_id TEXT, user_id TEXT, model TEXT, intent TEXT, cached INTEGER NOT NULL DEFAULT 0, "
+            "prompt_tokens INTEGER NOT NULL DEFAULT 0, completion_tokens INTEGER NOT NULL DEFAULT 0, "
+            "total_tokens INTEGER NOT NULL DEFAULT 0);"
+            "CREATE INDEX IF NOT EXISTS ix_runs_started_at ON runs (started_at);"
+            "CREATE INDEX IF NOT EXISTS ix_runs_model_started_at ON runs (model, started_at);"
+            "CREATE INDEX IF NOT EXISTS ix_runs_intent_started_at ON runs (intent, started_at);"
+            "CREATE INDEX IF NOT EXISTS ix_runs_status_started_at ON runs (status, started_at);"
+            "CREATE INDEX IF NOT EXISTS ix_runs_session_id ON runs (session_id);"
+            "CREATE TABLE IF NOT EXISTS spans ("
+            "run_id TEXT NOT NULL, name TEXT NOT NULL, started_at REAL NOT NULL, "
+            "offset_ms REAL NOT NULL, duration_ms REAL NOT NULL, status TEXT NOT NULL, error TEXT);"
+            "CREATE INDEX IF NOT EXISTS ix_spans_run_id ON spans (run_id);"
+            "CREATE INDEX IF NOT EXISTS ix_spans_started_at ON spans (started_at);"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Una conexión por hilo; autocommit con WAL para lecturas concurrentes"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def append(self, runs: List[RunTrace]):
+        """Insertar un lote de trazas en una sola transacción"""
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (run.id, run.name, run.started_at, run.duration_ms, run.ttft_ms, run.status, run.error,
+                     run.session_id, run.user_id, run.model, run.intent, int(run.cached),
+                     run.prompt_tokens, run.completion_tokens, run.total_tokens)
+                    for run in runs
+                ]
+            )
+            conn.executemany(
+                "INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (run.id, span.name, run.started_at + span.offset_ms / 1000, span.offset_ms,
+                     span.duration_ms, span.status, span.error)
+                    for run in runs
+                    for span in run.spans
+                ]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _where(since: Optional[float], until: Optional[float], filters: Dict[str, Any], prefix: str = ""):
+        clauses, params = [], []
+        if since is not None:
+            clauses.append(f"{prefix}started_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append(f"{prefix}started_at < ?")
+            params.append(until)
+        for column, value in filters.items():
+            if column not in GROUP_BY_FIELDS:
+                raise ValueError(f"Filtro no soportado: {column}")
+            if value is not None:
+                clauses.append(f"{prefix}{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _stats(self, table: str, group: str, where: str, params: List[Any], token_columns: bool) -> List[Dict[str, Any]]:
+        """Conteo, latencia media y percentiles (ROW_NUMBER por grupo) y errores"""
+        percentiles = ", ".join(
+            f"MAX(CASE WHEN rn = CAST({q} * (cnt - 1) AS INTEGER) + 1 THEN duration_ms END) AS {name}"
+            for name, q in PERCENTILES.items()
+        )
+        tokens = (
+            ", SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens, "
+            "SUM(total_tokens) AS total_tokens, SUM(cached) AS cached, AVG(ttft_ms) AS avg_ttft_ms"
+            if token_columns else ""
+        )
+        inner_tokens = ", prompt_tokens, completion_tokens, total_tokens, cached, ttft_ms" if token_columns else ""
+        query = (
+            f"SELECT grp, COUNT(*) AS count, AVG(duration_ms) AS avg_ms, {percentiles}, "
+            f"SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) AS successful, "
+            f"SUM(CASE WHEN status = 'error' THEN 1 ELSE 0 END) AS failed, "
+            f"SUM(CASE WHEN status = 'cancelled' THEN 1 ELSE 0 END) AS cancelled{tokens} "
+            f"FROM (SELECT {group} AS grp, duration_ms, status{inner_tokens}, "
+            f"ROW_NUMBER() OVER (PARTITION BY {group} ORDER BY duration_ms) AS rn, "
+            f"COUNT(*) OVER (PARTITION BY {group}) AS cnt FROM {table}{where}) "
+            f"GROUP BY grp ORDER BY count DESC"
+        )
+        rows = self._connection().execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def analytics(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        group_by: Optional[str] = None,
+        **filters: Any
+    ) -> Dict[str, Any]:
+        """Resumen de runs en la ventana, desglose opcional y latencia por etapa"""
+        where, params = self._where(since, until, filters)
+        overall = self._stats("runs", "'all'", where, params, token_columns=True)
+        result: Dict[str, Any] = {"runs": overall[0] if overall else {"count": 0}}
+        result["runs"].pop("grp", None)
+        if group_by:
+            if group_by not in GROUP_BY_FIELDS:
+                raise ValueError(f"group_by no soportado: {group_by}")
+            result["by_" + group_by] = self._stats("runs", group_by, where, params, token_columns=True)
+
+        # Las etapas se filtran por los runs de la ventana, no por su propio inicio
+        span_where, params = self._where(since, until, filters, prefix="runs.")
+        stages = self._stats(
+            "(SELECT spans.name AS name, spans.duration_ms AS duration_ms, spans.status AS status "
+            f"FROM spans JOIN runs ON runs.id = spans.run_id{span_where})",
+            "name", "", params, token_columns=False
+        )
+        result["stages"] = stages
+        return result
+
+    def recent_runs(self, limit: int = 50, **filters: Any) -> List[Dict[str, Any]]:
+        where, params = self._where(None, None, filters)
+        rows = self._connection().execute(
+            f"SELECT * FROM runs{where} ORDER BY started_at DESC LIMIT ?", [*params, limit]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connection()
+        row = conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        spans = conn.execute(
+            "SELECT name, offset_ms, duration_ms, status, error FROM spans WHERE run_id = ? ORDER BY offset_ms",
+            (run_id,)
+        ).fetchall()
+        return {**dict(row), "spans": [dict(span) for span in spans]}
+
+    def purge_older_than(self, cutoff: float) -> int:
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.execute("DELETE FROM spans WHERE started_at < ?", (cutoff,))
+            removed = conn.execute("DELETE FROM runs WHERE started_at < ?", (cutoff,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+
+def _dotted_stamp(timestamp: float, run_id: str) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y%m%dT%H%M%S%fZ") + run_id
+
+
+class TraceRecorder:
+    """Acumula trazas en memoria y las escribe por lotes fuera del camino de la petición
+
+    record() solo añade a un buffer acotado; la tarea de fondo (o una consulta)
+    lo vuelca en SQLite y, si está activado, lo reenvía a LangSmith.
+    """
+
+    def __init__(self):
+        self._store: Optional[TraceStore] = None
+        self._buffer: List[RunTrace] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.forwarded = 0
+
+    @property
+    def store(self) -> TraceStore:
+        if self._store is None:
+            self._store = TraceStore(settings.TRACE_DB_PATH)
+        return self._store
+
+    def start(self, name: str, session_id: Optional[str] = None, user_id: Optional[str] = None) -> RunTrace:
+        return RunTrace(name, session_id, user_id)
+
+    def record(self, trace: RunTrace):
+        if not settings.TRACE_ENABLED:
+            return
+        with self._lock:
+            if len(self._buffer) >= settings.TRACE_BUFFER_MAX:
+                self.dropped += 1
+                return
+            self._buffer.append(trace)
+            self.recorded += 1
+
+    def flush(self) -> int:
+        """Escribir las trazas pendientes; devuelve cuántas se escribieron"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                self.store.append(batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.error(f"Error escribiendo {len(batch)} trazas: {e}")
+                return 0
+            if settings.TRACE_FORWARD_LANGSMITH:
+                self._forward(batch)
+            return len(batch)
+
+    def _forward(self, batch: List[RunTrace]):
+        """Encolar el lote en el exportador de LangSmith como runs con etapas hijas"""
+        from app.services.langsmith_exporter import langsmith_exporter
+
+        for trace in batch:
+            if not langsmith_exporter.sample():
+                continue
+            for run in self._to_langsmith(trace):
+                if langsmith_exporter.submit("run_create", run):
+                    self.forwarded += 1
+
+    @staticmethod
+    def _to_langsmith(trace: RunTrace) -> List[Dict[str, Any]]:
+        dotted_order = _dotted_stamp(trace.started_at, trace.id)
+        root = {
+            "id": trace.id,
+            "trace_id": trace.id,
+            "dotted_order": dotted_order,
+            "name": trace.name,
+            "run_type": "chain",
+            "session_name": settings.LANGCHAIN_PROJECT,
+            "start_time": datetime.fromtimestamp(trace.started_at, tz=timezone.utc),
+            "end_time": datetime.fromtimestamp(trace.started_at + trace.duration_ms / 1000, tz=timezone.utc),
+            "inputs": {"session_id": trace.session_id},
+            "outputs": {"model": trace.model, "intent": trace.intent, "cached": trace.cached},
+            "error": trace.error,
+            "extra": {
+                "metadata": {"user_id": trace.user_id or "anonymous", "ttft_ms": trace.ttft_ms},
+                "usage": {
+                    "prompt_tokens": trace.prompt_tokens,
+                    "completion_tokens": trace.completion_tokens,
+                    "total_tokens": trace.total_tokens
+                }
+            },
+            "tags": ["esteban-portfolio", "chatbot"],
+        }
+        runs = [root]
+        for span in trace.spans:
+            span_id = str(uuid.uuid4())
+            started_at = trace.started_at + span.offset_ms / 1000
+            runs.append({
+                "id": span_id,
+                "trace_id": trace.id,
+                "parent_run_id": trace.id,
+                "dotted_order": f"{dotted_order}.{_dotted_stamp(started_at, span_id)}",
+                "name": span.name,
+                "run_type": "llm" if span.name == "llm" else "chain",
+                "session_name": settings.LANGCHAIN_PROJECT,
+                "start_time": datetime.fromtimestamp(started_at, tz=timezone.utc),
+                "end_time": datetime.fromtimestamp(started_at + span.duration_ms / 1000, tz=timezone.utc),
+                "inputs": {},
+                "outputs": {},
+                "error": span.error,
+            })
+        return runs
+
+    async def flush_periodically(self):
+        """Tarea de fondo: volcado cada TRACE_FLUSH_INTERVAL_SECONDS y retención diaria"""
+        last_purge = 0.0
+        while True:
+            await asyncio.sleep(settings.TRACE_FLUSH_INTERVAL_SECONDS)
+            try:
+                await asyncio.to_thread(self.flush)
+                if time.time() - last_purge > 86400:
+                    last_purge = time.time()
+                    cutoff = last_purge - settings.TRACE_RETENTION_DAYS * 86400
+                    removed = await asyncio.to_thread(self.store.purge_older_than, cutoff)
+                    if removed:
+                        logger.info(f"Trazas: {removed} runs anteriores a la retención eliminados")
+            except Exception as e:
+                logger.warning(f"Error en el volcado de trazas: {e}")
+
+    # Las consultas vuelcan antes lo pendiente para que las analíticas estén al día
+
+    def analytics(self, since_hours: float = 24.0, group_by: Optional[str] = None, **filters: Any) -> Dict[str, Any]:
+        self.flush()
+        now = time.time()
+        result = self.store.analytics(since=now - since_hours * 3600, group_by=group_by, **filters)
+        return {"window_hours": since_hours, **result, "generated_at": datetime.now().isoformat()}
+
+    def recent_runs(self, limit: int = 50, **filters: Any) -> List[Dict[str, Any]]:
+        self.flush()
+        return self.store.recent_runs(limit, **filters)
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        self.flush()
+        return self.store.get_run(run_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.TRACE_ENABLED,
+            "pending": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "forwarded": self.forwarded,
+        }
+
+
+# Instancia global
+trace_recorder = TraceRecorder()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark de lecturas y escrituras concurrentes sobre la base de datos de conversaciones
+
+Lanza hilos escritores (mismas consultas que _persist_conversation) e hilos lectores
+(mismas consultas que get_conversation_history) contra un SQLite temporal, una vez
+por perfil, y reporta throughput, p50/p95/p99 y errores "database is locked":
+
+  - default:    motor por defecto de SQLAlchemy (journal en modo rollback, sin pragmas)
+  - production: create_database_engine con los pragmas de producción (WAL, etc.)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_database
+    python -m benchmarks.bench_database --writers 4 --readers 16 --duration 10 --profiles production
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["SQL_ECHO"] = "false"
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.database import Base, create_database_engine  # noqa: E402
+from app.models.conversation import Conversation, Message  # noqa: E402
+
+PROFILES = ("default", "production")
+
+
+def build_engine(profile: str, url: str) -> Engine:
+    if profile == "default":
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_database_engine(url)
+
+
+def seed(Session, sessions: List[str], messages_per_session: int):
+    db = Session()
+    try:
+        for session_id in sessions:
+            conversation = Conversation(session_id=session_id, is_active=True)
+            db.add(conversation)
+            db.flush()
+            for i in range(messages_per_session):
+                db.add(Message(
+                    conversation_id=conversation.id,
+                    role="user" if i % 2 == 0 else "assistant",
+                    content="mensaje de prueba " * 20,
+                    timestamp=datetime.now()
+                ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def write_pair(Session, session_id: str):
+    """Lo mismo que ChatService._persist_conversation"""
+    db = Session()
+    try:
+        conversation = db.query(Conversation).filter(Conversation.session_id == session_id).first()
+        if not conversation:
+            conversation = Conversation(session_id=session_id, is_active=True)
+            db.add(conversation)
+            db.flush()
+        db.add(Message(conversation_id=conversation.id, role="user", content="pregunta " * 10, timestamp=datetime.now()))
+        db.add(Message(
+            conversation_id=conversation.id, role="assistant", content="respuesta " * 80,
+            tokens_used=120, response_time_ms=900, timestamp=datetime.now()
+        ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def read_history(Session, session_id: str, limit: int = 20):
+    """Lo mismo que ChatService.get_conversation_history"""
+    db = Session()
+    try:
+        conversation = db.query(Conversation).filter(Conversation.session_id == session_id).first()
+        if conversation:
+            db.query(Message).filter(
+                Message.conversation_id == conversation.id
+            ).order_by(Message.timestamp.desc()).limit(limit).all()
+    finally:
+        db.close()
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_profile(profile: str, workdir: str, args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    url = f"sqlite:///{os.path.join(workdir, profile + '.db')}"
+    engine = build_engine(profile, url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    sessions = [str(uuid.uuid4()) for _ in range(args.sessions)]
+    seed(Session, sessions, args.seed_messages)
+
+    latencies: Dict[str, List[float]] = {"write": [], "read": []}
+    errors = {"write": 0, "read": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def worker(kind: str):
+        operation = write_pair if kind == "write" else read_history
+        rng = random.Random()
+        local: List[float] = []
+        failed = 0
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                operation(Session, rng.choice(sessions))
+                local.append((time.perf_counter() - started) * 1000)
+            except OperationalError:
+                failed += 1
+        with lock:
+            latencies[kind].extend(local)
+            errors[kind] += failed
+
+    threads = [threading.Thread(target=worker, args=("write",)) for _ in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=("read",)) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    return {
+        kind: {
+            "ops_per_s": len(samples) / args.duration,
+            "p50_ms": statistics.median(samples) if samples else 0.0,
+            "p95_ms": percentile(samples, 0.95),
+            "p99_ms": percentile(samples, 0.99),
+            "errors": errors[kind],
+        }
+        for kind, samples in latencies.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0, help="Segundos por perfil")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--seed-messages", type=int, default=20, help="Mensajes iniciales por sesión")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="Perfiles separados por comas")
+    args = parser.parse_args()
+
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"Perfiles desconocidos: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="bench_database_")
+    try:
+        print(f"{args.writers} escritores, {args.readers} lectores, {args.duration:.0f}s por perfil\n")
+        print(f"{'perfil':<12}{'op':<7}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>10}")
+        for profile in profiles:
+            for kind, row in run_profile(profile, workdir, args).items():
+                print(
+                    f"{profile:<12}{kind:<7}{row['ops_per_s']:>10.0f}{row['p50_ms']:>10.2f}"
+                    f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['errors']:>10}"
+                )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks del camino caliente de ensamblado de prompts y de las rutas de BD
+
+Mide classify_query_intent, get_contextualized_prompt, get_optimized_prompt y
+ChatPromptTemplate.format_messages por intención, longitud de mensaje y tamaño
+de historial, además de _save_conversation y get_conversation_history sobre un
+SQLite temporal. Compara contra un baseline guardado y termina con código 1 si
+algún caso empeora más que el umbral.
+
+Los tiempos se normalizan con un bucle de calibración en Python puro, así un
+baseline generado en otra máquina sigue siendo comparable (aproximadamente).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_prompt                    # comparar con el baseline
+    python -m benchmarks.bench_prompt --save-baseline    # regenerar el baseline
+    python -m benchmarks.bench_prompt --filter format --threshold 0.5
+"""
+
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+# La configuración se lee al importar app.*: BD temporal y sin eco SQL
+_workdir = tempfile.mkdtemp(prefix="bench_prompt_")
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_workdir}/bench.db",
+    "STATE_DB_PATH": f"{_workdir}/state.db",
+    "DEBUG": "false",
+    "LANGCHAIN_TRACING_V2": "false",
+})
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from loguru import logger  # noqa: E402
+
+from app.core.database import init_db  # noqa: E402
+from app.services.chat_service import ChatService  # noqa: E402
+from app.services.prompt_service import prompt_service  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "prompt_hot_path.json"
+
+MESSAGES = {
+    "general": "¿Quién es Esteban y qué hace?",
+    "projects": "Háblame de los proyectos que ha desarrollado",
+    "skills": "¿Qué nivel de experiencia tiene con Python?",
+    "contact": "¿Cómo puedo contactar a Esteban por email?",
+}
+LENGTHS = {"short": 1, "long": 20}  # Repeticiones del mensaje base
+HISTORY_SIZES = [0, 5, 20]
+
+
+def calibrate(rounds: int = 5) -> float:
+    """Segundos de un bucle de referencia fijo (mejor de varias rondas)"""
+    def workload():
+        total = 0
+        for i in range(200_000):
+            total += i % 7
+        return total
+
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        workload()
+        samples.append(time.perf_counter() - started)
+    return min(samples)
+
+
+def measure(fn: Callable[[], object], min_time: float) -> Tuple[float, int]:
+    """Mejor tiempo en µs por operación entre lotes repetidos durante min_time segundos
+
+    Se usa el mínimo (como timeit): el ruido de la máquina solo suma tiempo.
+    """
+    fn()  # Calentamiento (cachés de LangChain, conexiones)
+    batch = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed > 0.02 or batch >= 1 << 16:
+            break
+        batch *= 2
+
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while time.perf_counter() < deadline or len(samples) < 5:
+        started = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        samples.append((time.perf_counter() - started) / batch)
+    return min(samples) * 1e6, batch * len(samples)
+
+
+def make_history(size: int) -> List[Dict[str, str]]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Mensaje de historial número {i} sobre LangChain y RAG"}
+        for i in range(size)
+    ]
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    cases: Dict[str, Callable[[], object]] = {}
+
+    for intent, base in MESSAGES.items():
+        for length_name, repeat in LENGTHS.items():
+            message = " ".join([base] * repeat)
+            cases[f"classify_intent/{intent}/{length_name}"] = (
+                lambda m=message: prompt_service.classify_query_intent(m)
+            )
+
+    for size in HISTORY_SIZES:
+        history = make_history(size)
+        cases[f"contextualized_prompt/history={size}"] = (
+            lambda h=history: prompt_service.get_contextualized_prompt(MESSAGES["general"], h)
+        )
+
+    for intent, message in MESSAGES.items():
+        for size in HISTORY_SIZES:
+            history = make_history(size)
+            cases[f"optimized_prompt/{intent}/history={size}"] = (
+                lambda m=message, h=history: prompt_service.get_optimized_prompt(m, h)
+            )
+            config = prompt_service.get_optimized_prompt(message, history)
+            cases[f"format_messages/{intent}/history={size}"] = (
+                lambda c=config: c["template"].format_messages(**c["variables"])
+            )
+
+    return cases
+
+
+def build_db_cases(loop: asyncio.AbstractEventLoop) -> Dict[str, Callable[[], object]]:
+    service = ChatService()
+    response = "## Respuesta\n\n" + "Contenido de la respuesta del asistente. " * 20
+    cases: Dict[str, Callable[[], object]] = {}
+
+    cases["db/save_conversation/new_session"] = lambda: loop.run_until_complete(
+        service._save_conversation(str(uuid.uuid4()), MESSAGES["general"], response, response_time_ms=100)
+    )
+
+    existing = str(uuid.uuid4())
+    loop.run_until_complete(service._save_conversation(existing, MESSAGES["general"], response))
+    cases["db/save_conversation/existing_session"] = lambda: loop.run_until_complete(
+        service._save_conversation(existing, MESSAGES["general"], response, response_time_ms=100)
+    )
+
+    for turns in (5, 50):
+        session_id = str(uuid.uuid4())
+        for _ in range(turns):
+            loop.run_until_complete(service._save_conversation(session_id, MESSAGES["general"], response))
+        cases[f"db/get_history/turns={turns}"] = lambda sid=session_id: loop.run_until_complete(
+            service.get_conversation_history(sid, limit=20)
+        )
+    return cases
+
+
+def compare(
+    results: Dict[str, float], baseline: Dict, calibration: float, threshold: float, min_delta_us: float
+) -> List[str]:
+    """Casos cuyo tiempo normalizado supera el baseline en más de threshold (y de min_delta_us)"""
+    scale = calibration / baseline["calibration_s"]
+    regressions = []
+    print(f"\n{'caso':<48} | {'actual µs':>10} | {'baseline µs':>11} | {'ratio':>6}")
+    for name, current_us in results.items():
+        reference = baseline["results_us"].get(name)
+        if reference is None:
+            print(f"{name:<48} | {current_us:>10.1f} | {'(nuevo)':>11} |")
+            continue
+        ratio = current_us / (reference * scale)
+        regressed = ratio > 1 + threshold and current_us - reference * scale > min_delta_us
+        flag = "  <-- regresión" if regressed else ""
+        print(f"{name:<48} | {current_us:>10.1f} | {reference * scale:>11.1f} | {ratio:>6.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar los resultados como nuevo baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="Empeoramiento relativo tolerado (0.25 = 25%%)")
+    parser.add_argument("--min-delta-us", type=float, default=1.0, help="Diferencia absoluta mínima para contar como regresión")
+    parser.add_argument("--min-time", type=float, default=0.3, help="Segundos de medición por caso")
+    parser.add_argument("--filter", default="", help="Solo casos cuyo nombre contenga este texto")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(init_db())
+    cases = {**build_cases(), **build_db_cases(loop)}
+    cases = {name: fn for name, fn in cases.items() if args.filter in name}
+
+    calibration = calibrate()
+    results = {}
+    for name, fn in cases.items():
+        best_us, ops = measure(fn, args.min_time)
+        results[name] = round(best_us, 2)
+        if args.save_baseline:
+            print(f"{name:<48} {best_us:>10.1f} µs  ({ops} ops)")
+    loop.close()
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({
+            "calibration_s": calibration,
+            "python": sys.version.split()[0],
+            "results_us": results,
+        }, indent=2) + "\n")
+        print(f"\nBaseline guardado en {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        sys.exit(f"No existe baseline en {args.baseline}; ejecuta con --save-baseline")
+    regressions = compare(
+        results, json.loads(args.baseline.read_text()), calibration, args.threshold, args.min_delta_us
+    )
+    if regressions:
+        print(f"\n{len(regressions)} regresiones por encima del {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nSin regresiones (umbral {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
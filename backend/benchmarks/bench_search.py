@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la búsqueda de texto completo (/chat/search) sobre un volumen grande de mensajes
+
+Genera N mensajes sintéticos en un SQLite temporal, construye el índice FTS5 y mide
+p50/p95/p99 de search_index.search para varias consultas (términos raros, frecuentes,
+prefijos, con filtro de sesión y páginas profundas).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_search --messages 1000000
+    python -m benchmarks.bench_search --messages 200000 --repeat 50
+"""
+
+import argparse
+import atexit
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# La configuración se lee al importar app.*: BD temporal y sin eco SQL
+_workdir = tempfile.mkdtemp(prefix="bench_search_")
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_workdir}/bench.db",
+    "STATE_DB_PATH": f"{_workdir}/state.db",
+    "SQL_ECHO": "false",
+})
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import text  # noqa: E402
+
+from app.core.database import Base, create_search_index, engine  # noqa: E402
+from app.services.search_service import search_index  # noqa: E402
+
+VOCABULARY = (
+    "proyecto experiencia python fastapi react modelo datos análisis backend frontend "
+    "despliegue docker kubernetes equipo cliente producto diseño prueba rendimiento "
+    "arquitectura servicio usuario interfaz tecnología aprendizaje contacto correo"
+).split()
+RARE_TERMS = ["LegalGPT", "CV Analyzer", "Portafolio Esteban"]
+
+QUERIES = {
+    "raro": {"query": "LegalGPT"},
+    "frase_rara": {"query": "cv analyzer"},
+    "frecuente": {"query": "python"},
+    "dos_frecuentes": {"query": "python docker"},
+    "prefijo": {"query": "arquitec*"},
+    "sesion": {"query": "python", "session_id": "s-42"},
+    "pagina_5": {"query": "python", "offset": 100},
+}
+
+
+def populate(messages: int, per_session: int, seed: int):
+    rng = random.Random(seed)
+    started = datetime.now() - timedelta(days=180)
+    sessions = max(1, messages // per_session)
+    with engine.begin() as conn:
+        Base.metadata.create_all(bind=conn)
+        conn.execute(
+            text("INSERT INTO conversations (id, session_id, is_active) VALUES (:id, :session_id, 0)"),
+            [{"id": i + 1, "session_id": f"s-{i}"} for i in range(sessions)]
+        )
+        batch = []
+        for i in range(messages):
+            words = rng.choices(VOCABULARY, k=rng.randint(12, 60))
+            if rng.random() < 0.001:
+                words.insert(rng.randrange(len(words)), rng.choice(RARE_TERMS))
+            batch.append({
+                "conversation_id": i // per_session % sessions + 1,
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": " ".join(words),
+                "timestamp": started + timedelta(seconds=i),
+            })
+            if len(batch) == 10000:
+                conn.execute(text(
+                    "INSERT INTO messages (conversation_id, role, content, timestamp, outcome) "
+                    "VALUES (:conversation_id, :role, :content, :timestamp, 'completed')"
+                ), batch)
+                batch = []
+        if batch:
+            conn.execute(text(
+                "INSERT INTO messages (conversation_id, role, content, timestamp, outcome) "
+                "VALUES (:conversation_id, :role, :content, :timestamp, 'completed')"
+            ), batch)
+        create_search_index(conn)
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--per-session", type=int, default=20, help="Mensajes por conversación")
+    parser.add_argument("--repeat", type=int, default=30, help="Ejecuciones por consulta")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    populate(args.messages, args.per_session, args.seed)
+    print(f"{args.messages} mensajes indexados en {time.perf_counter() - started:.1f}s\n")
+
+    print(f"{'consulta':<16}{'hits':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, params in QUERIES.items():
+        samples = []
+        hits = 0
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            result = search_index.search(limit=args.limit, **params)
+            samples.append((time.perf_counter() - t0) * 1000)
+            hits = len(result["hits"])
+        print(
+            f"{name:<16}{hits:>6}{statistics.median(samples):>10.2f}"
+            f"{percentile(samples, 0.95):>10.2f}{percentile(samples, 0.99):>10.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
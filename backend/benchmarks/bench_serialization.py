@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialización y bytes en la red de las páginas de /chat/history
+
+Para páginas de N mensajes con respuestas markdown realistas mide:
+  - Tiempo de serialización (p50) de cada camino:
+      modelos   MessageDetail por fila, serialize_response de FastAPI con el
+                response_model (validación y recorrido) y JSONResponse (json)
+      dicts     las filas tal cual con JSONResponse + jsonable_encoder
+                (el camino sin orjson)
+      orjson    las filas tal cual con ORJSONResponse (el camino actual)
+  - Bytes en la red sin comprimir, con gzip y con brotli (si está instalado),
+    con el tiempo de compresión.
+
+No necesita base de datos ni servidor: trabaja con las mismas filas que
+devuelve ChatService.get_conversation_history.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --sizes 20,100,500 --repeat 300
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from app.core.compression import brotli  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.serialization import orjson  # noqa: E402
+from app.schemas.chat import MessageDetail  # noqa: E402
+
+WORDS = (
+    "Esteban LangChain proyecto RAG modelo datos experiencia Python FastAPI recuperación "
+    "jurisprudencia Colombia asistente evaluación fine-tuning embeddings búsqueda respuesta "
+    "arquitectura despliegue producción latencia caché vectorial documentos contexto usuario "
+    "agentes herramientas prompts métricas pruebas integración frontend Next.js TypeScript"
+).split()
+
+
+def answer(rng: random.Random) -> str:
+    """Respuesta markdown con texto variado (el texto repetido comprime de forma irreal)"""
+    bullets = "\n".join(
+        f"- **{rng.choice(WORDS)}**: {' '.join(rng.choices(WORDS, k=rng.randint(12, 30)))}."
+        for _ in range(rng.randint(2, 5))
+    )
+    return f"## {' '.join(rng.choices(WORDS, k=4))}\n\n{' '.join(rng.choices(WORDS, k=40))}.\n\n{bullets}"
+
+
+def history_rows(size: int) -> List[Dict[str, Any]]:
+    """Filas con la forma de ChatService.get_conversation_history"""
+    rng = random.Random(size)
+    start = datetime(2025, 3, 1, 10, 0, 0)
+    rows = []
+    for i in range(size):
+        assistant = i % 2 == 1
+        rows.append({
+            "id": i + 1,
+            "role": "assistant" if assistant else "user",
+            "content": answer(rng) if assistant else f"¿{' '.join(rng.choices(WORDS, k=8))}?",
+            "timestamp": start + timedelta(seconds=37 * i, microseconds=123456),
+            "tokens_used": 640 + i if assistant else None,
+            "response_time_ms": 900 + i if assistant else None,
+        })
+    return rows
+
+
+RESPONSE_FIELD = create_model_field("Response_history", List[MessageDetail], mode="serialization")
+LOOP = asyncio.new_event_loop()
+
+
+def via_models(rows: List[Dict[str, Any]]) -> bytes:
+    messages = [MessageDetail(**row) for row in rows]
+    content = LOOP.run_until_complete(serialize_response(field=RESPONSE_FIELD, response_content=messages))
+    return JSONResponse(content).body
+
+
+def via_dicts(rows: List[Dict[str, Any]]) -> bytes:
+    return JSONResponse(jsonable_encoder(rows)).body
+
+
+def via_orjson(rows: List[Dict[str, Any]]) -> bytes:
+    return ORJSONResponse(rows).body
+
+
+def timed(func: Callable, arg: Any, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(arg)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def compressors() -> Dict[str, Callable[[bytes], bytes]]:
+    level = settings.COMPRESSION_GZIP_LEVEL
+    options = {
+        "identidad": lambda body: body,
+        f"gzip-{level}": lambda body: zlib.compress(body, level, wbits=31),
+    }
+    if brotli is not None:
+        quality = settings.COMPRESSION_BROTLI_QUALITY
+        options[f"br-{quality}"] = lambda body: brotli.compress(body, quality=quality)
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="20,100,500", help="Mensajes por página")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    paths = {"modelos": via_models, "dicts": via_dicts}
+    if orjson is not None:
+        paths["orjson"] = via_orjson
+    else:
+        print("orjson no está instalado: se omite ese camino")
+
+    print(f"{'mensajes':>8} | " + " | ".join(f"{name + ' ms':>12}" for name in paths))
+    bodies = {}
+    for size in (int(value) for value in args.sizes.split(",")):
+        rows = history_rows(size)
+        # Calentamiento (caché de esquemas de pydantic, imports perezosos)
+        for func in paths.values():
+            func(rows)
+        # Mismo contenido por los tres caminos
+        bodies[size] = via_models(rows)
+        times = [timed(func, rows, args.repeat) for func in paths.values()]
+        print(f"{size:>8} | " + " | ".join(f"{value:>12.3f}" for value in times))
+
+    print(f"\n{'mensajes':>8} | {'codificación':<12} | {'bytes':>9} | {'ratio':>6} | {'compresión ms':>13}")
+    for size, body in bodies.items():
+        for name, compress in compressors().items():
+            compressed = compress(body)
+            print(f"{size:>8} | {name:<12} | {len(compressed):>9} | {len(compressed) / len(body):>6.3f} | "
+                  f"{timed(compress, body, max(10, args.repeat // 4)):>13.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la preparación previa al LLM (ChatService._prepare) en serie y en paralelo
+
+Ejecuta el grafo de etapas (rate limit, historial desde la BD, intención, respuesta
+determinista, caché, ejemplos few-shot y prompt) con PIPELINE_PARALLEL_STAGES
+activado y desactivado sobre un SQLite temporal, y compara la duración total de
+"prepare" con la suma de sus etapas. En paralelo el total debería acercarse a la
+rama más lenta.
+
+No llama al LLM: los casos son fallos de caché (hasta el prompt), aciertos de caché
+y respuestas deterministas. Con SQLite local y sin selector de ejemplos todas las
+etapas duran menos de un milisegundo. Para acercarse a producción:
+  --embeddings-url  selector de ejemplos con embeddings reales contra esa URL
+                    (p. ej. el mock de OpenAI)
+  --db-latency-ms   espera añadida a cada consulta de la BD de conversaciones,
+                    como el viaje de red a una base de datos remota
+  --history-source  "db" (CHAT_HISTORY_FROM_DB) o "request" (el cliente envía
+                    el historial, configuración por defecto)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_stages
+    python -m benchmarks.bench_stages --repeat 500 --history 20
+    python -m benchmarks.bench_stages --embeddings-url http://127.0.0.1:9000/v1 --db-latency-ms 2
+"""
+
+import argparse
+import asyncio
+import atexit
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+# La configuración se lee al importar app.*: BD y estado temporales, sin eco SQL
+_workdir = tempfile.mkdtemp(prefix="bench_stages_")
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_workdir}/bench.db",
+    "STATE_DB_PATH": f"{_workdir}/state.db",
+    "TRACE_DB_PATH": f"{_workdir}/traces.db",
+    "SQL_ECHO": "false",
+    "CHAT_HISTORY_FROM_DB": "true",
+    "RATE_LIMIT_PER_MINUTE": "100000000",
+    "LANGCHAIN_TRACING_V2": "false",
+})
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from loguru import logger  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.database import engine, init_db  # noqa: E402
+from app.models import conversation  # noqa: E402,F401  (registra las tablas antes de init_db)
+from app.services.cache_keys import prompt_cache_key  # noqa: E402
+from app.services.chat_service import ChatService  # noqa: E402
+from app.services.model_router import model_router  # noqa: E402
+from app.services.prompt_service import prompt_service  # noqa: E402
+from app.services.response_cache import response_cache  # noqa: E402
+from app.schemas.chat import ChatMessage  # noqa: E402
+from app.services.tracing import RunTrace  # noqa: E402
+
+SESSION_ID = "bench-stages"
+CASES = {
+    "fallo_cache": "¿Quién es Esteban y qué le motiva?",
+    "acierto_cache": "¿Qué le gusta hacer a Esteban?",
+    "determinista": "¿Cómo puedo contactar a Esteban?",
+}
+
+
+class EmbeddingExampleSelector:
+    """Selector semántico mínimo sobre embeddings reales (producto escalar en Python puro)
+
+    Hace la misma llamada a la API de embeddings por consulta que el selector de
+    PromptService, sin depender de langchain_community ni de numpy.
+    """
+
+    def __init__(self, embeddings, examples):
+        self.embeddings = embeddings
+        self.examples = examples
+        self.vectors = embeddings.embed_documents([example["input"] for example in examples])
+
+    def select_examples(self, input_variables):
+        query = self.embeddings.embed_query(input_variables["input"])
+        scores = [sum(a * b for a, b in zip(query, vector)) for vector in self.vectors]
+        return [self.examples[scores.index(max(scores))]]
+
+
+def install_example_selector(base_url: str):
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings(
+        api_key=os.environ["OPENAI_API_KEY"], base_url=base_url, check_embedding_ctx_length=False
+    )
+    prompt_service.example_selector = EmbeddingExampleSelector(embeddings, prompt_service.few_shot_examples)
+
+
+async def populate(history: int):
+    await init_db()
+    service = ChatService()
+    for i in range(history // 2):
+        await service._save_conversation(
+            session_id=SESSION_ID,
+            user_message=f"Pregunta de historial número {i} sobre LangChain y RAG",
+            assistant_response=f"Respuesta de historial número {i}",
+        )
+    # El acierto de caché se guarda con el mismo historial que cargará _prepare
+    stored = await service._load_history(SESSION_ID, None)
+    chain = model_router.build_chain(service.current_model)
+    response_cache.set(
+        prompt_cache_key(CASES["acierto_cache"], stored, chain[0], settings.TEMPERATURE),
+        "Respuesta en caché", chain[0], "general"
+    )
+    return [ChatMessage(**message) for message in stored]
+
+
+async def run_case(service: ChatService, message: str, history, repeat: int, parallel: bool):
+    settings.PIPELINE_PARALLEL_STAGES = parallel
+    chain = model_router.build_chain(service.current_model)
+    totals, stages = [], defaultdict(list)
+    for i in range(repeat + 5):
+        trace = RunTrace("bench", SESSION_ID)
+        await service._prepare(message, SESSION_ID, history, chain, settings.TEMPERATURE, trace, client_id="bench")
+        if i < 5:  # Calentamiento
+            continue
+        for span in trace.spans:
+            if span.name == "prepare":
+                totals.append(span.duration_ms)
+            elif span.status == "success":
+                stages[span.name].append(span.duration_ms)
+    stage_sum = sum(statistics.median(samples) for samples in stages.values())
+    return statistics.median(totals), stage_sum, {name: statistics.median(s) for name, s in stages.items()}
+
+
+async def main_async(args) -> int:
+    stored = await populate(args.history)
+    history = stored if args.history_source == "request" else None
+    service = ChatService()
+    print(f"{'caso':<16}{'modo':<10}{'prepare p50':>13}{'suma etapas':>13}")
+    for name, message in CASES.items():
+        for parallel in (False, True):
+            total, stage_sum, by_stage = await run_case(service, message, history, args.repeat, parallel)
+            print(f"{name:<16}{'paralelo' if parallel else 'serie':<10}{total:>10.2f} ms{stage_sum:>10.2f} ms")
+            if args.verbose:
+                for stage, value in by_stage.items():
+                    print(f"    {stage:<18}{value:>8.3f} ms")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="Ejecuciones por caso y modo")
+    parser.add_argument("--history", type=int, default=10, help="Mensajes guardados en la sesión")
+    parser.add_argument("--verbose", action="store_true", help="Mediana de cada etapa")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Espera añadida a cada consulta de la BD")
+    parser.add_argument("--embeddings-url", help="URL compatible con OpenAI para el selector de ejemplos")
+    parser.add_argument("--history-source", choices=["db", "request"], default="db")
+    args = parser.parse_args()
+    logger.remove()
+    if args.embeddings_url:
+        install_example_selector(args.embeddings_url)
+    if args.db_latency_ms > 0:
+        @event.listens_for(engine, "before_cursor_execute")
+        def simulate_network(*_):
+            time.sleep(args.db_latency_ms / 1000)
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
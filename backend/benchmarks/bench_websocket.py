@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Benchmark de fan-out de /chat/ws: conexiones mantenidas por worker y turnos por WebSocket frente a HTTP
+
+Arranca el mock de OpenAI y el backend con --workers sobre una base de datos
+temporal y:
+  1. Abre --connections sesiones WebSocket y las mantiene abiertas. Reporta el
+     tiempo de apertura, cuántas retiene cada worker (snapshot websocket_sessions
+     de /health/detailed) y la memoria residente de cada worker por conexión.
+  2. Con las conexiones abiertas, --active sesiones conversan --turns turnos
+     cada una por WebSocket (el historial lo mantiene el servidor) y por
+     POST /chat/stream (el cliente reenvía el historial en cada turno). Es el
+     mismo pipeline en streaming con otro transporte: compara la latencia hasta
+     el evento done y los bytes que envía el cliente por turno.
+
+Los mensajes son únicos por sesión y turno para que ningún turno salga de la caché.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_websocket
+    python -m benchmarks.bench_websocket --workers 4 --connections 5000 --active 50 --turns 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+from websockets.asyncio.client import connect
+
+from benchmarks.bench_workers import free_port, wait_until_ready
+from benchmarks.load_test import QUESTIONS, start_backend, start_mock, wait_for_mock
+
+
+def rss_kb(pid: int) -> int:
+    """Memoria residente de un proceso (Linux)"""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def worker_snapshots(base_url: str, workers: int, timeout_s: float = 30.0) -> Dict[int, Dict]:
+    """Snapshot websocket_sessions de cada worker: cada petición abre una conexión nueva
+    y el kernel la reparte entre workers, así que se repite hasta haberlos visto todos"""
+    seen: Dict[int, Dict] = {}
+    deadline = time.time() + timeout_s
+    while len(seen) < workers and time.time() < deadline:
+        with httpx.Client(timeout=10.0) as client:
+            snapshot = client.get(f"{base_url}/health/detailed").json()["services"]["websocket_sessions"]
+        seen[snapshot["worker_pid"]] = snapshot
+        if len(seen) < workers:
+            time.sleep(0.05)
+    return seen
+
+
+def quantile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+
+
+async def open_connections(ws_url: str, count: int, concurrency: int) -> Tuple[List, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def open_one():
+        async with semaphore:
+            ws = await connect(ws_url, max_size=None, open_timeout=30)
+            json.loads(await ws.recv())  # Evento session
+            return ws
+
+    started = time.perf_counter()
+    sockets = await asyncio.gather(*[open_one() for _ in range(count)])
+    return list(sockets), time.perf_counter() - started
+
+
+def turn_message(session: int, turn: int) -> str:
+    return f"{QUESTIONS[turn % len(QUESTIONS)]} (sesión {session}, turno {turn})"
+
+
+async def websocket_turns(ws, session: int, turns: int, latencies: List[float], sent: List[int]):
+    for turn in range(turns):
+        frame = json.dumps({"type": "message", "message": turn_message(session, turn)}, ensure_ascii=False)
+        started = time.perf_counter()
+        await ws.send(frame)
+        while True:
+            event = json.loads(await ws.recv())
+            if event["type"] in ("done", "error"):
+                break
+        latencies.append(time.perf_counter() - started)
+        sent.append(len(frame.encode()))
+
+
+async def http_turns(client: httpx.AsyncClient, base_url: str, session: int, turns: int,
+                     latencies: List[float], sent: List[int]):
+    """Los mismos turnos por POST /chat/stream: mismo pipeline en streaming, distinto transporte"""
+    history: List[Dict[str, str]] = []
+    session_id = f"bench-http-{session}"
+    for turn in range(turns):
+        message = turn_message(session, turn) + " [http]"
+        body = json.dumps(
+            {"message": message, "session_id": session_id, "conversation_history": history}, ensure_ascii=False
+        ).encode()
+        parts: List[str] = []
+        started = time.perf_counter()
+        async with client.stream(
+            "POST", f"{base_url}/chat/stream", content=body, headers={"Content-Type": "application/json"}
+        ) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                if event["type"] == "token":
+                    parts.append(event["content"])
+        latencies.append(time.perf_counter() - started)
+        sent.append(len(body))
+        history += [{"role": "user", "content": message}, {"role": "assistant", "content": "".join(parts)}]
+
+
+async def run_benchmark(base_url: str, args) -> Dict:
+    ws_url = base_url.replace("http://", "ws://") + "/chat/ws"
+    baseline = worker_snapshots(base_url, args.workers)
+    baseline_rss = {pid: rss_kb(pid) for pid in baseline}
+
+    sockets, open_s = await open_connections(ws_url, args.connections, args.open_concurrency)
+    await asyncio.sleep(1.0)
+    held = worker_snapshots(base_url, args.workers)
+
+    report = {
+        "workers": args.workers,
+        "connections": args.connections,
+        "open_s": round(open_s, 2),
+        "per_worker": {
+            pid: {
+                "connections": snapshot["connections"],
+                "rss_mb": round(rss_kb(pid) / 1024, 1),
+                "kb_per_connection": round(
+                    (rss_kb(pid) - baseline_rss.get(pid, rss_kb(pid))) / max(1, snapshot["connections"]), 1
+                ),
+            }
+            for pid, snapshot in sorted(held.items())
+        },
+    }
+
+    # Calentamiento: clientes del LLM, catálogo de modelos y caminos de código en frío
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        await asyncio.gather(*[
+            http_turns(client, base_url, -1 - i, 1, [], []) for i in range(min(args.active, 10))
+        ])
+
+    ws_latencies, ws_sent, http_latencies, http_sent = [], [], [], []
+    await asyncio.gather(*[
+        websocket_turns(sockets[i], i, args.turns, ws_latencies, ws_sent) for i in range(min(args.active, len(sockets)))
+    ])
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        await asyncio.gather(*[
+            http_turns(client, base_url, i, args.turns, http_latencies, http_sent) for i in range(args.active)
+        ])
+    report["turns"] = {
+        name: {
+            "turns": len(latencies),
+            "p50_ms": round(quantile(latencies, 0.50), 1),
+            "p95_ms": round(quantile(latencies, 0.95), 1),
+            "client_bytes_per_turn": round(statistics.fmean(sent)) if sent else 0,
+        }
+        for name, latencies, sent in (
+            ("websocket", ws_latencies, ws_sent), ("http_sse", http_latencies, http_sent)
+        )
+    }
+
+    await asyncio.gather(*[ws.close() for ws in sockets], return_exceptions=True)
+    return report
+
+
+def print_report(report: Dict):
+    print(f"\n{report['connections']} conexiones abiertas en {report['open_s']} s "
+          f"sobre {report['workers']} worker(s)")
+    print(f"{'worker':>8} | {'conexiones':>10} | {'RSS MB':>8} | {'KB/conexión':>11}")
+    for pid, stats in report["per_worker"].items():
+        print(f"{pid:>8} | {stats['connections']:>10} | {stats['rss_mb']:>8} | {stats['kb_per_connection']:>11}")
+    print(f"\n{'transporte':<10} | {'turnos':>6} | {'p50 ms':>8} | {'p95 ms':>8} | {'bytes/turno':>11}")
+    for name, stats in report["turns"].items():
+        print(f"{name:<10} | {stats['turns']:>6} | {stats['p50_ms']:>8} | {stats['p95_ms']:>8} | "
+              f"{stats['client_bytes_per_turn']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--connections", type=int, default=1000, help="Sesiones WebSocket mantenidas abiertas")
+    parser.add_argument("--open-concurrency", type=int, default=100, help="Aperturas simultáneas")
+    parser.add_argument("--active", type=int, default=20, help="Sesiones que conversan durante la prueba")
+    parser.add_argument("--turns", type=int, default=6, help="Turnos por sesión activa")
+    parser.add_argument("--mock-ttft", default="fixed:0.05")
+    parser.add_argument("--mock-tps", type=float, default=2000.0)
+    parser.add_argument("--mock-tokens", type=int, default=150)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", dest="json_path", help="Guardar el reporte en un fichero JSON")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "WS_MAX_CONNECTIONS": str(args.connections + 100),
+        "CACHE_WARMUP_ENABLED": "false",
+        "SUGGESTION_PREFETCH_ENABLED": "false",
+        "RATE_LIMIT_PER_MINUTE": "0",
+    })
+    processes: List[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory(prefix="bench_ws_") as workdir:
+        try:
+            mock_port, backend_port = free_port(), free_port()
+            processes.append(start_mock(mock_port, args))
+            wait_for_mock(mock_port)
+            os.environ["TRACE_DB_PATH"] = f"{workdir}/traces.db"
+            processes.append(start_backend(backend_port, mock_port, workdir, args.workers))
+            base_url = f"http://127.0.0.1:{backend_port}"
+            wait_until_ready(base_url)
+            report = asyncio.run(run_benchmark(base_url, args))
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait(timeout=30)
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+        print(f"Reporte guardado en {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
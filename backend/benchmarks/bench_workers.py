@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark de peticiones/segundo según el número de workers
+
+Lanza el servidor con 1..N workers, genera carga concurrente desde varios
+procesos cliente y reporta throughput y latencias por configuración.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_workers --workers 1,2,4 --duration 10 --path /health/
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, server: str) -> subprocess.Popen:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port), DEBUG="false")
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env.setdefault("SECRET_KEY", "benchmark")
+    if server == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py", "--log-level", "warning"]
+    else:
+        cmd = [
+            sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning", "--no-access-log"
+        ]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_ready(base_url: str, timeout_s: float = 30.0):
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health/", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("El servidor no arrancó a tiempo")
+
+
+async def _client_load(url: str, method: str, body: Dict, concurrency: int, duration_s: float) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration_s
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, json=body if method == "POST" else None)
+                    if response.status_code >= 400:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return {"latencies": latencies, "errors": errors}
+
+
+def client_process(args) -> Dict:
+    return asyncio.run(_client_load(*args))
+
+
+def run_load(url: str, method: str, body: Dict, concurrency: int, clients: int, duration_s: float) -> Dict:
+    per_client = max(1, concurrency // clients)
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(client_process, [(url, method, body, per_client, duration_s)] * clients)
+
+    latencies = sorted(lat for result in results for lat in result["latencies"])
+    errors = sum(result["errors"] for result in results)
+    quantile = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration_s,
+        "p50_ms": quantile(0.50),
+        "p95_ms": quantile(0.95),
+        "p99_ms": quantile(0.99),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, cpus} | ({cpus // 2} if cpus >= 4 else set()))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)), help="Lista de workers a probar")
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn")
+    parser.add_argument("--path", default="/health/", help="Endpoint a cargar")
+    parser.add_argument("--method", default="GET", choices=["GET", "POST"])
+    parser.add_argument("--message", default="¿Quién es Esteban?", help="Mensaje para POST /chat/")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=max(1, min(4, cpus // 2)), help="Procesos generadores de carga")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    args = parser.parse_args()
+
+    body = {"message": args.message} if args.method == "POST" else {}
+    rows = []
+    for workers in [int(value) for value in args.workers.split(",")]:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(workers, port, args.server)
+        try:
+            wait_until_ready(base_url)
+            run_load(base_url + args.path, args.method, body, args.concurrency, args.clients, args.warmup)
+            stats = run_load(base_url + args.path, args.method, body, args.concurrency, args.clients, args.duration)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        rows.append((workers, stats))
+        print(f"workers={workers:<3} rps={stats['rps']:>9.1f}  p50={stats['p50_ms']:>7.1f}ms  "
+              f"p95={stats['p95_ms']:>7.1f}ms  p99={stats['p99_ms']:>7.1f}ms  errores={stats['errors']}")
+
+    baseline = rows[0][1]["rps"] or 1.0
+    print("\nworkers | req/s     | speedup")
+    for workers, stats in rows:
+        print(f"{workers:>7} | {stats['rps']:>9.1f} | {stats['rps'] / baseline:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
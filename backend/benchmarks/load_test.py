@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga end-to-end a RPS objetivo contra /chat/, /chat/history y /chat/analytics
+
+Genera llegadas en lazo abierto (Poisson) para que la latencia medida incluya
+las colas del servidor, y reporta p50/p95/p99, throughput y errores por endpoint.
+Con --spawn arranca el mock de OpenAI y el backend con una base de datos temporal,
+así no se consumen créditos ni red.
+
+Uso (desde backend/):
+    python -m benchmarks.load_test --spawn --rps 20 --duration 30
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --rps 5 --mix chat=1
+    python -m benchmarks.load_test --spawn --rps 20 --json resultados.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.bench_workers import BACKEND_DIR, free_port, wait_until_ready
+
+QUESTIONS = [
+    "¿Quién es Esteban?",
+    "¿Qué proyectos de IA ha desarrollado?",
+    "¿Qué experiencia tiene con LangChain?",
+    "¿Cuáles son sus habilidades técnicas?",
+    "¿Cómo puedo contactar a Esteban?",
+    "Háblame del proyecto de fine-tuning",
+    "¿Qué tecnologías usa en RAG?",
+    "¿Dónde vive Esteban?",
+]
+
+
+def start_mock(port: int, args) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "benchmarks.mock_llm_server", "--port", str(port),
+        "--ttft", args.mock_ttft, "--tokens-per-second", str(args.mock_tps),
+        "--completion-tokens", str(args.mock_tokens), "--error-rate", str(args.mock_error_rate),
+    ]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def start_backend(port: int, mock_port: int, workdir: str, workers: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="sk-benchmark",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        SECRET_KEY="benchmark",
+        DATABASE_URL=f"sqlite:///{workdir}/bench.db",
+        STATE_DB_PATH=f"{workdir}/state.db",
+        LANGCHAIN_TRACING_V2="false",
+        DEBUG="false",
+    )
+    cmd = [
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for_mock(port: int, timeout_s: float = 15.0):
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/v1/models", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("El mock de OpenAI no arrancó a tiempo")
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'chat=6,history=3,analytics=1' -> pesos por endpoint"""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("chat", "history", "analytics"):
+            raise ValueError(f"Endpoint desconocido en --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def summarize(latencies: List[float], errors: int, duration_s: float) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    quantile = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / duration_s,
+        "p50_ms": quantile(0.50),
+        "p95_ms": quantile(0.95),
+        "p99_ms": quantile(0.99),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+class LoadGenerator:
+    """Lanza peticiones a un ritmo fijo sin esperar a que terminen las anteriores"""
+
+    def __init__(self, base_url: str, mix: Dict[str, float], unique_ratio: float, sessions: int, max_inflight: int):
+        self.base_url = base_url.rstrip("/")
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.unique_ratio = unique_ratio
+        self.session_ids = [str(uuid.uuid4()) for _ in range(sessions)]
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.latencies: Dict[str, List[float]] = {name: [] for name in self.endpoints}
+        self.errors: Dict[str, int] = {name: 0 for name in self.endpoints}
+        self.status_codes: Dict[str, int] = {}
+        self.dropped = 0
+
+    def _message(self) -> str:
+        question = random.choice(QUESTIONS)
+        if random.random() < self.unique_ratio:
+            # Variante única para esquivar caché y coalescing
+            question = f"{question} (ref {uuid.uuid4().hex[:8]})"
+        return question
+
+    async def _request(self, client: httpx.AsyncClient, endpoint: str, record: bool):
+        session_id = random.choice(self.session_ids)
+        started = time.perf_counter()
+        try:
+            if endpoint == "chat":
+                response = await client.post(
+                    f"{self.base_url}/chat/", json={"message": self._message(), "session_id": session_id}
+                )
+            elif endpoint == "history":
+                response = await client.get(f"{self.base_url}/chat/history/{session_id}")
+            else:
+                response = await client.get(f"{self.base_url}/chat/analytics", params={"session_id": session_id})
+            status = str(response.status_code)
+            failed = response.status_code >= 400
+        except httpx.HTTPError as e:
+            status, failed = type(e).__name__, True
+        finally:
+            self.inflight.release()
+
+        if not record:
+            return
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+        if failed:
+            self.errors[endpoint] += 1
+        else:
+            self.latencies[endpoint].append(time.perf_counter() - started)
+
+    async def run(self, rps: float, duration_s: float, record: bool = True, timeout_s: float = 60.0):
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+        async with httpx.AsyncClient(timeout=timeout_s, limits=limits) as client:
+            tasks = []
+            started = time.perf_counter()
+            next_at = started
+            while next_at - started < duration_s:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_at += random.expovariate(rps)
+
+                if self.inflight.locked():
+                    # El cliente no debe convertirse en el cuello de botella silencioso
+                    if record:
+                        self.dropped += 1
+                    continue
+                await self.inflight.acquire()
+                endpoint = random.choices(self.endpoints, self.weights)[0]
+                tasks.append(asyncio.create_task(self._request(client, endpoint, record)))
+            await asyncio.gather(*tasks)
+            return time.perf_counter() - started
+
+    async def seed_sessions(self):
+        """Crear conversaciones para que history/analytics devuelvan datos reales"""
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            await asyncio.gather(*[
+                client.post(f"{self.base_url}/chat/", json={"message": random.choice(QUESTIONS), "session_id": sid})
+                for sid in self.session_ids
+            ])
+
+
+async def run_benchmark(base_url: str, args) -> Dict:
+    generator = LoadGenerator(base_url, parse_mix(args.mix), args.unique_ratio, args.sessions, args.max_inflight)
+    await generator.seed_sessions()
+    if args.warmup > 0:
+        await generator.run(args.rps, args.warmup, record=False)
+    elapsed = await generator.run(args.rps, args.duration)
+
+    all_latencies = [lat for values in generator.latencies.values() for lat in values]
+    return {
+        "target_rps": args.rps,
+        "duration_s": round(elapsed, 2),
+        "dropped": generator.dropped,
+        "status_codes": generator.status_codes,
+        "total": summarize(all_latencies, sum(generator.errors.values()), elapsed),
+        "endpoints": {
+            name: summarize(generator.latencies[name], generator.errors[name], elapsed)
+            for name in generator.endpoints
+        },
+    }
+
+
+def print_report(report: Dict):
+    print(f"\nRPS objetivo={report['target_rps']}  duración={report['duration_s']}s  "
+          f"descartadas por el cliente={report['dropped']}")
+    print(f"{'endpoint':<10} | {'ok':>6} | {'err':>5} | {'req/s':>7} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    rows = list(report["endpoints"].items()) + [("total", report["total"])]
+    for name, stats in rows:
+        print(f"{name:<10} | {stats['requests']:>6} | {stats['errors']:>5} | {stats['throughput_rps']:>7.1f} | "
+              f"{stats['p50_ms']:>8.1f} | {stats['p95_ms']:>8.1f} | {stats['p99_ms']:>8.1f}")
+    print(f"códigos de estado: {report['status_codes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Backend ya arrancado (si no se usa --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="Arrancar mock de OpenAI y backend temporales")
+    parser.add_argument("--workers", type=int, default=1, help="Workers del backend con --spawn")
+    parser.add_argument("--rps", type=float, default=10.0, help="Peticiones por segundo objetivo")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--mix", default="chat=6,history=3,analytics=1", help="Pesos por endpoint")
+    parser.add_argument("--unique-ratio", type=float, default=0.5, help="Fracción de mensajes únicos (sin caché)")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--max-inflight", type=int, default=500)
+    parser.add_argument("--mock-ttft", default="lognormal:0.35:0.4")
+    parser.add_argument("--mock-tps", type=float, default=80.0)
+    parser.add_argument("--mock-tokens", type=int, default=200)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", dest="json_path", help="Guardar el reporte en un fichero JSON")
+    args = parser.parse_args()
+
+    if not args.spawn and not args.base_url:
+        parser.error("Indica --base-url o --spawn")
+
+    processes: List[subprocess.Popen] = []
+    workdir: Optional[tempfile.TemporaryDirectory] = None
+    try:
+        base_url = args.base_url
+        if args.spawn:
+            workdir = tempfile.TemporaryDirectory(prefix="load_test_")
+            mock_port, backend_port = free_port(), free_port()
+            processes.append(start_mock(mock_port, args))
+            wait_for_mock(mock_port)
+            processes.append(start_backend(backend_port, mock_port, workdir.name, args.workers))
+            base_url = f"http://127.0.0.1:{backend_port}"
+            wait_until_ready(base_url)
+
+        report = asyncio.run(run_benchmark(base_url, args))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(timeout=30)
+        if workdir is not None:
+            workdir.cleanup()
+
+    print_report(report)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"Reporte guardado en {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
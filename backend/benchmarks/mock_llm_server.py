@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Servidor local compatible con la API de OpenAI para benchmarks sin coste
+
+Implementa /v1/models, /v1/chat/completions (con y sin streaming) y
+/v1/embeddings con latencia, velocidad de tokens y errores configurables.
+El backend lo usa apuntando OPENAI_BASE_URL a http://127.0.0.1:<puerto>/v1.
+
+Uso (desde backend/):
+    python -m benchmarks.mock_llm_server --port 9000 --ttft lognormal:0.4:0.5 \\
+        --tokens-per-second 80 --completion-tokens 250 --error-rate 0.01
+
+Distribuciones de latencia: fixed:<s>, uniform:<min>:<max>,
+lognormal:<mediana>:<sigma>, exponential:<media>.
+La configuración puede cambiarse en caliente con POST /mock/config.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+LOREM_WORDS = (
+    "Esteban desarrolla proyectos de IA generativa con Python LangChain OpenAI RAG "
+    "fine-tuning FastAPI React Pinecone ChromaDB y Streamlit para resolver problemas "
+    "reales en Colombia con enfoque práctico autodidacta y persistente"
+).split()
+
+SCHEMA_BLOCK_RE = re.compile(r"Here is the output schema:\s*```\s*(\{.*?\})\s*```", re.DOTALL)
+
+
+class MockConfig(BaseModel):
+    """Parámetros de comportamiento del servidor simulado"""
+    ttft: str = "lognormal:0.35:0.4"  # Tiempo hasta el primer token
+    tokens_per_second: float = 80.0
+    completion_tokens: int = 200  # Media de tokens generados
+    completion_tokens_jitter: float = 0.3  # Variación relativa de la longitud
+    error_rate: float = 0.0  # Fracción de respuestas 500
+    rate_limit_rate: float = 0.0  # Fracción de respuestas 429
+    hang_rate: float = 0.0  # Fracción de peticiones que se cuelgan hang_seconds
+    hang_seconds: float = 60.0
+    embedding_dim: int = 256
+    models: List[str] = ["gpt-4o-mini", "gpt-3.5-turbo", "ft:gpt-4o-mini-2024-07-18:curso-llm::C3nyJrmy"]
+
+
+config = MockConfig()
+stats = {"chat_completions": 0, "streams": 0, "embeddings": 0, "errors_injected": 0}
+app = FastAPI(title="Mock OpenAI")
+
+
+def sample_latency(spec: str) -> float:
+    """Muestrear un retraso en segundos a partir de la especificación de distribución"""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return values[0]
+    if kind == "uniform":
+        return random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return random.lognormvariate(math.log(median), sigma)
+    if kind == "exponential":
+        return random.expovariate(1.0 / values[0])
+    raise ValueError(f"Distribución desconocida: {spec}")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def fake_value(schema: Dict[str, Any], name: str = "") -> Any:
+    """Valor plausible para un JSON schema (suficiente para los modelos Pydantic del backend)"""
+    if "anyOf" in schema:
+        return fake_value(next(s for s in schema["anyOf"] if s.get("type") != "null"), name)
+    kind = schema.get("type")
+    if kind == "integer":
+        return 50
+    if kind == "number":
+        return 0.5
+    if kind == "boolean":
+        return True
+    if kind == "array":
+        return [fake_value(schema.get("items", {"type": "string"}), name) for _ in range(3)]
+    if kind == "object":
+        return {key: fake_value(sub, key) for key, sub in schema.get("properties", {}).items()}
+    if "email" in name:
+        return "esteban.ortiz.dev@gmail.com"
+    return " ".join(random.choices(LOREM_WORDS, k=6))
+
+
+def build_completion(body: Dict[str, Any]) -> str:
+    """Texto de respuesta: JSON si se pide salida estructurada, markdown en otro caso"""
+    response_format = body.get("response_format") or {}
+    schema = None
+    if response_format.get("type") == "json_schema":
+        schema = response_format.get("json_schema", {}).get("schema")
+    else:
+        system_text = " ".join(
+            str(m.get("content", "")) for m in body.get("messages", []) if m.get("role") == "system"
+        )
+        match = SCHEMA_BLOCK_RE.search(system_text)
+        if match:
+            schema = json.loads(match.group(1))
+    if schema:
+        return json.dumps(fake_value({"type": "object", **schema}), ensure_ascii=False)
+
+    target = max(1, int(random.gauss(config.completion_tokens, config.completion_tokens * config.completion_tokens_jitter)))
+    # langchain-openai envía max_completion_tokens; los clientes antiguos, max_tokens
+    limit = body.get("max_completion_tokens") or body.get("max_tokens")
+    if limit:
+        target = min(target, int(limit))
+    words = random.choices(LOREM_WORDS, k=target)
+    return "## Respuesta simulada\n\n" + " ".join(words)
+
+
+async def maybe_inject_failure() -> Optional[JSONResponse]:
+    roll = random.random()
+    if roll < config.error_rate:
+        stats["errors_injected"] += 1
+        return JSONResponse(status_code=500, content={"error": {"message": "Error simulado", "type": "server_error"}})
+    if roll < config.error_rate + config.rate_limit_rate:
+        stats["errors_injected"] += 1
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"message": "Rate limit simulado", "type": "rate_limit_error"}},
+            headers={"retry-after": "1"}
+        )
+    if roll < config.error_rate + config.rate_limit_rate + config.hang_rate:
+        stats["errors_injected"] += 1
+        await asyncio.sleep(config.hang_seconds)
+    return None
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {
+        "object": "list",
+        "data": [{"id": model_id, "object": "model", "created": 0, "owned_by": "mock"} for model_id in config.models],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    failure = await maybe_inject_failure()
+    if failure is not None:
+        return failure
+
+    model = body.get("model", "gpt-4o-mini")
+    text = build_completion(body)
+    prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in body.get("messages", []))
+    words = re.findall(r"\S+\s*", text)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(words),
+        "total_tokens": prompt_tokens + len(words),
+    }
+
+    if not body.get("stream"):
+        stats["chat_completions"] += 1
+        await asyncio.sleep(sample_latency(config.ttft) + len(words) / config.tokens_per_second)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+
+    stats["streams"] += 1
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    async def event_stream():
+        await asyncio.sleep(sample_latency(config.ttft))
+        yield chunk({"role": "assistant", "content": ""})
+        for word in words:
+            await asyncio.sleep(1.0 / config.tokens_per_second)
+            yield chunk({"content": word})
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            usage_payload = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": [], "usage": usage,
+            }
+            yield f"data: {json.dumps(usage_payload)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    stats["embeddings"] += 1
+    inputs = body.get("input", [])
+    if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+
+    data = []
+    for index, item in enumerate(inputs):
+        # Vector determinista derivado del contenido
+        seed = int(hashlib.sha256(json.dumps(item, ensure_ascii=False).encode()).hexdigest()[:16], 16)
+        rng = random.Random(seed)
+        vector = [rng.uniform(-1, 1) for _ in range(config.embedding_dim)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        data.append({"object": "embedding", "index": index, "embedding": [v / norm for v in vector]})
+
+    await asyncio.sleep(sample_latency("fixed:0.02"))
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "text-embedding-ada-002"),
+        "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+    }
+
+
+@app.get("/mock/config")
+async def get_config():
+    return {"config": config.model_dump(), "stats": stats}
+
+
+@app.post("/mock/config")
+async def update_config(changes: Dict[str, Any]):
+    global config
+    config = config.model_copy(update=changes)
+    return {"config": config.model_dump()}
+
+
+def main():
+    global config
+    defaults = MockConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--ttft", default=defaults.ttft, help="Distribución del tiempo hasta el primer token")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate)
+    parser.add_argument("--hang-rate", type=float, default=defaults.hang_rate)
+    parser.add_argument("--hang-seconds", type=float, default=defaults.hang_seconds)
+    args = parser.parse_args()
+
+    config = config.model_copy(update={
+        "ttft": args.ttft,
+        "tokens_per_second": args.tokens_per_second,
+        "completion_tokens": args.completion_tokens,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "hang_rate": args.hang_rate,
+        "hang_seconds": args.hang_seconds,
+    })
+    sample_latency(config.ttft)  # Validar la especificación antes de arrancar
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Configuración de gunicorn para producción: varios workers uvicorn en la misma máquina
+
+Uso: gunicorn main:app -c gunicorn.conf.py
+"""
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from app.core.config import settings
+
+bind = f"0.0.0.0:{os.environ.get('PORT', settings.PORT)}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = settings.WEB_CONCURRENCY or (os.cpu_count() or 1)
+
+# Las llamadas al LLM pueden tardar; el deadline real lo impone la capa de resiliencia
+timeout = int(settings.LLM_TOTAL_TIMEOUT_SECONDS) + 30
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+loglevel = "info"
+
+
+def on_starting(server):
+    """Crear tablas una sola vez en el proceso maestro, antes de hacer fork de los workers"""
+    from app.core.database import init_db_before_fork
+    asyncio.run(init_db_before_fork())
@@ -2,11 +2,22 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
+import asyncio
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
 from app.api.routes import chat, health
 from app.core.database import init_db
+from app.core.compression import CompressionMiddleware
+from app.core.serialization import DefaultJSONResponse
+from app.core.state import purge_expired_periodically
+from app.services.model_registry import model_registry
+from app.services.tracing import trace_recorder
+from app.services.langsmith_exporter import langsmith_exporter
+from app.services.retention import retention_service
+from app.services.cache_warmup import cache_warmer
+from app.services.suggestions import suggestion_service
+from app.services.token_budgets import token_budgets
 from loguru import logger
 
 
@@ -19,6 +30,26 @@ async def lifespan(app: FastAPI):
     # Inicializar base de datos SQLite para conversaciones
     await init_db()
     
+    # Refresco periódico del catálogo de modelos
+    model_registry.start()
+    
+    # Limpieza periódica del estado compartido (caché, contadores)
+    purge_task = asyncio.create_task(purge_expired_periodically())
+    
+    # Volcado por lotes de las trazas locales
+    trace_task = asyncio.create_task(trace_recorder.flush_periodically())
+    
+    # Envío a LangSmith (trazas, feedback, datasets) en segundo plano
+    langsmith_exporter.start()
+    
+    # Retención: sesiones inactivas, particiones y archivado de meses antiguos
+    retention_service.start()
+    
+    # Respuestas de las preguntas frecuentes generadas en caché antes de que lleguen
+    cache_warmer.start()
+    
+    # Presupuestos de tokens de salida ajustados con las longitudes observadas
+    token_budgets.start()
     
     logger.info("Aplicación iniciada correctamente")
     
@@ -26,6 +57,15 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Cerrando aplicación...")
+    purge_task.cancel()
+    trace_task.cancel()
+    await retention_service.stop()
+    await cache_warmer.stop()
+    await suggestion_service.stop()
+    await token_budgets.stop()
+    await asyncio.to_thread(trace_recorder.flush)
+    await langsmith_exporter.stop()
+    await model_registry.stop()
 
 
 # Crear aplicación FastAPI
@@ -33,9 +73,14 @@ app = FastAPI(
     title="Portfolio Chatbot API",
     description="API especializada para chatbot de portafolio con fine-tuning",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson si está instalado: más rápido que json y sin escapar acentos
+    default_response_class=DefaultJSONResponse
 )
 
+# Compresión gzip/brotli por encima de COMPRESSION_MIN_BYTES, también en streaming
+app.add_middleware(CompressionMiddleware)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -13,6 +13,13 @@ sys.path.append(str(Path(__file__).parent))
 
 from app.core.config import settings
 
+
+def resolve_worker_count() -> int:
+    """Workers a lanzar: WEB_CONCURRENCY si está definido, si no uno por CPU"""
+    if settings.WEB_CONCURRENCY > 0:
+        return settings.WEB_CONCURRENCY
+    return os.cpu_count() or 1
+
 if __name__ == "__main__":
     # Verificar variables de entorno críticas usando settings
     missing_vars = []
@@ -32,12 +39,21 @@ if __name__ == "__main__":
     
     import os
     port = int(os.environ.get("PORT", settings.PORT))
+    workers = resolve_worker_count()
+    print(f"👷 Workers: {workers} (estado compartido: {settings.STATE_BACKEND})")
+    
+    if workers > 1:
+        # Crear tablas una sola vez antes de arrancar los workers
+        import asyncio
+        from app.core.database import init_db_before_fork
+        asyncio.run(init_db_before_fork())
     
     uvicorn.run(
         "main:app",
         host="0.0.0.0",  # Necesario para deploy
         port=port,
         reload=False,  # No reload en producción
+        workers=workers,
         log_level="info",
         access_log=True
     )
@@ -0,0 +1,5 @@
+import os
+
+# Settings exige estas variables al importar app.core.config
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("SECRET_KEY", "test")
@@ -0,0 +1,32 @@
+import pytest
+
+from app.services.fact_answers import fact_answers
+from app.services.suggestions import suggestion_service
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("¿Cuál es la diferencia entre RAG y fine-tuning en tu experiencia?", "skills"),
+    ("¿Qué hiciste en el proyecto CV Analyzer y cuáles fueron los retos?", "projects"),
+    ("¿Tienes github copilot?", "contact"),
+])
+def test_questions_that_only_mention_a_fact_go_to_the_llm(message, intent):
+    assert fact_answers.answer(message, intent) is None
+
+
+@pytest.mark.parametrize("message, intent, expected", [
+    ("¿Qué experiencia tiene Esteban con Python?", "skills", "### Python"),
+    ("¿Qué sabes de LangChain?", "skills", "### LangChain"),
+    ("Cuéntame más sobre el proyecto CV Analyzer", "projects", "### CV Analyzer"),
+    ("¿Qué proyectos tiene en desarrollo?", "projects", "en desarrollo"),
+    ("LegalGPT", "projects", "### LegalGPT"),
+    ("¿Tiene github?", "contact", "Contacto"),
+    ("¿Cuál es su email?", "contact", "Contacto"),
+])
+def test_direct_lookups_are_answered_from_the_knowledge_base(message, intent, expected):
+    assert expected in (fact_answers.answer(message, intent) or "")
+
+
+def test_suggested_questions_keep_their_deterministic_answer():
+    # Las sugerencias de proyectos y habilidades se responden sin LLM
+    for suggestion in suggestion_service.by_intent["projects"] + suggestion_service.by_intent["skills"]:
+        assert fact_answers.answer(suggestion.text) is not None, suggestion.text
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.model_router import ModelRouter
+from app.services.resilience import CircuitBreaker, LLMUnavailableError, get_llm_executor
+
+
+async def tokens(model_id: str):
+    for token in ("uno", "dos", "tres"):
+        yield token
+
+
+def test_consumer_break_releases_the_half_open_probe():
+    async def scenario():
+        router = ModelRouter()
+        breaker = get_llm_executor("stream-test-model").breaker
+        breaker.state = CircuitBreaker.OPEN
+        breaker.opened_at = -breaker.reset_timeout_s  # Tiempo de espera ya cumplido
+        assert router.is_degraded("stream-test-model")
+
+        stream = router.stream(["stream-test-model"], tokens)
+        async for _, token in stream:
+            break  # Como el corte por presupuesto de tokens
+        await stream.aclose()
+
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert router.is_degraded("stream-test-model")
+        assert [token async for _, token in router.stream(["stream-test-model"], tokens)] == ["uno", "dos", "tres"]
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert not router.is_degraded("stream-test-model")
+
+    asyncio.run(scenario())
+
+
+def test_trickling_stream_is_cut_at_the_total_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_ATTEMPT_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(settings, "LLM_TOTAL_TIMEOUT_SECONDS", 0.5)
+
+    async def trickle(model_id: str):
+        while True:
+            await asyncio.sleep(0.1)  # Siempre por debajo del timeout por fragmento
+            yield "."
+
+    async def scenario():
+        router = ModelRouter()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        received = []
+        with pytest.raises(LLMUnavailableError, match="deadline total"):
+            async for _, chunk in router.stream(["trickle-test-model"], trickle):
+                received.append(chunk)
+        assert loop.time() - started < 0.8
+        assert 2 <= len(received) <= 5
+
+    asyncio.run(scenario())
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from app.services.resilience import CircuitBreaker, CircuitOpenError, ResilientExecutor
+
+
+def half_open_executor() -> ResilientExecutor:
+    executor = ResilientExecutor("test-model")
+    executor.breaker.state = CircuitBreaker.OPEN
+    executor.breaker.opened_at = -executor.breaker.reset_timeout_s  # Tiempo de espera ya cumplido
+    return executor
+
+
+def test_cancelled_half_open_probe_releases_the_circuit():
+    async def scenario():
+        executor = half_open_executor()
+        probe = asyncio.ensure_future(executor.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        assert executor.breaker.state == CircuitBreaker.HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            await executor.call(lambda: asyncio.sleep(0, result="ok"))
+
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        # La cancelación no cuenta como fallo y la siguiente llamada puede hacer de prueba
+        assert executor.breaker.state == CircuitBreaker.HALF_OPEN
+        assert await executor.call(lambda: asyncio.sleep(0, result="ok")) == "ok"
+        assert executor.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_request_error_neither_closes_the_circuit_nor_resets_failures():
+    async def scenario():
+        executor = half_open_executor()
+        executor.breaker.consecutive_failures = 3
+
+        async def bad_request():
+            raise ValueError("400: petición inválida")
+
+        with pytest.raises(ValueError):
+            await executor.call(bad_request)
+
+        # Sigue semiabierto con los mismos fallos, y la prueba queda libre para otra llamada
+        assert executor.breaker.state == CircuitBreaker.HALF_OPEN
+        assert executor.breaker.consecutive_failures == 3
+        assert await executor.call(lambda: asyncio.sleep(0, result="ok")) == "ok"
+        assert executor.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())